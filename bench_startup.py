@@ -0,0 +1,103 @@
+"""Measure how long the service takes from process start to answering its first request.
+
+Each run starts a fresh ``uvicorn src.app:app`` process and polls it until a
+request that does not touch Telegram is answered. The import and app
+creation phases are timed separately in another fresh process. With
+``--replay`` the service runs against a replay file and needs no Telegram
+credentials; otherwise the usual API_ID, API_HASH and SESSION_STRING are used
+and the time includes connecting the default client.
+
+    python bench_startup.py --runs 5 --replay recorded.jsonl
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+PHASES = """
+import json, sys, time
+t0 = time.perf_counter()
+import src.app
+t1 = time.perf_counter()
+src.app.create_app()
+t2 = time.perf_counter()
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "create_app_ms": (t2 - t1) * 1000, "telethon_loaded": "telethon" in sys.modules}))
+"""
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_first_request(env: dict, timeout: float) -> float:
+    port = _free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.app:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"service exited with code {proc.returncode}")
+            try:
+                # Unknown job ids are answered without Telegram
+                httpx.get(f"http://127.0.0.1:{port}/jobs/startup-probe", timeout=1)
+                return (time.perf_counter() - started) * 1000
+            except httpx.TransportError:
+                time.sleep(0.005)
+        raise RuntimeError(f"service did not answer within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def phases(env: dict) -> dict:
+    out = subprocess.run([sys.executable, "-c", PHASES], env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _summary(values: list) -> dict:
+    return {"min": round(min(values), 1), "median": round(statistics.median(values), 1), "max": round(max(values), 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--replay", help="Serve from this replay file instead of Telegram")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.replay:
+        env["REPLAY_FILE"] = args.replay
+
+    first_request, imports, creates = [], [], []
+    telethon_loaded = False
+    for _ in range(args.runs):
+        first_request.append(time_to_first_request(env, args.timeout))
+        p = phases(env)
+        imports.append(p["import_ms"])
+        creates.append(p["create_app_ms"])
+        telethon_loaded = p["telethon_loaded"]
+
+    print(json.dumps({
+        "runs": args.runs,
+        "mode": "replay" if args.replay else "live",
+        "time_to_first_request_ms": _summary(first_request),
+        "import_ms": _summary(imports),
+        "create_app_ms": _summary(creates),
+        "telethon_loaded": telethon_loaded,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +0,0 @@
-from .teletest_api_client import (
-    TeletestApiClient,
-    TelegramCredentialsRequest,
-    MessageButton,
-    BotResponse,
-    ResponseType,
-    SendMessageRequest,
-    PressButtonRequest,
-    GetMessagesResponse,
-)
-
-__all__ = [
-    "TeletestApiClient",
-    "TelegramCredentialsRequest",
-    "MessageButton",
-    "BotResponse",
-    "ResponseType",
-    "SendMessageRequest",
-    "PressButtonRequest",
-    "GetMessagesResponse",
-]
@@ -0,0 +1,91 @@
+from .teletest_api_client import (
+    TeletestApiClient,
+    TelegramCredentialsRequest,
+    MessageButton,
+    BotResponse,
+    ResponseType,
+    SendMessageRequest,
+    PressButtonRequest,
+    GetMessagesResponse,
+    ResetMode,
+    ResetChatRequest,
+    ResetChatResponse,
+    SearchHit,
+    SearchResponse,
+    SessionInfo,
+    CircuitState,
+    BotCircuit,
+    AsyncJobAccepted,
+    JobKind,
+    JobStatus,
+    ScenarioStep,
+    JobRequest,
+    JobInfo,
+    ExpectationType,
+    Expectation,
+    ExpectationResult,
+    ExpectationVerdict,
+    ProfileRequest,
+    LatencyStats,
+    ProfileResponse,
+    WarmupRequest,
+    WarmupSource,
+    WarmupResult,
+    WarmupResponse,
+    TenantUsage,
+    ServiceState,
+    HealthStatus,
+    InlineQueryRequest,
+    InlineResult,
+    InlineQueryResponse,
+    InlineChooseRequest,
+    InlineChooseResponse,
+    LoadTestRequest,
+    LoadTestSnapshot,
+)
+
+__all__ = [
+    "TeletestApiClient",
+    "TelegramCredentialsRequest",
+    "MessageButton",
+    "BotResponse",
+    "ResponseType",
+    "SendMessageRequest",
+    "PressButtonRequest",
+    "GetMessagesResponse",
+    "ResetMode",
+    "ResetChatRequest",
+    "ResetChatResponse",
+    "SearchHit",
+    "SearchResponse",
+    "SessionInfo",
+    "CircuitState",
+    "BotCircuit",
+    "AsyncJobAccepted",
+    "JobKind",
+    "JobStatus",
+    "ScenarioStep",
+    "JobRequest",
+    "JobInfo",
+    "ExpectationType",
+    "Expectation",
+    "ExpectationResult",
+    "ExpectationVerdict",
+    "ProfileRequest",
+    "LatencyStats",
+    "ProfileResponse",
+    "WarmupRequest",
+    "WarmupSource",
+    "WarmupResult",
+    "WarmupResponse",
+    "TenantUsage",
+    "ServiceState",
+    "HealthStatus",
+    "InlineQueryRequest",
+    "InlineResult",
+    "InlineQueryResponse",
+    "InlineChooseRequest",
+    "InlineChooseResponse",
+    "LoadTestRequest",
+    "LoadTestSnapshot",
+]
@@ -0,0 +1,234 @@
+"""pytest plugin for suites that test bots through a running teletest-api service.
+
+Installing the client package registers it through the ``pytest11`` entry
+point, so pytest loads it on its own; with autoloading disabled, enable it
+with ``-p teletest_python_client.pytest_plugin``. It provides session-scoped
+fixtures:
+
+- ``teletest_client``: a client sharing one HTTP session per worker, returned
+  once the service reports ready
+- ``teletest_shard``: the bot and account this worker tests with
+- ``teletest_bot``: the shard's bot username, resolved ahead of the first test
+- ``teletest_creds``: credentials of the shard's account, registered as a
+  session; None for the service's default account
+
+Under pytest-xdist each worker gets its own (account, bot) pair, so parallel
+workers never talk in the same chat. The time each test spent in service
+calls is reported at the end of the run.
+"""
+import json
+import os
+import time
+import warnings
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import pytest
+import requests
+
+from .teletest_api_client import TelegramCredentialsRequest, TeletestApiClient, WarmupRequest
+
+# Calls that only check on the service are not timed
+_UNTIMED_PATHS = ("/ready", "/health")
+_CALLS_PROPERTY = "teletest_calls"
+
+# (method and path, seconds to the response headers) of the service calls made by the running test
+_calls: List[Tuple[str, float]] = []
+
+
+@dataclass(frozen=True)
+class TeletestShard:
+    """The bot and account one worker tests with."""
+    worker: int
+    workers: int
+    bot_username: Optional[str]
+    account: Optional[TelegramCredentialsRequest]  # None for the service's default account
+    shared: bool  # Another worker has the same bot and account, so their chats collide
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    group = parser.getgroup("teletest", "teletest-api service")
+    group.addoption(
+        "--teletest-url", default=os.getenv("TELETEST_URL", "http://localhost:8000"), help="Service URL"
+    )
+    group.addoption(
+        "--teletest-api-key", default=os.getenv("TELETEST_API_KEY"), help="API key to be admitted as its tenant"
+    )
+    group.addoption(
+        "--teletest-bots",
+        default=os.getenv("TELETEST_BOTS", ""),
+        help="Comma-separated usernames of the bots under test, shared out among the workers",
+    )
+    group.addoption(
+        "--teletest-accounts",
+        default=os.getenv("TELETEST_ACCOUNTS"),
+        help="JSON file listing test accounts (api_id, api_hash and session_string each), shared out among the workers",
+    )
+    group.addoption(
+        "--teletest-ready-timeout",
+        type=float,
+        default=float(os.getenv("TELETEST_READY_TIMEOUT", "60")),
+        help="Seconds to wait for the service to report ready",
+    )
+    group.addoption(
+        "--teletest-durations",
+        type=int,
+        default=10,
+        help="Tests listed with the most time in service calls (0 for none)",
+    )
+
+
+def _worker() -> Tuple[int, int]:
+    """This worker's index and the number of workers, under pytest-xdist or not."""
+    worker = os.getenv("PYTEST_XDIST_WORKER", "")
+    index = int(worker[2:]) if worker.startswith("gw") else 0
+    return index, int(os.getenv("PYTEST_XDIST_WORKER_COUNT", "1"))
+
+
+def _load_accounts(path: Optional[str]) -> List[TelegramCredentialsRequest]:
+    if not path:
+        return []
+    with open(path) as f:
+        return [TelegramCredentialsRequest(**account) for account in json.load(f)]
+
+
+def shard(
+    worker: int,
+    workers: int,
+    bot_usernames: List[str],
+    accounts: List[TelegramCredentialsRequest],
+) -> TeletestShard:
+    """The (account, bot) pair of ``worker``; pairs differ in bot first, then in account."""
+    pairs = [(account, bot) for account in accounts or [None] for bot in bot_usernames or [None]]
+    account, bot_username = pairs[worker % len(pairs)]
+    return TeletestShard(worker, workers, bot_username, account, shared=workers > len(pairs))
+
+
+def _wait_ready(client: TeletestApiClient, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    delay = 0.1
+    last = "no answer"
+    while True:
+        try:
+            status = client.ready()
+            if status.ready:
+                return
+            last = f"state {status.state.value}, Telegram connected: {status.telegram_connected}"
+            if status.reason:
+                last += f", {status.reason}"
+        except requests.RequestException as e:
+            last = str(e)
+        if time.monotonic() + delay > deadline:
+            pytest.fail(f"teletest-api at {client.base_url} not ready after {timeout:g}s ({last})", pytrace=False)
+        time.sleep(delay)
+        delay = min(delay * 2, 2.0)
+
+
+def _record_call(response: requests.Response, *args, **kwargs) -> None:
+    path = urlparse(response.request.url).path
+    if not path.endswith(_UNTIMED_PATHS):
+        _calls.append((f"{response.request.method} {path}", response.elapsed.total_seconds()))
+
+
+@pytest.fixture(scope="session")
+def teletest_client(pytestconfig: pytest.Config) -> Iterator[TeletestApiClient]:
+    session = requests.Session()
+    session.hooks["response"].append(_record_call)
+    client = TeletestApiClient(
+        pytestconfig.getoption("teletest_url"), session=session, api_key=pytestconfig.getoption("teletest_api_key")
+    )
+    _wait_ready(client, pytestconfig.getoption("teletest_ready_timeout"))
+    yield client
+    session.close()
+
+
+@pytest.fixture(scope="session")
+def teletest_shard(pytestconfig: pytest.Config) -> TeletestShard:
+    bot_usernames = [bot.strip() for bot in pytestconfig.getoption("teletest_bots").split(",") if bot.strip()]
+    accounts = _load_accounts(pytestconfig.getoption("teletest_accounts"))
+    assigned = shard(*_worker(), bot_usernames, accounts)
+    if assigned.shared:
+        pairs = max(1, len(bot_usernames)) * max(1, len(accounts))
+        warnings.warn(pytest.PytestWarning(
+            f"{assigned.workers} workers share {pairs} (account, bot) pairs; some tests will collide in one chat"
+        ))
+    return assigned
+
+
+@pytest.fixture(scope="session")
+def teletest_creds(
+    teletest_client: TeletestApiClient, teletest_shard: TeletestShard
+) -> Iterator[Optional[TelegramCredentialsRequest]]:
+    if teletest_shard.account is None or teletest_shard.account.session_token:
+        yield teletest_shard.account
+        return
+    # One connection for the worker's whole run instead of one per request
+    info = teletest_client.create_session(teletest_shard.account)
+    yield info.credentials()
+    teletest_client.delete_session(info.token)
+
+
+@pytest.fixture(scope="session")
+def teletest_bot(
+    teletest_client: TeletestApiClient,
+    teletest_shard: TeletestShard,
+    teletest_creds: Optional[TelegramCredentialsRequest],
+) -> str:
+    if teletest_shard.bot_username is None:
+        pytest.skip("No bot to test; pass --teletest-bots or set TELETEST_BOTS")
+    [result] = teletest_client.warmup(
+        WarmupRequest(bot_usernames=[teletest_shard.bot_username], dialogs=False), teletest_creds
+    ).results
+    if not result.resolved:
+        pytest.fail(f"Bot {teletest_shard.bot_username} could not be resolved: {result.error}", pytrace=False)
+    return teletest_shard.bot_username
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_setup(item: pytest.Item) -> None:
+    _calls.clear()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item: pytest.Item, call: pytest.CallInfo):
+    outcome = yield
+    report = outcome.get_result()
+    if report.when == "teardown" and _calls:
+        # Report properties travel from xdist workers to the controller, which prints the summary
+        report.user_properties.append((_CALLS_PROPERTY, list(_calls)))
+        _calls.clear()
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus: int, config: pytest.Config) -> None:
+    per_test: Dict[str, List[Tuple[str, float]]] = {}
+    for reports in terminalreporter.stats.values():
+        for report in reports:
+            for name, calls in getattr(report, "user_properties", ()):
+                if name == _CALLS_PROPERTY:
+                    per_test.setdefault(report.nodeid, []).extend(calls)
+    if not per_test:
+        return
+
+    by_endpoint: Dict[str, List[float]] = {}
+    for calls in per_test.values():
+        for endpoint, seconds in calls:
+            by_endpoint.setdefault(endpoint, []).append(seconds)
+    terminalreporter.write_sep("=", "teletest service calls")
+    for endpoint, durations in sorted(by_endpoint.items(), key=lambda item: -sum(item[1])):
+        durations.sort()
+        terminalreporter.write_line(
+            f"{endpoint:40} {len(durations):6} calls  total {sum(durations):8.2f}s  "
+            f"p50 {durations[len(durations) // 2] * 1000:8.1f}ms  "
+            f"p95 {durations[min(len(durations) - 1, int(len(durations) * 0.95))] * 1000:8.1f}ms"
+        )
+
+    count = config.getoption("teletest_durations")
+    if count > 0:
+        totals = sorted(per_test.items(), key=lambda item: -sum(seconds for _, seconds in item[1]))[:count]
+        terminalreporter.write_line("")
+        terminalreporter.write_line(f"slowest {len(totals)} tests by time in service calls:")
+        for nodeid, calls in totals:
+            terminalreporter.write_line(
+                f"{sum(seconds for _, seconds in calls):8.2f}s {len(calls):4} calls  {nodeid}"
+            )
@@ -0,0 +1,778 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import List, Optional, Dict, Any, Iterator
+import json
+import requests
+
+@dataclass
+class TelegramCredentialsRequest:
+    api_id: Optional[int] = None
+    api_hash: Optional[str] = None
+    session_string: Optional[str] = None
+    session_token: Optional[str] = None  # From create_session; replaces the three fields above
+
+
+class ResponseType(str, Enum):
+    MESSAGE = "message"
+    EDITED_MESSAGE = "edited_message"
+    CALLBACK_ANSWER = "callback_answer"
+    POPUP = "popup"
+
+
+def _build_headers(creds: Optional[TelegramCredentialsRequest]) -> Dict[str, str]:
+    headers: Dict[str, str] = {}
+    if not creds:
+        return headers
+    if creds.api_id is not None:
+        headers["X-Telegram-Api-Id"] = str(creds.api_id)
+    if creds.api_hash is not None:
+        headers["X-Telegram-Api-Hash"] = creds.api_hash
+    if creds.session_string is not None:
+        headers["X-Telegram-Session-String"] = creds.session_string
+    if creds.session_token is not None:
+        headers["X-Telegram-Session-Token"] = creds.session_token
+    return headers
+
+
+@dataclass
+class MessageButton:
+    text: str
+    callback_data: Optional[str] = None
+
+
+@dataclass
+class BotResponse:
+    response_type: ResponseType
+    message_id: Optional[int] = None
+    message_text: Optional[str] = None
+    reply_markup: Optional[List[List[MessageButton]]] = None
+    reply_keyboard: Optional[bool] = None
+    reply_markup_hash: Optional[str] = None
+    callback_answer_text: Optional[str] = None
+    callback_answer_alert: Optional[bool] = None
+    popup_message: Optional[str] = None
+    sent_at: Optional[datetime] = None
+    date: Optional[datetime] = None
+    received_at: Optional[datetime] = None
+    truncated: Optional[bool] = None
+
+
+class ExpectationType(str, Enum):
+    REPLY_MATCHES = "reply_matches"
+    HAS_BUTTON = "has_button"
+    EDITED_WITHIN = "edited_within"
+
+
+@dataclass
+class Expectation:
+    type: ExpectationType
+    index: Optional[int] = None
+    pattern: Optional[str] = None
+    text: Optional[str] = None
+    within_ms: Optional[int] = None
+
+
+@dataclass
+class ExpectationResult:
+    index: int
+    passed: bool
+    detail: Optional[str] = None
+
+
+@dataclass
+class ExpectationVerdict:
+    passed: bool
+    results: List[ExpectationResult]
+    reply_count: int
+    elapsed_ms: int
+
+
+@dataclass
+class ProfileRequest:
+    bot_username: str
+    message_text: str
+    count: int = 10
+    concurrency: int = 1
+    timeout_sec: int = 5
+
+
+@dataclass
+class LatencyStats:
+    min_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+    mean_ms: float
+
+
+@dataclass
+class ProfileResponse:
+    bot_username: str
+    sent: int
+    replied: int
+    timeouts: int
+    errors: int
+    elapsed_ms: int
+    latency: Optional[LatencyStats] = None
+
+
+@dataclass
+class WarmupRequest:
+    bot_usernames: Optional[List[str]] = None
+    dialogs: bool = True
+    dialog_limit: Optional[int] = None
+    concurrency: int = 4
+
+
+class WarmupSource(str, Enum):
+    DIALOGS = "dialogs"
+    RESOLVED = "resolved"
+
+
+@dataclass
+class WarmupResult:
+    bot_username: str
+    resolved: bool
+    elapsed_ms: float
+    source: Optional[WarmupSource] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class WarmupResponse:
+    results: List[WarmupResult]
+    resolved: int
+    failed: int
+    dialogs_read: int
+    elapsed_ms: int
+
+
+@dataclass
+class InlineQueryRequest:
+    bot_username: str
+    query: str = ""
+    offset: Optional[str] = None
+    chat: Optional[str] = None
+    max_pages: int = 10
+
+
+@dataclass
+class InlineResult:
+    id: str
+    type: str
+    title: Optional[str] = None
+    description: Optional[str] = None
+    url: Optional[str] = None
+    message_text: Optional[str] = None
+    reply_markup: Optional[List[List[MessageButton]]] = None
+
+
+@dataclass
+class InlineQueryResponse:
+    bot_username: str
+    query: str
+    results: List[InlineResult]
+    cache_time: int
+    cached: bool
+    offset: Optional[str] = None
+    next_offset: Optional[str] = None
+    gallery: bool = False
+
+
+@dataclass
+class InlineChooseRequest:
+    bot_username: str
+    result_id: str
+    query: str = ""
+    offset: Optional[str] = None
+    chat: Optional[str] = None
+    timeout_sec: float = 0
+
+
+@dataclass
+class InlineChooseResponse:
+    sent: BotResponse
+    replies: List[BotResponse]
+
+
+@dataclass
+class LoadTestRequest:
+    bot_username: str
+    messages: List[str]
+    rate: float
+    duration_sec: float
+    timeout_sec: int = 5
+    accounts: Optional[List[TelegramCredentialsRequest]] = None
+    snapshot_interval_sec: float = 1.0
+    max_in_flight: int = 1000
+
+
+@dataclass
+class LoadTestSnapshot:
+    elapsed_ms: int
+    sent: int
+    replied: int
+    timeouts: int
+    errors: int
+    skipped: int
+    in_flight: int
+    send_rate: float
+    reply_rate: float
+    window_latency: Optional[LatencyStats] = None
+    latency: Optional[LatencyStats] = None
+    done: bool = False
+    error: Optional[str] = None
+
+
+@dataclass
+class SendMessageRequest:
+    bot_username: str
+    message_text: str
+    timeout_sec: Optional[int] = None
+    chat: Optional[str] = None  # Group or channel to talk to the bot in
+
+
+@dataclass
+class PressButtonRequest:
+    bot_username: str
+    button_text: Optional[str] = None
+    callback_data: Optional[str] = None
+    timeout_sec: Optional[int] = None
+    chat: Optional[str] = None
+
+
+class ResetMode(str, Enum):
+    DELETE = "delete"
+    LOGICAL = "logical"
+
+
+@dataclass
+class ResetChatRequest:
+    bot_username: str
+    mode: ResetMode = ResetMode.DELETE
+    revoke: bool = False
+
+
+@dataclass
+class ResetChatResponse:
+    bot_username: str
+    mode: ResetMode
+    deleted: int = 0
+    cursor: Optional[int] = None
+
+
+@dataclass
+class GetMessagesResponse:
+    messages: List[BotResponse]
+    state: Optional[str] = None
+    keyboards: Optional[Dict[str, List[List[MessageButton]]]] = None
+    removed: List[int] = field(default_factory=list)  # Delta polls: ids of messages that left the window
+
+
+@dataclass
+class SessionInfo:
+    token: str
+    account: str
+    created_at: datetime
+    last_used_at: datetime
+    expires_at: Optional[datetime] = None
+
+    def credentials(self) -> TelegramCredentialsRequest:
+        """Credentials to pass to the other calls in place of the registered ones."""
+        return TelegramCredentialsRequest(session_token=self.token)
+
+
+class ServiceState(str, Enum):
+    STARTING = "starting"
+    READY = "ready"
+    DRAINING = "draining"
+    STOPPED = "stopped"
+
+
+@dataclass
+class HealthStatus:
+    state: ServiceState
+    ready: bool
+    in_flight: int
+    queued: int
+    jobs_active: int
+    telegram_connected: Optional[bool] = None
+    reason: Optional[str] = None  # Why the default client failed for good, e.g. its session was revoked
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+@dataclass
+class BotCircuit:
+    bot_username: str
+    state: CircuitState
+    consecutive_silent: int
+    opened_at: Optional[datetime] = None
+    last_response_at: Optional[datetime] = None
+    rejected: int = 0
+
+
+@dataclass
+class TenantUsage:
+    tenant: str
+    weight: float
+    max_concurrency: int
+    rate: float
+    max_queued: int
+    in_flight: int
+    queued: int
+    admitted: int
+    completed: int
+    rejected: int
+    rate_limited: int
+    timed_out: int
+    busy_sec: float
+    avg_wait_ms: float
+    max_wait_ms: float
+    last_seen_at: Optional[datetime] = None
+
+
+@dataclass
+class SearchHit:
+    message_id: int
+    message_text: str
+    date: datetime
+    outgoing: bool
+
+
+@dataclass
+class SearchResponse:
+    hits: List[SearchHit]
+    next_before_id: Optional[int] = None
+    indexed: int = 0
+
+
+@dataclass
+class AsyncJobAccepted:
+    job_id: str
+
+
+class JobKind(str, Enum):
+    SEND_MESSAGE = "send_message"
+    PRESS_BUTTON = "press_button"
+    SCENARIO = "scenario"
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+@dataclass
+class ScenarioStep:
+    send_message: Optional[SendMessageRequest] = None
+    press_button: Optional[PressButtonRequest] = None
+
+
+@dataclass
+class JobRequest:
+    kind: JobKind
+    send_message: Optional[SendMessageRequest] = None
+    press_button: Optional[PressButtonRequest] = None
+    scenario: Optional[List[ScenarioStep]] = None
+    callback_url: Optional[str] = None
+
+
+@dataclass
+class JobInfo:
+    job_id: str
+    kind: JobKind
+    status: JobStatus
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    results: List[List[BotResponse]] = field(default_factory=list)
+    verdicts: List[Optional[ExpectationVerdict]] = field(default_factory=list)
+    # Per executed step, the limit that ended its collection early (None if it ran to its timeout)
+    truncated: List[Optional[str]] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+def _drop_none(obj: Any) -> Any:
+    if isinstance(obj, Enum):
+        return obj.value
+    if hasattr(obj, "__dict__"):
+        return {k: _drop_none(v) for k, v in obj.__dict__.items() if v is not None}
+    if isinstance(obj, list):
+        return [_drop_none(v) for v in obj]
+    return obj
+
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+class TeletestApiClient:
+    """Simple synchronous client for teletest-api.
+
+    Large responses arrive gzip or brotli encoded and are decoded by requests;
+    brotli is only negotiated with the ``brotli`` extra installed.
+    """
+
+    def __init__(self, base_url: str, session: Optional[requests.Session] = None, api_key: Optional[str] = None):
+        self.base_url = base_url.rstrip("/")
+        self.session = session or requests.Session()
+        if api_key is not None:
+            # Admits every request as the key's tenant
+            self.session.headers["X-Teletest-Api-Key"] = api_key
+
+    def _post(self, path: str, json: Dict[str, Any], creds: Optional[TelegramCredentialsRequest]) -> Dict[str, Any]:
+        resp = self.session.post(f"{self.base_url}{path}", json=json, headers=_build_headers(creds))
+        resp.raise_for_status()
+        return resp.json()
+
+    def _delete(self, path: str, creds: Optional[TelegramCredentialsRequest]) -> Dict[str, Any]:
+        resp = self.session.delete(f"{self.base_url}{path}", headers=_build_headers(creds))
+        resp.raise_for_status()
+        return resp.json()
+
+    def _get(self, path: str, params: Dict[str, Any], creds: Optional[TelegramCredentialsRequest]) -> Dict[str, Any]:
+        resp = self.session.get(f"{self.base_url}{path}", params=params, headers=_build_headers(creds))
+        resp.raise_for_status()
+        return resp.json()
+
+    def _parse_reply_markup(self, reply_markup_data: Any) -> Optional[List[List[MessageButton]]]:
+        if not reply_markup_data:
+            return None
+        return [
+            [MessageButton(**btn) for btn in row] for row in reply_markup_data
+        ]
+
+    def _parse_bot_response(self, resp: Dict[str, Any]) -> BotResponse:
+        return BotResponse(
+            response_type=ResponseType(resp["response_type"]),
+            message_id=resp.get("message_id"),
+            message_text=resp.get("message_text"),
+            reply_markup=self._parse_reply_markup(resp.get("reply_markup")),
+            reply_keyboard=resp.get("reply_keyboard"),
+            reply_markup_hash=resp.get("reply_markup_hash"),
+            callback_answer_text=resp.get("callback_answer_text"),
+            callback_answer_alert=resp.get("callback_answer_alert"),
+            popup_message=resp.get("popup_message"),
+            sent_at=_parse_datetime(resp.get("sent_at")),
+            date=_parse_datetime(resp.get("date")),
+            received_at=_parse_datetime(resp.get("received_at")),
+            truncated=resp.get("truncated"),
+        )
+
+    def send_message(self, req: SendMessageRequest, creds: Optional[TelegramCredentialsRequest] = None) -> List[BotResponse]:
+        data = {k: v for k, v in req.__dict__.items() if v is not None}
+        resp = self._post("/send-message", data, creds)
+        return [self._parse_bot_response(r) for r in resp]
+
+    def press_button(self, req: PressButtonRequest, creds: Optional[TelegramCredentialsRequest] = None) -> List[BotResponse]:
+        data = {k: v for k, v in req.__dict__.items() if v is not None}
+        resp = self._post("/press-button", data, creds)
+        return [self._parse_bot_response(r) for r in resp]
+
+    def get_messages(self, bot_username: str, limit: int = 5, creds: Optional[TelegramCredentialsRequest] = None) -> GetMessagesResponse:
+        resp = self._get("/get-messages", {"bot_username": bot_username, "limit": limit}, creds)
+        messages = [self._parse_bot_response(m) for m in resp["messages"]]
+        return GetMessagesResponse(messages=messages)
+
+    def get_messages_delta(
+        self,
+        bot_username: str,
+        state: Optional[str] = None,
+        limit: int = 5,
+        creds: Optional[TelegramCredentialsRequest] = None,
+    ) -> GetMessagesResponse:
+        """Only the messages new or changed since the poll that returned ``state`` (all of them without it).
+
+        Keyboards arrive once in ``keyboards``; messages carry ``reply_markup_hash`` instead.
+        Messages deleted or pushed out of the window since ``state`` are listed in ``removed``.
+        """
+        params: Dict[str, Any] = {"bot_username": bot_username, "limit": limit, "delta": True}
+        if state is not None:
+            params["state"] = state
+        resp = self._get("/get-messages", params, creds)
+        return GetMessagesResponse(
+            messages=[self._parse_bot_response(m) for m in resp["messages"]],
+            state=resp.get("state"),
+            keyboards={
+                key: self._parse_reply_markup(keyboard) for key, keyboard in (resp.get("keyboards") or {}).items()
+            },
+            removed=resp.get("removed") or [],
+        )
+
+    def search(
+        self,
+        bot_username: str,
+        query: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        before_id: Optional[int] = None,
+        limit: int = 20,
+        refresh: bool = True,
+        creds: Optional[TelegramCredentialsRequest] = None,
+    ) -> SearchResponse:
+        """Search the chat with the bot; pass ``next_before_id`` back as ``before_id`` for the next page."""
+        params: Dict[str, Any] = {"bot_username": bot_username, "limit": limit, "refresh": refresh}
+        if query is not None:
+            params["query"] = query
+        if since is not None:
+            params["since"] = since.isoformat()
+        if until is not None:
+            params["until"] = until.isoformat()
+        if before_id is not None:
+            params["before_id"] = before_id
+        resp = self._get("/search", params, creds)
+        return SearchResponse(
+            hits=[
+                SearchHit(
+                    message_id=h["message_id"],
+                    message_text=h["message_text"],
+                    date=_parse_datetime(h["date"]),
+                    outgoing=h["outgoing"],
+                )
+                for h in resp["hits"]
+            ],
+            next_before_id=resp.get("next_before_id"),
+            indexed=resp.get("indexed", 0),
+        )
+
+    def _parse_session(self, resp: Dict[str, Any]) -> SessionInfo:
+        return SessionInfo(
+            token=resp["token"],
+            account=resp["account"],
+            created_at=_parse_datetime(resp["created_at"]),
+            last_used_at=_parse_datetime(resp["last_used_at"]),
+            expires_at=_parse_datetime(resp.get("expires_at")),
+        )
+
+    def create_session(self, creds: TelegramCredentialsRequest) -> SessionInfo:
+        """Register the credentials once; pass ``info.credentials()`` to later calls instead."""
+        data = {"api_id": creds.api_id, "api_hash": creds.api_hash, "session_string": creds.session_string}
+        return self._parse_session(self._post("/sessions", data, None))
+
+    def get_session(self, token: str) -> SessionInfo:
+        return self._parse_session(self._get(f"/sessions/{token}", {}, None))
+
+    def delete_session(self, token: str) -> SessionInfo:
+        return self._parse_session(self._delete(f"/sessions/{token}", None))
+
+    def _parse_circuit(self, resp: Dict[str, Any]) -> BotCircuit:
+        return BotCircuit(
+            bot_username=resp["bot_username"],
+            state=CircuitState(resp["state"]),
+            consecutive_silent=resp["consecutive_silent"],
+            opened_at=_parse_datetime(resp.get("opened_at")),
+            last_response_at=_parse_datetime(resp.get("last_response_at")),
+            rejected=resp.get("rejected", 0),
+        )
+
+    def get_circuits(self) -> List[BotCircuit]:
+        """Circuit breaker state of every bot the service has talked to."""
+        return [self._parse_circuit(c) for c in self._get("/circuits", {}, None)]
+
+    def get_circuit(self, bot_username: str) -> BotCircuit:
+        return self._parse_circuit(self._get(f"/circuits/{bot_username}", {}, None))
+
+    def reset_circuit(self, bot_username: str) -> BotCircuit:
+        return self._parse_circuit(self._delete(f"/circuits/{bot_username}", None))
+
+    def _parse_health(self, resp: Dict[str, Any]) -> HealthStatus:
+        return HealthStatus(
+            state=ServiceState(resp["state"]),
+            ready=resp["ready"],
+            in_flight=resp["in_flight"],
+            queued=resp["queued"],
+            jobs_active=resp["jobs_active"],
+            telegram_connected=resp.get("telegram_connected"),
+            reason=resp.get("reason"),
+        )
+
+    def health(self) -> HealthStatus:
+        return self._parse_health(self._get("/health", {}, None))
+
+    def ready(self) -> HealthStatus:
+        """Readiness of the service; ``ready`` is False while it starts, drains or has no Telegram connection."""
+        resp = self.session.get(f"{self.base_url}/ready")
+        if resp.status_code != 503:
+            resp.raise_for_status()
+        return self._parse_health(resp.json())
+
+    def drain(self, wait: bool = False) -> HealthStatus:
+        """Turn away new interactions and jobs ahead of shutdown; with ``wait``, return once drained."""
+        return self._parse_health(self._post(f"/drain?wait={str(wait).lower()}", {}, None))
+
+    def _parse_tenant_usage(self, resp: Dict[str, Any]) -> TenantUsage:
+        return TenantUsage(**{**resp, "last_seen_at": _parse_datetime(resp.get("last_seen_at"))})
+
+    def get_tenants(self) -> List[TenantUsage]:
+        """Quotas and usage of every tenant."""
+        return [self._parse_tenant_usage(t) for t in self._get("/tenants", {}, None)]
+
+    def get_tenant(self, tenant: str) -> TenantUsage:
+        return self._parse_tenant_usage(self._get(f"/tenants/{tenant}", {}, None))
+
+    def reset_chat(self, req: ResetChatRequest, creds: Optional[TelegramCredentialsRequest] = None) -> ResetChatResponse:
+        """Delete the chat history with the bot, or only hide it from the service (``ResetMode.LOGICAL``)."""
+        resp = self._post("/reset-chat", {"bot_username": req.bot_username, "mode": req.mode.value, "revoke": req.revoke}, creds)
+        return ResetChatResponse(
+            bot_username=resp["bot_username"],
+            mode=ResetMode(resp["mode"]),
+            deleted=resp.get("deleted", 0),
+            cursor=resp.get("cursor"),
+        )
+
+    def send_message_async(self, req: SendMessageRequest, callback_url: str, creds: Optional[TelegramCredentialsRequest] = None) -> AsyncJobAccepted:
+        """Start the interaction in the background; replies are POSTed in batches to ``callback_url``."""
+        data = {k: v for k, v in req.__dict__.items() if v is not None}
+        data["callback_url"] = callback_url
+        resp = self._post("/send-message", data, creds)
+        return AsyncJobAccepted(job_id=resp["job_id"])
+
+    def press_button_async(self, req: PressButtonRequest, callback_url: str, creds: Optional[TelegramCredentialsRequest] = None) -> AsyncJobAccepted:
+        """Start the interaction in the background; replies are POSTed in batches to ``callback_url``."""
+        data = {k: v for k, v in req.__dict__.items() if v is not None}
+        data["callback_url"] = callback_url
+        resp = self._post("/press-button", data, creds)
+        return AsyncJobAccepted(job_id=resp["job_id"])
+
+    def _parse_job_info(self, resp: Dict[str, Any]) -> JobInfo:
+        return JobInfo(
+            job_id=resp["job_id"],
+            kind=JobKind(resp["kind"]),
+            status=JobStatus(resp["status"]),
+            created_at=resp["created_at"],
+            started_at=resp.get("started_at"),
+            finished_at=resp.get("finished_at"),
+            results=[[self._parse_bot_response(r) for r in step] for step in resp.get("results", [])],
+            verdicts=[self._parse_verdict(v) if v else None for v in resp.get("verdicts", [])],
+            truncated=resp.get("truncated", []),
+            error=resp.get("error"),
+        )
+
+    def create_job(self, req: JobRequest, creds: Optional[TelegramCredentialsRequest] = None) -> JobInfo:
+        return self._parse_job_info(self._post("/jobs", _drop_none(req), creds))
+
+    def get_job(self, job_id: str) -> JobInfo:
+        return self._parse_job_info(self._get(f"/jobs/{job_id}", {}, None))
+
+    def cancel_job(self, job_id: str) -> JobInfo:
+        return self._parse_job_info(self._delete(f"/jobs/{job_id}", None))
+
+    def _parse_verdict(self, resp: Dict[str, Any]) -> ExpectationVerdict:
+        return ExpectationVerdict(
+            passed=resp["passed"],
+            results=[ExpectationResult(**r) for r in resp["results"]],
+            reply_count=resp["reply_count"],
+            elapsed_ms=resp["elapsed_ms"],
+        )
+
+    def send_message_expect(self, req: SendMessageRequest, expectations: List[Expectation], creds: Optional[TelegramCredentialsRequest] = None) -> ExpectationVerdict:
+        """Send a message and let the server evaluate ``expectations`` against the replies."""
+        data = _drop_none(req)
+        data["expectations"] = _drop_none(expectations)
+        return self._parse_verdict(self._post("/send-message", data, creds))
+
+    def press_button_expect(self, req: PressButtonRequest, expectations: List[Expectation], creds: Optional[TelegramCredentialsRequest] = None) -> ExpectationVerdict:
+        """Press a button and let the server evaluate ``expectations`` against the replies."""
+        data = _drop_none(req)
+        data["expectations"] = _drop_none(expectations)
+        return self._parse_verdict(self._post("/press-button", data, creds))
+
+    def profile(self, req: ProfileRequest, creds: Optional[TelegramCredentialsRequest] = None) -> ProfileResponse:
+        """Measure the bot's time to first reply over ``req.count`` messages."""
+        resp = self._post("/profile", _drop_none(req), creds)
+        latency = resp.get("latency")
+        return ProfileResponse(
+            bot_username=resp["bot_username"],
+            sent=resp["sent"],
+            replied=resp["replied"],
+            timeouts=resp["timeouts"],
+            errors=resp["errors"],
+            elapsed_ms=resp["elapsed_ms"],
+            latency=LatencyStats(**latency) if latency else None,
+        )
+
+    def warmup(self, req: Optional[WarmupRequest] = None, creds: Optional[TelegramCredentialsRequest] = None) -> WarmupResponse:
+        """Resolve bots ahead of time; without ``bot_usernames`` every bot in the account's dialogs."""
+        resp = self._post("/warmup", _drop_none(req or WarmupRequest()), creds)
+        return WarmupResponse(
+            results=[
+                WarmupResult(
+                    bot_username=r["bot_username"],
+                    resolved=r["resolved"],
+                    elapsed_ms=r["elapsed_ms"],
+                    source=WarmupSource(r["source"]) if r.get("source") else None,
+                    error=r.get("error"),
+                )
+                for r in resp["results"]
+            ],
+            resolved=resp["resolved"],
+            failed=resp["failed"],
+            dialogs_read=resp["dialogs_read"],
+            elapsed_ms=resp["elapsed_ms"],
+        )
+
+    def _parse_inline_response(self, data: Dict[str, Any]) -> InlineQueryResponse:
+        return InlineQueryResponse(
+            bot_username=data["bot_username"],
+            query=data["query"],
+            results=[
+                InlineResult(**{**r, "reply_markup": self._parse_reply_markup(r.get("reply_markup"))})
+                for r in data["results"]
+            ],
+            cache_time=data["cache_time"],
+            cached=data["cached"],
+            offset=data.get("offset"),
+            next_offset=data.get("next_offset"),
+            gallery=data.get("gallery", False),
+        )
+
+    def inline_query(self, req: InlineQueryRequest, creds: Optional[TelegramCredentialsRequest] = None) -> InlineQueryResponse:
+        """One page of the bot's inline results; pass ``next_offset`` back as ``offset`` for the next."""
+        return self._parse_inline_response(self._post("/inline-query", _drop_none(req), creds))
+
+    def inline_query_pages(
+        self, req: InlineQueryRequest, creds: Optional[TelegramCredentialsRequest] = None
+    ) -> Iterator[InlineQueryResponse]:
+        """Pages of the bot's inline results, up to ``max_pages``, yielded as the server streams them."""
+        with self.session.post(
+            f"{self.base_url}/inline-query/pages", json=_drop_none(req), headers=_build_headers(creds), stream=True
+        ) as resp:
+            resp.raise_for_status()
+            for line in resp.iter_lines():
+                if line:
+                    yield self._parse_inline_response(json.loads(line))
+
+    def choose_inline_result(
+        self, req: InlineChooseRequest, creds: Optional[TelegramCredentialsRequest] = None
+    ) -> InlineChooseResponse:
+        """Send an inline result to the chat and collect the bot's messages for ``timeout_sec``."""
+        resp = self._post("/inline-query/choose", _drop_none(req), creds)
+        return InlineChooseResponse(
+            sent=self._parse_bot_response(resp["sent"]),
+            replies=[self._parse_bot_response(r) for r in resp["replies"]],
+        )
+
+    def load_test(self, req: LoadTestRequest, creds: Optional[TelegramCredentialsRequest] = None) -> Iterator[LoadTestSnapshot]:
+        """Run a load test, yielding snapshots as the server streams them; the last one has ``done`` set."""
+        with self.session.post(
+            f"{self.base_url}/load-test", json=_drop_none(req), headers=_build_headers(creds), stream=True
+        ) as resp:
+            resp.raise_for_status()
+            for line in resp.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                for key in ("window_latency", "latency"):
+                    if data.get(key):
+                        data[key] = LatencyStats(**data[key])
+                yield LoadTestSnapshot(**data)
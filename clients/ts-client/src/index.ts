@@ -1,9 +1,21 @@
 import axios, { AxiosInstance } from 'axios';
+import * as http from 'http';
+import * as https from 'https';
 
 export interface TelegramCredentialsRequest {
   api_id?: number;
   api_hash?: string;
   session_string?: string;
+  /** From createSession; replaces the three fields above. */
+  session_token?: string;
+}
+
+export interface SessionInfo {
+  token: string;
+  account: string;
+  created_at: string;
+  last_used_at: string;
+  expires_at?: string | null;
 }
 
 export interface MessageButton {
@@ -23,15 +35,175 @@ export interface BotResponse {
   message_text?: string;
   reply_markup?: MessageButton[][] | null;
   reply_keyboard?: boolean | null;
+  /** Delta polls: key of the keyboard in GetMessagesResponse.keyboards, sent instead of reply_markup. */
+  reply_markup_hash?: string | null;
   callback_answer_text?: string;
   callback_answer_alert?: boolean;
   popup_message?: string;
+  sent_at?: string | null;
+  date?: string | null;
+  received_at?: string | null;
+  truncated?: boolean | null;
+}
+
+export type ExpectationType = 'reply_matches' | 'has_button' | 'edited_within';
+
+export interface Expectation {
+  type: ExpectationType;
+  index?: number;
+  pattern?: string;
+  text?: string;
+  within_ms?: number;
+}
+
+export interface ExpectationResult {
+  index: number;
+  passed: boolean;
+  detail?: string | null;
+}
+
+export interface ExpectationVerdict {
+  passed: boolean;
+  results: ExpectationResult[];
+  reply_count: number;
+  elapsed_ms: number;
+}
+
+export interface ProfileRequest {
+  bot_username: string;
+  message_text: string;
+  count?: number;
+  concurrency?: number;
+  timeout_sec?: number;
+}
+
+export interface LatencyStats {
+  min_ms: number;
+  p50_ms: number;
+  p95_ms: number;
+  p99_ms: number;
+  max_ms: number;
+  mean_ms: number;
+}
+
+export interface ProfileResponse {
+  bot_username: string;
+  sent: number;
+  replied: number;
+  timeouts: number;
+  errors: number;
+  elapsed_ms: number;
+  latency?: LatencyStats | null;
+}
+
+export interface WarmupRequest {
+  /** Defaults to the bots among the account's dialogs. */
+  bot_usernames?: string[];
+  dialogs?: boolean;
+  dialog_limit?: number;
+  concurrency?: number;
+}
+
+export type WarmupSource = 'dialogs' | 'resolved';
+
+export interface WarmupResult {
+  bot_username: string;
+  resolved: boolean;
+  source?: WarmupSource | null;
+  elapsed_ms: number;
+  error?: string | null;
+}
+
+export interface WarmupResponse {
+  results: WarmupResult[];
+  resolved: number;
+  failed: number;
+  dialogs_read: number;
+  elapsed_ms: number;
+}
+
+export interface InlineQueryRequest {
+  bot_username: string;
+  query?: string;
+  /** A previous page's `next_offset`. */
+  offset?: string;
+  /** Group or channel the query is typed in; defaults to the bot's private chat. */
+  chat?: string;
+  /** `inlineQueryPages` only. */
+  max_pages?: number;
+}
+
+export interface InlineResult {
+  id: string;
+  type: string;
+  title?: string | null;
+  description?: string | null;
+  url?: string | null;
+  message_text?: string | null;
+  reply_markup?: MessageButton[][] | null;
+}
+
+export interface InlineQueryResponse {
+  bot_username: string;
+  query: string;
+  offset?: string | null;
+  results: InlineResult[];
+  /** Null on the last page. */
+  next_offset?: string | null;
+  gallery: boolean;
+  cache_time: number;
+  /** Served from the service's cache rather than Telegram. */
+  cached: boolean;
+}
+
+export interface InlineChooseRequest {
+  bot_username: string;
+  result_id: string;
+  query?: string;
+  offset?: string;
+  chat?: string;
+  timeout_sec?: number;
+}
+
+export interface InlineChooseResponse {
+  sent: BotResponse;
+  replies: BotResponse[];
+}
+
+export interface LoadTestRequest {
+  bot_username: string;
+  messages: string[];
+  rate: number;
+  duration_sec: number;
+  timeout_sec?: number;
+  accounts?: TelegramCredentialsRequest[];
+  snapshot_interval_sec?: number;
+  max_in_flight?: number;
+}
+
+export interface LoadTestSnapshot {
+  elapsed_ms: number;
+  sent: number;
+  replied: number;
+  timeouts: number;
+  errors: number;
+  skipped: number;
+  in_flight: number;
+  send_rate: number;
+  reply_rate: number;
+  window_latency?: LatencyStats;
+  latency?: LatencyStats;
+  done: boolean;
+  error?: string;
 }
 
 export interface SendMessageRequest {
   bot_username: string;
   message_text: string;
   timeout_sec?: number;
+  callback_url?: string;
+  /** Group or channel (username, link or numeric id) to talk to the bot in instead of its private chat. */
+  chat?: string;
 }
 
 export interface PressButtonRequest {
@@ -39,10 +211,149 @@ export interface PressButtonRequest {
   button_text?: string;
   callback_data?: string;
   timeout_sec?: number;
+  callback_url?: string;
+  chat?: string;
 }
 
 export interface GetMessagesResponse {
   messages: BotResponse[];
+  /** Delta polls: token for the next poll, and the keyboards not sent before. */
+  state?: string | null;
+  keyboards?: Record<string, MessageButton[][]> | null;
+  /** Delta polls: ids of messages that left the window since the token. */
+  removed?: number[] | null;
+}
+
+export type ServiceState = 'starting' | 'ready' | 'draining' | 'stopped';
+
+export interface HealthStatus {
+  state: ServiceState;
+  /** Whether to route new requests here. */
+  ready: boolean;
+  /** The default client's connection; null in replay mode. */
+  telegram_connected?: boolean | null;
+  in_flight: number;
+  queued: number;
+  jobs_active: number;
+  /** Why the default client failed for good, e.g. its session was revoked. */
+  reason?: string | null;
+}
+
+export type CircuitState = 'closed' | 'open' | 'half_open';
+
+export interface TenantUsage {
+  tenant: string;
+  weight: number;
+  max_concurrency: number;
+  /** Requests per second; 0 when not limited. */
+  rate: number;
+  max_queued: number;
+  in_flight: number;
+  queued: number;
+  admitted: number;
+  completed: number;
+  /** Turned away with a full queue. */
+  rejected: number;
+  rate_limited: number;
+  /** Gave up waiting in the queue. */
+  timed_out: number;
+  busy_sec: number;
+  avg_wait_ms: number;
+  max_wait_ms: number;
+  last_seen_at?: string | null;
+}
+
+export interface BotCircuit {
+  bot_username: string;
+  state: CircuitState;
+  consecutive_silent: number;
+  opened_at?: string | null;
+  last_response_at?: string | null;
+  rejected: number;
+}
+
+export interface SearchParams {
+  bot_username: string;
+  query?: string;
+  since?: string;
+  until?: string;
+  before_id?: number;
+  limit?: number;
+  refresh?: boolean;
+}
+
+export interface SearchHit {
+  message_id: number;
+  message_text: string;
+  date: string;
+  outgoing: boolean;
+}
+
+export interface SearchResponse {
+  hits: SearchHit[];
+  next_before_id?: number | null;
+  indexed: number;
+}
+
+export type ResetMode = 'delete' | 'logical';
+
+export interface ResetChatRequest {
+  bot_username: string;
+  mode?: ResetMode;
+  revoke?: boolean;
+}
+
+export interface ResetChatResponse {
+  bot_username: string;
+  mode: ResetMode;
+  deleted: number;
+  cursor?: number | null;
+}
+
+export interface AsyncJobAccepted {
+  job_id: string;
+}
+
+export interface WebhookBatch {
+  job_id: string;
+  sequence: number;
+  responses: BotResponse[];
+  dropped: number;
+  done: boolean;
+  error?: string | null;
+  /** Limit that ended a step's collection early, on the first batch after it. */
+  truncated?: string | null;
+}
+
+export type JobKind = 'send_message' | 'press_button' | 'scenario';
+
+export type JobStatus = 'queued' | 'running' | 'succeeded' | 'failed' | 'cancelled';
+
+export interface ScenarioStep {
+  send_message?: SendMessageRequest;
+  press_button?: PressButtonRequest;
+}
+
+export interface JobRequest {
+  kind: JobKind;
+  send_message?: SendMessageRequest;
+  press_button?: PressButtonRequest;
+  scenario?: ScenarioStep[];
+  callback_url?: string;
+}
+
+export interface JobInfo {
+  job_id: string;
+  kind: JobKind;
+  status: JobStatus;
+  created_at: number;
+  started_at?: number | null;
+  finished_at?: number | null;
+  results: BotResponse[][];
+  verdicts: (ExpectationVerdict | null)[];
+  /** Per executed step, the limit that ended its collection early. */
+  truncated?: (string | null)[];
+  error?: string | null;
 }
 
 function buildHeaders(creds?: TelegramCredentialsRequest): Record<string, string> {
@@ -51,33 +362,320 @@ function buildHeaders(creds?: TelegramCredentialsRequest): Record<string, string
   if (creds.api_id !== undefined) headers['X-Telegram-Api-Id'] = String(creds.api_id);
   if (creds.api_hash !== undefined) headers['X-Telegram-Api-Hash'] = creds.api_hash;
   if (creds.session_string !== undefined) headers['X-Telegram-Session-String'] = creds.session_string;
+  if (creds.session_token !== undefined) headers['X-Telegram-Session-Token'] = creds.session_token;
   return headers;
 }
 
+export interface TeletestClientOptions {
+  /** Use this axios instance as is instead of building one. */
+  http?: AxiosInstance;
+  /** Reuse connections between requests (default true). */
+  keepAlive?: boolean;
+  /** Sockets per host kept by the agents (default 64). */
+  maxSockets?: number;
+  /** Requests in flight at once, streams included; further calls wait (default unlimited). */
+  maxConcurrency?: number;
+  /** Per-request timeout in milliseconds (default none); also sent to the server as X-Request-Deadline. */
+  timeoutMs?: number;
+  /** Sent as X-Teletest-Api-Key, so every request is admitted as the key's tenant. */
+  apiKey?: string;
+}
+
+export interface RunScenarioOptions {
+  /** First poll delay; doubles up to maxPollIntervalMs (default 200). */
+  pollIntervalMs?: number;
+  maxPollIntervalMs?: number;
+  /** Give up waiting (the job keeps running) after this long (default 5 minutes). */
+  timeoutMs?: number;
+}
+
+const TERMINAL_JOB_STATUSES: JobStatus[] = ['succeeded', 'failed', 'cancelled'];
+
+/** Caps how many promises run at once; callers beyond the cap wait in FIFO order. */
+export class ConcurrencyLimiter {
+  private active = 0;
+  private waiting: (() => void)[] = [];
+
+  constructor(private readonly max: number = Infinity) {}
+
+  async acquire(): Promise<void> {
+    if (this.active < this.max) {
+      this.active++;
+      return;
+    }
+    // The slot is handed over directly by release()
+    await new Promise<void>(resolve => this.waiting.push(resolve));
+  }
+
+  release(): void {
+    const next = this.waiting.shift();
+    if (next) next();
+    else this.active--;
+  }
+
+  async run<T>(fn: () => Promise<T>): Promise<T> {
+    await this.acquire();
+    try {
+      return await fn();
+    } finally {
+      this.release();
+    }
+  }
+}
+
+function createHttp(options: TeletestClientOptions): AxiosInstance {
+  const keepAlive = options.keepAlive ?? true;
+  const maxSockets = options.maxSockets ?? 64;
+  const instance = axios.create({
+    // Responses above the server's size threshold are gzip or brotli encoded; axios negotiates and decodes them
+    decompress: true,
+    timeout: options.timeoutMs ?? 0,
+    httpAgent: new http.Agent({ keepAlive, maxSockets }),
+    httpsAgent: new https.Agent({ keepAlive, maxSockets })
+  });
+  const timeoutMs = options.timeoutMs;
+  if (timeoutMs) {
+    // Tell the server when this client gives up, so it returns what it has collected by then
+    instance.interceptors.request.use(config => {
+      config.headers.set('X-Request-Deadline', ((Date.now() + timeoutMs) / 1000).toFixed(3));
+      return config;
+    });
+  }
+  return instance;
+}
+
+const sleep = (ms: number) => new Promise(resolve => setTimeout(resolve, ms));
+
 export class TeletestApiClient {
-  constructor(private baseUrl: string, private http: AxiosInstance = axios.create()) {}
+  private http: AxiosInstance;
+  private limiter: ConcurrencyLimiter;
 
-  async sendMessage(req: SendMessageRequest, creds?: TelegramCredentialsRequest): Promise<BotResponse[]> {
-    const resp = await this.http.post<BotResponse[]>(`${this.baseUrl}/send-message`, req, {
-      headers: buildHeaders(creds)
+  /** The second argument may also be an axios instance, used as is. */
+  constructor(private baseUrl: string, options: AxiosInstance | TeletestClientOptions = {}) {
+    const opts: TeletestClientOptions = typeof options === 'function' ? { http: options } : options;
+    this.http = opts.http ?? createHttp(opts);
+    if (opts.apiKey !== undefined) this.http.defaults.headers.common['X-Teletest-Api-Key'] = opts.apiKey;
+    this.limiter = new ConcurrencyLimiter(opts.maxConcurrency ?? Infinity);
+  }
+
+  private async post<T>(path: string, body: unknown, creds?: TelegramCredentialsRequest): Promise<T> {
+    return this.limiter.run(async () => {
+      const resp = await this.http.post<T>(`${this.baseUrl}${path}`, body, { headers: buildHeaders(creds) });
+      return resp.data;
     });
-    return resp.data;
   }
 
-  async pressButton(req: PressButtonRequest, creds?: TelegramCredentialsRequest): Promise<BotResponse[]> {
-    const resp = await this.http.post<BotResponse[]>(`${this.baseUrl}/press-button`, req, {
-      headers: buildHeaders(creds)
+  private async get<T>(path: string, params?: Record<string, unknown>, creds?: TelegramCredentialsRequest): Promise<T> {
+    return this.limiter.run(async () => {
+      const resp = await this.http.get<T>(`${this.baseUrl}${path}`, { headers: buildHeaders(creds), params });
+      return resp.data;
+    });
+  }
+
+  private async delete<T>(path: string): Promise<T> {
+    return this.limiter.run(async () => {
+      const resp = await this.http.delete<T>(`${this.baseUrl}${path}`);
+      return resp.data;
     });
-    return resp.data;
+  }
+
+  /**
+   * POSTs to an NDJSON streaming endpoint and yields each line as it arrives.
+   * Breaking out of the loop aborts the request, which also stops the work on the server.
+   */
+  async *stream<T>(path: string, body: unknown, creds?: TelegramCredentialsRequest): AsyncGenerator<T> {
+    await this.limiter.acquire();
+    const controller = new AbortController();
+    try {
+      const resp = await this.http.post<NodeJS.ReadableStream>(`${this.baseUrl}${path}`, body, {
+        headers: buildHeaders(creds),
+        responseType: 'stream',
+        signal: controller.signal
+      });
+      let buffered = '';
+      resp.data.setEncoding('utf8');
+      for await (const chunk of resp.data as AsyncIterable<string>) {
+        buffered += chunk;
+        let newline: number;
+        while ((newline = buffered.indexOf('\n')) >= 0) {
+          const line = buffered.slice(0, newline).trim();
+          buffered = buffered.slice(newline + 1);
+          if (line) yield JSON.parse(line) as T;
+        }
+      }
+      if (buffered.trim()) yield JSON.parse(buffered) as T;
+    } finally {
+      controller.abort();
+      this.limiter.release();
+    }
+  }
+
+  async sendMessage(req: SendMessageRequest, creds?: TelegramCredentialsRequest): Promise<BotResponse[]> {
+    return this.post<BotResponse[]>('/send-message', req, creds);
+  }
+
+  async pressButton(req: PressButtonRequest, creds?: TelegramCredentialsRequest): Promise<BotResponse[]> {
+    return this.post<BotResponse[]>('/press-button', req, creds);
+  }
+
+  async sendMessageAsync(req: SendMessageRequest, callbackUrl: string, creds?: TelegramCredentialsRequest): Promise<AsyncJobAccepted> {
+    return this.post<AsyncJobAccepted>('/send-message', { ...req, callback_url: callbackUrl }, creds);
+  }
+
+  async pressButtonAsync(req: PressButtonRequest, callbackUrl: string, creds?: TelegramCredentialsRequest): Promise<AsyncJobAccepted> {
+    return this.post<AsyncJobAccepted>('/press-button', { ...req, callback_url: callbackUrl }, creds);
+  }
+
+  async sendMessageExpect(req: SendMessageRequest, expectations: Expectation[], creds?: TelegramCredentialsRequest): Promise<ExpectationVerdict> {
+    return this.post<ExpectationVerdict>('/send-message', { ...req, expectations }, creds);
+  }
+
+  async pressButtonExpect(req: PressButtonRequest, expectations: Expectation[], creds?: TelegramCredentialsRequest): Promise<ExpectationVerdict> {
+    return this.post<ExpectationVerdict>('/press-button', { ...req, expectations }, creds);
   }
 
   async getMessages(bot_username: string, limit = 5, creds?: TelegramCredentialsRequest): Promise<GetMessagesResponse> {
-    const resp = await this.http.get<GetMessagesResponse>(`${this.baseUrl}/get-messages`, {
-      headers: buildHeaders(creds),
-      params: { bot_username, limit }
+    return this.get<GetMessagesResponse>('/get-messages', { bot_username, limit }, creds);
+  }
+
+  /**
+   * Only the messages that are new or changed since the poll that returned `state`
+   * (all of them without it). Keyboards arrive once in `keyboards`; messages carry
+   * `reply_markup_hash` instead.
+   */
+  async getMessagesDelta(bot_username: string, state?: string | null, limit = 5, creds?: TelegramCredentialsRequest): Promise<GetMessagesResponse> {
+    const params: Record<string, unknown> = { bot_username, limit, delta: true };
+    if (state) params.state = state;
+    return this.get<GetMessagesResponse>('/get-messages', params, creds);
+  }
+
+  async search(params: SearchParams, creds?: TelegramCredentialsRequest): Promise<SearchResponse> {
+    return this.get<SearchResponse>('/search', { ...params }, creds);
+  }
+
+  /** Register the credentials once; pass `{ session_token: info.token }` to later calls instead. */
+  async createSession(creds: TelegramCredentialsRequest): Promise<SessionInfo> {
+    const { api_id, api_hash, session_string } = creds;
+    return this.post<SessionInfo>('/sessions', { api_id, api_hash, session_string });
+  }
+
+  async getSession(token: string): Promise<SessionInfo> {
+    return this.get<SessionInfo>(`/sessions/${encodeURIComponent(token)}`);
+  }
+
+  async deleteSession(token: string): Promise<SessionInfo> {
+    return this.delete<SessionInfo>(`/sessions/${encodeURIComponent(token)}`);
+  }
+
+  async health(): Promise<HealthStatus> {
+    return this.get<HealthStatus>('/health');
+  }
+
+  /** Readiness of the service; `ready` is false while it starts, drains or has no Telegram connection. */
+  async ready(): Promise<HealthStatus> {
+    const resp = await this.http.get<HealthStatus>(`${this.baseUrl}/ready`, {
+      validateStatus: status => status === 200 || status === 503
     });
     return resp.data;
   }
+
+  /** Turns away new interactions and jobs ahead of shutdown; with `wait`, resolves once drained. */
+  async drain(wait = false): Promise<HealthStatus> {
+    return this.post<HealthStatus>(`/drain?wait=${wait}`, {});
+  }
+
+  /** Quotas and usage of every tenant. */
+  async getTenants(): Promise<TenantUsage[]> {
+    return this.get<TenantUsage[]>('/tenants');
+  }
+
+  async getTenant(tenant: string): Promise<TenantUsage> {
+    return this.get<TenantUsage>(`/tenants/${encodeURIComponent(tenant)}`);
+  }
+
+  async getCircuits(): Promise<BotCircuit[]> {
+    return this.get<BotCircuit[]>('/circuits');
+  }
+
+  async getCircuit(bot_username: string): Promise<BotCircuit> {
+    return this.get<BotCircuit>(`/circuits/${encodeURIComponent(bot_username)}`);
+  }
+
+  async resetCircuit(bot_username: string): Promise<BotCircuit> {
+    return this.delete<BotCircuit>(`/circuits/${encodeURIComponent(bot_username)}`);
+  }
+
+  async resetChat(req: ResetChatRequest, creds?: TelegramCredentialsRequest): Promise<ResetChatResponse> {
+    return this.post<ResetChatResponse>('/reset-chat', req, creds);
+  }
+
+  async profile(req: ProfileRequest, creds?: TelegramCredentialsRequest): Promise<ProfileResponse> {
+    return this.post<ProfileResponse>('/profile', req, creds);
+  }
+
+  /** Resolves bots ahead of the first interactions with them. */
+  async warmup(req: WarmupRequest = {}, creds?: TelegramCredentialsRequest): Promise<WarmupResponse> {
+    return this.post<WarmupResponse>('/warmup', req, creds);
+  }
+
+  /** One page of the bot's inline results; pass `next_offset` back as `offset` for the next. */
+  async inlineQuery(req: InlineQueryRequest, creds?: TelegramCredentialsRequest): Promise<InlineQueryResponse> {
+    return this.post<InlineQueryResponse>('/inline-query', req, creds);
+  }
+
+  /** Pages of the bot's inline results, up to `max_pages`, yielded as they arrive. */
+  inlineQueryPages(req: InlineQueryRequest, creds?: TelegramCredentialsRequest): AsyncGenerator<InlineQueryResponse> {
+    return this.stream<InlineQueryResponse>('/inline-query/pages', req, creds);
+  }
+
+  /** Sends an inline result to the chat and collects the bot's messages for `timeout_sec`. */
+  async chooseInlineResult(req: InlineChooseRequest, creds?: TelegramCredentialsRequest): Promise<InlineChooseResponse> {
+    return this.post<InlineChooseResponse>('/inline-query/choose', req, creds);
+  }
+
+  /** Runs a load test, yielding snapshots as they arrive; the last one has `done` set. */
+  loadTestStream(req: LoadTestRequest, creds?: TelegramCredentialsRequest): AsyncGenerator<LoadTestSnapshot> {
+    return this.stream<LoadTestSnapshot>('/load-test', req, creds);
+  }
+
+  /** Runs a load test and resolves with all snapshots once the final one has arrived. */
+  async loadTest(req: LoadTestRequest, creds?: TelegramCredentialsRequest): Promise<LoadTestSnapshot[]> {
+    const snapshots: LoadTestSnapshot[] = [];
+    for await (const snapshot of this.loadTestStream(req, creds)) snapshots.push(snapshot);
+    return snapshots;
+  }
+
+  async createJob(req: JobRequest, creds?: TelegramCredentialsRequest): Promise<JobInfo> {
+    return this.post<JobInfo>('/jobs', req, creds);
+  }
+
+  async getJob(jobId: string): Promise<JobInfo> {
+    return this.get<JobInfo>(`/jobs/${jobId}`);
+  }
+
+  async cancelJob(jobId: string): Promise<JobInfo> {
+    return this.delete<JobInfo>(`/jobs/${jobId}`);
+  }
+
+  /**
+   * Runs several sends and presses as one server-side scenario job and waits for it to finish.
+   * Replaces one HTTP round trip per step with one job plus a few polls; per-step replies are in `results`.
+   */
+  async runScenario(steps: ScenarioStep[], creds?: TelegramCredentialsRequest, options: RunScenarioOptions = {}): Promise<JobInfo> {
+    const deadline = Date.now() + (options.timeoutMs ?? 300_000);
+    let interval = options.pollIntervalMs ?? 200;
+    const maxInterval = options.maxPollIntervalMs ?? 2_000;
+    let job = await this.createJob({ kind: 'scenario', scenario: steps }, creds);
+    while (!TERMINAL_JOB_STATUSES.includes(job.status)) {
+      if (Date.now() >= deadline) {
+        throw new Error(`Scenario job ${job.job_id} did not finish in time (status ${job.status})`);
+      }
+      await sleep(Math.min(interval, Math.max(deadline - Date.now(), 0)));
+      interval = Math.min(interval * 2, maxInterval);
+      job = await this.getJob(job.job_id);
+    }
+    return job;
+  }
 }
 
 export default TeletestApiClient;
@@ -1,5 +1,5 @@
 import uvicorn
-from .app import app
+from .app import create_app
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(create_app(), host="0.0.0.0", port=8000)
@@ -0,0 +1,346 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import AsyncIterator, Deque, Dict, List, Mapping, Optional, Tuple
+
+from fastapi import HTTPException
+
+from .models import TenantUsage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class TenantQuota:
+    """What one tenant may use of the interaction endpoints."""
+    weight: float = 1  # Share of the slots when tenants compete for them
+    max_concurrency: int = 64  # Requests running at once
+    rate: float = 0  # Requests admitted per second on average; 0 leaves the rate free
+    burst: int = 0  # Requests admitted at once above the rate; defaults to one second's worth
+    max_queued: int = 1000  # Requests waiting for a slot before further ones are rejected
+
+
+def parse_tenants(spec: str, default: TenantQuota) -> Tuple[Dict[str, TenantQuota], Dict[str, str]]:
+    """Quotas by tenant and tenant by API key, from ``name:key=...,weight=...;name2:...``.
+
+    Each tenant lists its API ``key`` and any of ``weight``, ``concurrency``,
+    ``rate``, ``burst`` and ``queue`` that differ from ``default``.
+    """
+    fields = {
+        "weight": ("weight", float),
+        "concurrency": ("max_concurrency", int),
+        "rate": ("rate", float),
+        "burst": ("burst", int),
+        "queue": ("max_queued", int),
+    }
+    quotas: Dict[str, TenantQuota] = {}
+    keys: Dict[str, str] = {}
+    for entry in filter(None, (part.strip() for part in spec.split(";"))):
+        name, _, options = entry.partition(":")
+        name = name.strip()
+        values = {}
+        for option in filter(None, (part.strip() for part in options.split(","))):
+            option_name, _, value = option.partition("=")
+            option_name = option_name.strip()
+            if option_name == "key":
+                keys[value.strip()] = name
+            elif option_name in fields:
+                attr, convert = fields[option_name]
+                values[attr] = convert(value)
+            else:
+                raise ValueError(f"Unknown option {option_name!r} for tenant {name!r}")
+        quota = quotas[name] = TenantQuota(**{**default.__dict__, **values})
+        if quota.weight <= 0:
+            raise ValueError(f"Tenant {name!r} needs a positive weight")
+    return quotas, keys
+
+
+class _Tenant:
+    def __init__(self, name: str, quota: TenantQuota, configured: bool) -> None:
+        self.name = name
+        self.quota = quota
+        self.configured = configured
+        self.queue: Deque[asyncio.Future] = deque()
+        self.in_flight = 0
+        self.finish_tag = 0.0  # Virtual time at which the tenant's last dispatched request ends its share
+        self.tokens = float(self.burst)
+        self.refilled_at = time.monotonic()
+        self.service_sec = 1.0  # Moving average of request durations, for Retry-After estimates
+        self.admitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rate_limited = 0
+        self.timed_out = 0
+        self.busy_sec = 0.0
+        self.wait_sec = 0.0
+        self.max_wait_sec = 0.0
+        self.last_seen_at: Optional[datetime] = None
+
+    @property
+    def burst(self) -> int:
+        return self.quota.burst or max(1, math.ceil(self.quota.rate))
+
+    @property
+    def idle(self) -> bool:
+        return not self.in_flight and not self.queue
+
+
+class AdmissionControl:
+    """Admits requests to the interaction endpoints by tenant, sharing the slots fairly.
+
+    A tenant is a team calling with an API key, or else the account whose
+    credentials a request carries. At most ``capacity`` requests run at once
+    (0 for no limit), and each tenant at most its ``max_concurrency``.
+    Requests beyond that wait in a per-tenant queue. Freed slots go to the
+    tenant with the smallest virtual finish tag, so competing tenants get
+    slots in proportion to their weights however many requests each queues.
+    A full queue and an exceeded rate are answered with a 429 and the
+    ``Retry-After`` to wait; a request still queued after ``queue_timeout``
+    seconds gets a 503. Credential tenants that are idle are forgotten
+    beyond ``max_tenants``.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 256,
+        default: TenantQuota = TenantQuota(),
+        tenants: Optional[Mapping[str, TenantQuota]] = None,
+        api_keys: Optional[Mapping[str, str]] = None,
+        queue_timeout: float = 30,
+        max_tenants: int = 1000,
+    ) -> None:
+        self.capacity = capacity
+        self.default = default
+        self.queue_timeout = queue_timeout
+        self.max_tenants = max_tenants
+        self._api_keys = dict(api_keys or {})
+        self._tenants: Dict[str, _Tenant] = {
+            name: _Tenant(name, quota, True) for name, quota in (tenants or {}).items()
+        }
+        self._in_flight = 0
+        self._virtual_time = 0.0
+        self._closed = False
+        self._idle_waiters: List[asyncio.Event] = []  # One per wait_idle caller
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queued(self) -> int:
+        return sum(len(t.queue) for t in self._tenants.values())
+
+    def close(self) -> None:
+        """Turn away further requests with a 503; those running and queued still run."""
+        self._closed = True
+
+    async def wait_idle(self, timeout: float) -> bool:
+        """Wait up to ``timeout`` seconds for the running and queued requests to finish; False if some did not."""
+        if not self._in_flight and not self.queued:
+            return True
+        idle = asyncio.Event()
+        self._idle_waiters.append(idle)
+        try:
+            await asyncio.wait_for(idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._idle_waiters.remove(idle)
+        return True
+
+    def identify(self, api_key: Optional[str], account: str) -> str:
+        """Tenant of a request: the one ``api_key`` belongs to, or else ``account``; unknown keys are a 401."""
+        if api_key is None:
+            return account
+        tenant = self._api_keys.get(api_key)
+        if tenant is None:
+            raise HTTPException(status_code=401, detail="Unknown API key")
+        return tenant
+
+    def _tenant(self, name: str) -> _Tenant:
+        tenant = self._tenants.get(name)
+        if tenant is None:
+            tenant = self._tenants[name] = _Tenant(name, self.default, False)
+            if len(self._tenants) > self.max_tenants:
+                for stale in [t for t in self._tenants.values() if not t.configured and t.idle and t is not tenant]:
+                    del self._tenants[stale.name]
+                    if len(self._tenants) <= self.max_tenants:
+                        break
+        return tenant
+
+    def check_backlog(self, name: str, backlog: int) -> None:
+        """Turn away background work of the tenant with a 429 once ``backlog`` items of it are pending already."""
+        tenant = self._tenant(name)
+        tenant.last_seen_at = datetime.now(timezone.utc)
+        if backlog >= tenant.quota.max_queued:
+            tenant.rejected += 1
+            logger.info("Turning away a job of tenant %s with %d pending", tenant.name, backlog)
+            retry_after = tenant.service_sec * (backlog + 1) / max(1, tenant.quota.max_concurrency)
+            raise HTTPException(
+                status_code=429,
+                detail=f"Tenant {tenant.name} has {backlog} jobs pending already",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+    @asynccontextmanager
+    async def slot(self, name: str, background: bool = False) -> AsyncIterator[None]:
+        """Hold one of the tenant's slots for the duration of a request, waiting for it if needed.
+
+        ``background`` work (job steps) was bounded by check_backlog when it was
+        accepted, so it waits for the tenant's rate and slots instead of being
+        turned away, and still runs while the service drains.
+        """
+        if self._closed and not background:
+            raise HTTPException(
+                status_code=503,
+                detail="The service is shutting down; retry on another instance",
+                headers={"Retry-After": "1", "Connection": "close"},
+            )
+        tenant = self._tenant(name)
+        tenant.last_seen_at = datetime.now(timezone.utc)
+        queued_at = time.monotonic()
+        if background:
+            while delay := self._refill(tenant):
+                await asyncio.sleep(delay)
+        else:
+            # A request turned away for a full queue does not use up the tenant's rate
+            if tenant.queue or not self._can_run(tenant):
+                self._check_queue(tenant)
+            self._take_token(tenant)
+        if tenant.queue or not self._can_run(tenant):
+            await self._wait(tenant, bounded=not background)
+        else:
+            self._start(tenant)
+        started = time.monotonic()
+        wait = started - queued_at
+        tenant.wait_sec += wait
+        tenant.max_wait_sec = max(tenant.max_wait_sec, wait)
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - started
+            tenant.busy_sec += duration
+            tenant.service_sec += (duration - tenant.service_sec) / 8
+            tenant.completed += 1
+            tenant.in_flight -= 1
+            self._in_flight -= 1
+            self._dispatch()
+
+    def _refill(self, tenant: _Tenant) -> float:
+        """Take one of the tenant's tokens; if it has none, the seconds until it has one."""
+        rate = tenant.quota.rate
+        if rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        tenant.tokens = min(tenant.burst, tenant.tokens + (now - tenant.refilled_at) * rate)
+        tenant.refilled_at = now
+        if tenant.tokens < 1:
+            return (1 - tenant.tokens) / rate
+        tenant.tokens -= 1
+        return 0.0
+
+    def _take_token(self, tenant: _Tenant) -> None:
+        delay = self._refill(tenant)
+        if delay:
+            tenant.rate_limited += 1
+            raise HTTPException(
+                status_code=429,
+                detail=f"Tenant {tenant.name} exceeded its rate of {tenant.quota.rate:g} requests per second",
+                headers={"Retry-After": str(max(1, math.ceil(delay)))},
+            )
+
+    def _can_run(self, tenant: _Tenant) -> bool:
+        return tenant.in_flight < tenant.quota.max_concurrency and (
+            self.capacity <= 0 or self._in_flight < self.capacity
+        )
+
+    def _start(self, tenant: _Tenant) -> None:
+        # Start-time fair queuing: the request's share starts at the later of virtual time and the tenant's last finish
+        start = max(self._virtual_time, tenant.finish_tag)
+        self._virtual_time = start
+        tenant.finish_tag = start + 1 / tenant.quota.weight
+        tenant.in_flight += 1
+        tenant.admitted += 1
+        self._in_flight += 1
+
+    def _check_queue(self, tenant: _Tenant) -> None:
+        if len(tenant.queue) >= tenant.quota.max_queued:
+            tenant.rejected += 1
+            logger.info("Turning away a request of tenant %s with %d queued", tenant.name, len(tenant.queue))
+            # Time for the requests ahead to drain through the tenant's slots
+            retry_after = tenant.service_sec * (len(tenant.queue) + 1) / max(1, tenant.quota.max_concurrency)
+            raise HTTPException(
+                status_code=429,
+                detail=f"Tenant {tenant.name} has {len(tenant.queue)} requests queued already",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+    async def _wait(self, tenant: _Tenant, bounded: bool = True) -> None:
+        waiter = asyncio.get_running_loop().create_future()
+        tenant.queue.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout if bounded else None)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as we gave up; the slot is handed back unused, so it was not admitted
+                tenant.admitted -= 1
+                tenant.in_flight -= 1
+                self._in_flight -= 1
+                self._dispatch()
+            else:
+                waiter.cancel()
+                tenant.queue.remove(waiter)
+                self._check_idle()
+            if isinstance(e, asyncio.TimeoutError):
+                tenant.timed_out += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Too many requests are running; retry later",
+                    headers={"Retry-After": str(max(1, int(self.queue_timeout)))},
+                ) from e
+            raise
+
+    def _dispatch(self) -> None:
+        while self.capacity <= 0 or self._in_flight < self.capacity:
+            ready = [t for t in self._tenants.values() if t.queue and t.in_flight < t.quota.max_concurrency]
+            if not ready:
+                self._check_idle()
+                return
+            tenant = min(ready, key=lambda t: max(self._virtual_time, t.finish_tag))
+            self._start(tenant)
+            tenant.queue.popleft().set_result(None)
+
+    def _check_idle(self) -> None:
+        if self._idle_waiters and not self._in_flight and not self.queued:
+            for idle in self._idle_waiters:
+                idle.set()
+
+    def usage(self, name: Optional[str] = None) -> List[TenantUsage]:
+        """Usage of every known tenant, or of ``name`` only."""
+        tenants = self._tenants.values() if name is None else [t for t in self._tenants.values() if t.name == name]
+        return [
+            TenantUsage(
+                tenant=t.name,
+                weight=t.quota.weight,
+                max_concurrency=t.quota.max_concurrency,
+                rate=t.quota.rate,
+                max_queued=t.quota.max_queued,
+                in_flight=t.in_flight,
+                queued=len(t.queue),
+                admitted=t.admitted,
+                completed=t.completed,
+                rejected=t.rejected,
+                rate_limited=t.rate_limited,
+                timed_out=t.timed_out,
+                busy_sec=round(t.busy_sec, 3),
+                avg_wait_ms=round(t.wait_sec / t.admitted * 1000, 2) if t.admitted else 0.0,
+                max_wait_ms=round(t.max_wait_sec * 1000, 2),
+                last_seen_at=t.last_seen_at,
+            )
+            for t in tenants
+        ]
@@ -1,16 +1,15 @@
-import os
 import asyncio
+import hashlib
 import logging
 import time
-from typing import List, Optional, AsyncGenerator, Tuple
-from dotenv import load_dotenv
-from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Awaitable, Callable, List, Optional, AsyncGenerator, Tuple, TypeVar, Union
+from contextlib import AsyncExitStack, asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, Header, Depends, Request, Response
+from fastapi import APIRouter, FastAPI, HTTPException, Header, Depends, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 from starlette.middleware.base import BaseHTTPMiddleware
-from telethon import TelegramClient, events # Import events
-from telethon.sessions import StringSession
-from telethon import types
 
 from .models import (
     SendMessageRequest,
@@ -20,27 +19,91 @@ from .models import (
     MessageButton,
     TelegramCredentialsRequest,
     ResponseType,
+    AsyncJobAccepted,
+    JobInfo,
+    JobKind,
+    JobRequest,
+    ScenarioStep,
+    HistoryRequest,
+    Expectation,
+    ExpectationVerdict,
+    ProfileRequest,
+    ProfileResponse,
+    LoadTestRequest,
+    WarmupRequest,
+    InlineQueryRequest,
+    InlineQueryResponse,
+    InlineResult,
+    InlineChooseRequest,
+    InlineChooseResponse,
+    WarmupResponse,
+    ResetChatRequest,
+    ResetChatResponse,
+    ResetMode,
+    SearchResponse,
+    BotCircuit,
+    SessionInfo,
+    TenantUsage,
+    HealthStatus,
+    ServiceState,
 )
+from .compression import CompressionMiddleware, fast_json_response_class
+from .admission import AdmissionControl
+from .breaker import CircuitBreakers, note_response
+from .chats import ChatCursors, ChatGate, chat_key, conversation
+from .deltas import MessageDeltas
+from .inline import InlineKey, InlineResultCache, inline_key
+from .keyboards import ReplyKeyboardTracker
+from .limits import MemoryBudget, ReplyGuard
+from .search import MessageIndex
+from .sessions import SessionRegistry
+from .settings import Settings
+from .webhooks import WebhookDispatcher, WebhookPolicy
+from .jobs import Job, JobFailed, JobQueue, JobQueueClosed, JobQueueFull
+from .tracing import Tracer, TracingMiddleware, Truncated, current_span
+from .recording import InteractionRecorder, ReplayBackend, note_edit
+from .expectations import ExpectationEngine
+from .collector import ChatCollector
+from .profiling import LatencyProfiler
+from .loadtest import LoadGenerator
+from .warmup import EntityWarmer
 
-load_dotenv()  # Load environment variables from .env file
+if TYPE_CHECKING:
+    # Telethon is imported on first use, so replay mode and app creation never load it
+    from telethon import TelegramClient, types
+    from telethon.tl.custom import InlineResults
+    from .clients import ClientFactory
 
-# Configure logging level based on DEBUG env variable
-DEBUG_MODE = os.getenv("DEBUG", "0").lower() in ("1", "true", "yes")
-logging.basicConfig(level=logging.DEBUG if DEBUG_MODE else logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Enable verbose logging of response bodies if VERBOSE env variable is set
-VERBOSE_MODE = os.getenv("VERBOSE", "0").lower() in ("1", "true", "yes")
+router = APIRouter()
+
+T = TypeVar("T")
+
+# How often a running interaction checks whether its caller is still connected
+DISCONNECT_POLL_INTERVAL = 0.1
+# Time kept free before an X-Request-Deadline to send the response
+DEADLINE_MARGIN = 0.1
+
+ResponseCallback = Callable[[BotResponse], None]
 
 
 class LogResponseBodyMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, payload_limit: int) -> None:
+        super().__init__(app)
+        self.payload_limit = payload_limit
+
     async def dispatch(self, request: Request, call_next):
         response = await call_next(request)
         body = b""
         async for chunk in response.body_iterator:
             body += chunk
-        logging.info(
-            f"Response {response.status_code} for {request.method} {request.url.path}: {body!r}"
+        logger.info(
+            "Response %s for %s %s: %s",
+            response.status_code,
+            request.method,
+            request.url.path,
+            Truncated(body, self.payload_limit),
         )
         # Recreate the response because the body iterator has been consumed
         return Response(
@@ -50,122 +113,881 @@ class LogResponseBodyMiddleware(BaseHTTPMiddleware):
             media_type=response.media_type,
         )
 
-# Default credentials from environment variables
-DEFAULT_API_ID = os.getenv("API_ID")
-DEFAULT_API_HASH = os.getenv("API_HASH")
-DEFAULT_SESSION = os.getenv("SESSION_STRING")
 
-if not all([DEFAULT_API_ID, DEFAULT_API_HASH, DEFAULT_SESSION]):
-    raise RuntimeError("Default API_ID, API_HASH, and SESSION_STRING must be set in environment variables")
+class Service:
+    """State of one app, built by create_app from its settings.
 
-# Global client instance, initialized as None. Will be set up in the lifespan manager.
-client: Optional[TelegramClient] = None
-# app will be defined after the lifespan manager
+    Handlers reach it through ``request.app.state.service``, so apps created
+    in the same process (parallel test fixtures, say) never share clients,
+    sessions, queues or caches.
+    """
 
-@asynccontextmanager
-async def lifespan(app_instance: FastAPI):
-    global client # We are modifying the global client variable
-    logger.info("Lifespan startup")
-    # Startup logic
-    # Fetch current environment variables for client setup.
-    current_api_id = os.getenv("API_ID")
-    current_api_hash = os.getenv("API_HASH")
-    current_session_string = os.getenv("SESSION_STRING")
-    logger.debug(
-        "Credentials presence - API_ID: %s, API_HASH: %s, SESSION_STRING: %s",
-        bool(current_api_id),
-        bool(current_api_hash),
-        bool(current_session_string),
-    )
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        # Sampled request tracing, exported in Chrome Trace Event format
+        self.tracer = Tracer(sample_rate=settings.trace_sample_rate, path=settings.trace_file)
+        # Record every interaction to record_file, or serve them from replay_file without Telegram
+        self.recorder = (
+            InteractionRecorder(settings.record_file) if settings.record_file and not settings.replay_file else None
+        )
+        self.replay = ReplayBackend(settings.replay_file, speed=settings.replay_speed) if settings.replay_file else None
+        # The default account's client, connected on startup
+        self.client: Optional["TelegramClient"] = None
+        # Builds, connects and supervises every Telegram client; None in replay mode
+        self.client_factory: Optional["ClientFactory"] = None
+        if self.replay is None:
+            from .clients import ClientFactory
+            self.client_factory = ClientFactory(settings.telegram)
+        # Starting, ready, draining or stopped; behind /ready
+        self.state = ServiceState.STARTING
+        # Why the default client failed for good; keeps /ready failing until a restart
+        self.client_failure: Optional[str] = None
+        # Registered sessions and their long-lived clients, addressed by X-Telegram-Session-Token
+        self.sessions = SessionRegistry(
+            self._open_session_client,
+            self._close_session_client,
+            idle_timeout=settings.session_idle_timeout,
+            max_sessions=settings.session_max_count,
+        )
+        # Reply keyboards currently shown in each chat, learned from observed messages
+        self.reply_keyboards = ReplyKeyboardTracker()
+        # Serializes chat resets against interactions with the same bot, and logical history starts per chat
+        self.chat_gate = ChatGate()
+        self.chat_cursors = ChatCursors()
+        # What each delta poller of /get-messages and /get-updates has already seen
+        self.message_deltas = MessageDeltas(settings.delta_max_states)
+        # Inline query results, kept as long as each bot allows
+        self.inline_results = InlineResultCache(settings.inline_cache_max_entries, settings.inline_cache_max_ttl)
+        # Per-tenant quotas and fair sharing of the interaction endpoints
+        self.admission = AdmissionControl(
+            settings.admission_capacity,
+            settings.tenant_quota,
+            settings.tenants,
+            settings.tenant_api_keys,
+            settings.admission_queue_timeout,
+        )
+        # Per-bot circuit breakers failing fast on bots that stopped responding;
+        # replayed bots always answer as recorded, so there is nothing to protect
+        self.circuits = CircuitBreakers(
+            0 if self.replay is not None else settings.breaker_threshold, settings.breaker_open_sec
+        )
+        # Local full-text index of the chats with bots, behind /search
+        self.message_index = MessageIndex(settings.search_db_path or ":memory:")
+        # Background interactions whose replies are pushed to caller-supplied webhooks
+        self.webhooks = WebhookDispatcher(
+            batch_size=settings.webhook_batch_size,
+            flush_interval=settings.webhook_flush_interval,
+            max_pending=settings.webhook_max_pending,
+            max_retries=settings.webhook_max_retries,
+            policy=WebhookPolicy(settings.webhook_allowed_hosts, settings.webhook_allow_private),
+        )
+        # Background jobs (async send/press/scenario interactions) and their results
+        self.jobs = JobQueue(
+            self._execute_job,
+            workers=settings.job_workers,
+            max_queued=settings.job_max_queued,
+            max_finished=settings.job_max_finished,
+            db_path=settings.job_db_path,
+        )
+        # Caps on the replies one request collects, and the memory all in-flight collections may hold
+        self.reply_limits = settings.reply_limits
+        self.collection_budget = MemoryBudget(
+            total_bytes=settings.collection_memory_budget,
+            max_wait=settings.collection_queue_timeout,
+        )
+
+    def log_payload(self, value: object) -> Truncated:
+        return Truncated(value, self.settings.log_payload_limit)
 
-    if not all([current_api_id, current_api_hash, current_session_string]):
-        raise RuntimeError(
-            "Lifespan Startup Error: API_ID, API_HASH, and SESSION_STRING must be set in environment for client startup."
+    # Lifecycle
+
+    async def _start_default_client(self) -> None:
+        settings = self.settings
+        logger.debug(
+            "Credentials presence - API_ID: %s, API_HASH: %s, SESSION_STRING: %s",
+            bool(settings.api_id),
+            bool(settings.api_hash),
+            bool(settings.session_string),
         )
 
-    if client is None: # Ensure client is initialized
-        if current_session_string is None:
-            raise RuntimeError("Lifespan Startup Error: SESSION_STRING must be set in environment for client startup.")
-        if current_api_id is None or current_api_hash is None:
-            raise RuntimeError("Lifespan Startup Error: API_ID and API_HASH must be set in environment for client startup.")
-
-        loop = asyncio.get_running_loop()
-        client = TelegramClient(
-            StringSession(current_session_string),
-            int(current_api_id),
-            current_api_hash,
-            loop=loop
+        if not all([settings.api_id, settings.api_hash, settings.session_string]):
+            raise RuntimeError(
+                "Lifespan Startup Error: API_ID, API_HASH, and SESSION_STRING must be set in environment for client startup."
+            )
+
+        if self.client is None: # Ensure client is initialized
+            self.client = self.client_factory.create(settings.session_string, settings.api_id, settings.api_hash)
+            logger.debug("Telegram client initialized")
+
+        if not self.client.is_connected():
+            logger.debug("Starting Telegram client connection")
+            await self.client_factory.connect(self.client)
+            self.client_factory.supervise(self.client, self._default_client_failed)
+            self.message_index.attach(self.client, _session_key())
+
+    def _default_client_failed(self, reason: str) -> None:
+        logger.error("Default Telegram client failed: %s; marking the service unready", reason)
+        self.client_failure = reason
+
+    async def start(self) -> None:
+        await self.message_index.start()
+        self.sessions.start()
+        if self.replay is not None:
+            logger.info("Replaying interactions from %s; Telegram client not started", self.settings.replay_file)
+            await self.jobs.start()
+        else:
+            # Connecting is network-bound; restore persisted jobs meanwhile
+            await asyncio.gather(self._start_default_client(), self.jobs.start())
+        self.state = ServiceState.READY
+
+    async def stop(self) -> None:
+        await self.drain(self.settings.drain_timeout)
+        # Whatever outlived the drain is cancelled, then the state is flushed and the clients disconnected
+        await self.jobs.aclose()
+        await self.webhooks.aclose()
+        await self.tracer.aclose()
+        if self.recorder is not None:
+            self.recorder.close()
+        await self.message_index.aclose()
+        await self.sessions.aclose()
+        if self.client_factory is not None:
+            await self.client_factory.aclose()
+        self.client = None
+        self.state = ServiceState.STOPPED
+
+    def start_drain(self) -> None:
+        """Fail readiness and turn away new interactions and jobs; those running carry on."""
+        if self.state is ServiceState.DRAINING:
+            return
+        logger.info("Draining %d requests and %d jobs", self.admission.in_flight, self.jobs.active)
+        self.state = ServiceState.DRAINING
+        self.admission.close()
+        self.jobs.close()
+
+    async def drain(self, timeout: float) -> bool:
+        """Start draining, then wait up to ``timeout`` seconds for the running interactions and jobs to finish."""
+        self.start_drain()
+        started = time.monotonic()
+        drained = all(await asyncio.gather(self.admission.wait_idle(timeout), self.jobs.wait_idle(timeout)))
+        if drained:
+            logger.info("Drained in %.1fs", time.monotonic() - started)
+        else:
+            logger.warning(
+                "Drain timed out with %d requests and %d jobs left; cancelling them",
+                self.admission.in_flight, self.jobs.active,
+            )
+        return drained
+
+    def health(self) -> HealthStatus:
+        connected = None if self.replay is not None else self.client is not None and self.client.is_connected()
+        return HealthStatus(
+            state=self.state,
+            ready=self.state is ServiceState.READY and connected is not False and self.client_failure is None,
+            telegram_connected=connected,
+            in_flight=self.admission.in_flight,
+            queued=self.admission.queued,
+            jobs_active=self.jobs.active,
+            reason=self.client_failure,
         )
-        logger.debug("Telegram client initialized")
-    
-    if not client.is_connected():
-        logger.debug("Starting Telegram client connection")
-        await client.start()
-    
-    yield # Application runs here
-    logger.info("Lifespan shutdown")
 
-    # Shutdown logic
-    if client and client.is_connected():
-        logger.debug("Disconnecting Telegram client")
-        client.disconnect()
-    # client = None # Optionally reset client
+    # Clients
 
-app = FastAPI(title="Telegram Bot Test API", lifespan=lifespan)
+    @asynccontextmanager
+    async def telegram_client(
+        self,
+        custom_api_id: Optional[int] = None,
+        custom_api_hash: Optional[str] = None,
+        custom_session_string: Optional[str] = None,
+    ) -> AsyncGenerator["TelegramClient", None]:
+        logger.debug("telegram_client called with custom creds: %s", bool(custom_session_string))
+        registered = self.sessions.find(custom_api_id, custom_api_hash, custom_session_string)
+        if registered is not None:
+            # Registered with POST /sessions; its client stays connected between requests
+            async with self.sessions.use(registered) as session_client:
+                if not session_client.is_connected():
+                    await self.client_factory.connect(session_client)
+                yield session_client
+        elif custom_api_id is not None and custom_api_hash and custom_session_string:
+            # All custom credentials provided, create a new temporary client
+            logger.debug("Creating temporary Telegram client")
+            temp_client = self.client_factory.create(custom_session_string, custom_api_id, custom_api_hash)
+            try:
+                await self.client_factory.connect(temp_client)
+                yield temp_client
+            finally:
+                logger.debug("Disconnecting temporary client")
+                await self.client_factory.release(temp_client)
+        else:
+            # Use the default client
+            if self.client is None:
+                # This should not happen if startup ran correctly.
+                raise RuntimeError("Global Telegram client has not been initialized. Check application startup logic.")
 
-if VERBOSE_MODE:
-    app.add_middleware(LogResponseBodyMiddleware)
+            if not self.client.is_connected():
+                # This is a fallback/defensive measure. Startup should handle connection.
+                # Concurrent requests share a single reconnect attempt
+                logger.warning("Default client not connected in telegram_client; reconnecting")
+                from .clients import SessionNotAuthorized
+                try:
+                    await self.client_factory.connect(self.client)
+                except SessionNotAuthorized as e:
+                    self._default_client_failed(str(e))
+                    raise
+            yield self.client
+            # The default client's lifecycle is managed by start and stop
 
+    def resolve_credentials(self, creds: TelegramCredentialsRequest) -> TelegramCredentialsRequest:
+        """The credentials registered for ``creds.session_token``, which takes precedence; otherwise ``creds``."""
+        if not creds.session_token:
+            return creds
+        return self.sessions.resolve(creds.session_token).creds
 
-@asynccontextmanager
-async def get_telegram_client(
-    custom_api_id: Optional[int] = None,
-    custom_api_hash: Optional[str] = None,
-    custom_session_string: Optional[str] = None,
-) -> AsyncGenerator[TelegramClient, None]:
-    global client # Ensure we're referring to the module-level client
-    logger.debug("get_telegram_client called with custom creds: %s", bool(custom_session_string))
-    if custom_api_id is not None and custom_api_hash and custom_session_string:
-        # All custom credentials provided, create a new temporary client
-        logger.debug("Creating temporary Telegram client")
-        loop = asyncio.get_running_loop()
-        temp_client = TelegramClient(
-            StringSession(custom_session_string),
-            int(custom_api_id),
-            custom_api_hash,
-            loop=loop
+    async def _open_session_client(self, creds: TelegramCredentialsRequest, account: str) -> Optional["TelegramClient"]:
+        if self.client_factory is None:
+            # Replay mode: tokens only stand in for the credentials
+            return None
+        session_client = self.client_factory.create(creds.session_string, creds.api_id, creds.api_hash)
+        try:
+            await self.client_factory.connect(session_client)
+        except RuntimeError as e:
+            self.client_factory.forget(session_client)
+            raise HTTPException(status_code=401, detail=str(e)) from e
+        except BaseException:
+            self.client_factory.forget(session_client)
+            raise
+        self.client_factory.supervise(session_client)
+        self.message_index.attach(session_client, account)
+        return session_client
+
+    async def _close_session_client(self, session_client: "TelegramClient") -> None:
+        await self.client_factory.release(session_client)
+
+    # Interactions
+
+    def message_response(
+        self,
+        message: "types.Message",
+        session_key: str,
+        bot_username: str,
+        sent_at: Optional[datetime] = None,
+        received_at: Optional[datetime] = None,
+    ) -> BotResponse:
+        """Convert a Telethon message into a BotResponse, recording its keyboard state."""
+        reply_markup, reply_kb = _parse_markup(message)
+        self.reply_keyboards.observe(session_key, bot_username, message, reply_markup)
+        return BotResponse(
+            response_type=ResponseType.MESSAGE,
+            message_id=message.id,
+            message_text=message.raw_text,
+            reply_markup=reply_markup,
+            reply_keyboard=reply_kb,
+            sent_at=sent_at,
+            date=message.date,
+            received_at=received_at,
         )
-        await temp_client.start()
+
+    async def collect(
+        self,
+        collector: ChatCollector,
+        timeout_sec: float,
+        session_key: str,
+        bot_username: str,
+        sent_at: datetime,
+        on_response: Optional[ResponseCallback] = None,
+        engine: Optional[ExpectationEngine] = None,
+        guard: Optional[ReplyGuard] = None,
+    ) -> List[BotResponse]:
+        """Collect the bot's new messages until ``timeout_sec`` expires, the expectations are decided
+        or ``guard`` ends the collection."""
+        bot_responses: List[BotResponse] = []
+        deadline = time.monotonic() + timeout_sec
+        while True:
+            now = time.monotonic()
+            if engine is not None:
+                engine.tick(now)
+                if engine.decided:
+                    logger.debug("Expectations decided after %d replies", len(bot_responses))
+                    break
+            if now >= deadline:
+                logger.debug("No more responses from bot within timeout")
+                break
+            wait = deadline - now
+            if engine is not None and (next_deadline := engine.next_deadline()) is not None:
+                wait = min(wait, max(next_deadline - now, 0))
+            try:
+                kind, message, received_at = await collector.get(timeout=wait)
+            except asyncio.TimeoutError:
+                continue
+            note_response()
+            if kind == ChatCollector.EDITED:
+                note_edit(message.id)
+                if engine is not None:
+                    engine.on_edit(message.id, received_at)
+                continue
+            logger.debug("Received response %s", self.log_payload(message.raw_text))
+            bot_response = self.message_response(message, session_key, bot_username, sent_at, _wall_clock(received_at))
+            if guard is not None and (bot_response := guard.admit(bot_response)) is None:
+                break
+            bot_responses.append(bot_response)
+            if on_response:
+                on_response(bot_response)
+            if engine is not None:
+                engine.on_reply(bot_response, received_at)
+            if guard is not None and guard.exhausted:
+                logger.debug("Reply limit reached (%s) after %d replies", guard.truncated, len(bot_responses))
+                break
+        return bot_responses
+
+    async def send_and_collect(
+        self,
+        current_client: "TelegramClient",
+        entity: "types.TypeInputPeer",
+        text: str,
+        timeout_sec: float,
+        session_key: str,
+        bot_username: str,
+        on_response: Optional[ResponseCallback] = None,
+        engine: Optional[ExpectationEngine] = None,
+        guard: Optional[ReplyGuard] = None,
+        chat_entity: Optional["types.TypeInputPeer"] = None,
+    ) -> List[BotResponse]:
+        """Send ``text`` to the bot and collect its replies until ``timeout_sec`` expires.
+
+        With ``chat_entity`` the text goes to that group instead, and only the bot's messages there are collected.
+        """
+        span = current_span()
+        chat_entity = chat_entity or entity
+        async with ChatCollector(current_client, chat_entity, entity) as collector:
+            sent_at = datetime.now(timezone.utc)
+            if engine is not None:
+                engine.start(time.monotonic())
+            with span.phase("send"):
+                sent = await current_client.send_message(chat_entity, text)
+            self.reply_keyboards.observe(session_key, bot_username, sent, None)
+            with span.phase("collect"):
+                bot_responses = await self.collect(
+                    collector, timeout_sec, session_key, bot_username, sent_at, on_response, engine, guard
+                )
+        span.set(reply_count=len(bot_responses))
+        return bot_responses
+
+    def is_reply_keyboard_press(self, req: PressButtonRequest, session_key: str) -> bool:
+        """Whether ``req`` presses a button of the tracked reply keyboard.
+
+        Reply keyboard buttons just send their text, so they are validated against
+        the tracked keyboard without contacting Telegram; unknown buttons are a 400.
+        """
+        if not req.button_text or req.callback_data:
+            return False
+        on_keyboard = self.reply_keyboards.match(session_key, conversation(req.bot_username, req.chat), req.button_text)
+        if on_keyboard is False:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Button '{req.button_text}' is not on the active reply keyboard",
+            )
+        return bool(on_keyboard)
+
+    async def _send_message_live(
+        self,
+        req: SendMessageRequest,
+        creds: TelegramCredentialsRequest,
+        on_response: Optional[ResponseCallback] = None,
+        engine: Optional[ExpectationEngine] = None,
+        guard: Optional[ReplyGuard] = None,
+    ) -> List[BotResponse]:
+        api_id = creds.api_id
+        api_hash = creds.api_hash
+        session_string = creds.session_string
+        session_key = _session_key(api_id, api_hash, session_string)
+        chat = conversation(req.bot_username, req.chat)
+        span = current_span()
+        span.set(bot=req.bot_username, account=session_key)
+        if req.chat:
+            span.set(chat=req.chat)
+
+        async with self.chat_gate.shared(session_key, chat), \
+                self.telegram_client(api_id, api_hash, session_string) as current_client:
+            with span.phase("resolve_entity"):
+                entity, chat_entity = await _resolve_chat(current_client, req.bot_username, req.chat)
+            return await self.send_and_collect(
+                current_client, entity, req.message_text, req.timeout_sec, session_key, chat,
+                on_response, engine, guard, chat_entity,
+            )
+
+    async def _press_button_live(
+        self,
+        req: PressButtonRequest,
+        creds: TelegramCredentialsRequest,
+        on_response: Optional[ResponseCallback] = None,
+        engine: Optional[ExpectationEngine] = None,
+        guard: Optional[ReplyGuard] = None,
+    ) -> List[BotResponse]:
+        api_id = creds.api_id
+        api_hash = creds.api_hash
+        session_string = creds.session_string
+        session_key = _session_key(api_id, api_hash, session_string)
+        chat = conversation(req.bot_username, req.chat)
+        span = current_span()
+        span.set(bot=req.bot_username, account=session_key)
+        if req.chat:
+            span.set(chat=req.chat)
+
+        async with self.chat_gate.shared(session_key, chat):
+            if self.is_reply_keyboard_press(req, session_key):
+                logger.debug("Pressing reply keyboard button %s", self.log_payload(req.button_text))
+                span.set(reply_keyboard=True)
+                async with self.telegram_client(api_id, api_hash, session_string) as current_client:
+                    with span.phase("resolve_entity"):
+                        entity, chat_entity = await _resolve_chat(current_client, req.bot_username, req.chat)
+                    return await self.send_and_collect(
+                        current_client, entity, req.button_text, req.timeout_sec, session_key, chat,
+                        on_response, engine, guard, chat_entity,
+                    )
+            return await self._press_inline_button(req, creds, session_key, on_response, engine, guard)
+
+    async def _press_inline_button(
+        self,
+        req: PressButtonRequest,
+        creds: TelegramCredentialsRequest,
+        session_key: str,
+        on_response: Optional[ResponseCallback],
+        engine: Optional[ExpectationEngine],
+        guard: Optional[ReplyGuard],
+    ) -> List[BotResponse]:
+        from telethon.tl.types.messages import BotCallbackAnswer
+
+        span = current_span()
+        chat = conversation(req.bot_username, req.chat)
+        async with self.telegram_client(creds.api_id, creds.api_hash, creds.session_string) as current_client:
+            with span.phase("resolve_entity"):
+                entity, chat_entity = await _resolve_chat(current_client, req.bot_username, req.chat)
+
+            # Get the latest message to click its button; messages hidden by a logical reset don't count.
+            # In a group that is the bot's latest message there.
+            with span.phase("fetch_history"):
+                messages = await current_client.get_messages(
+                    chat_entity, limit=1, min_id=self.chat_cursors.get(session_key, chat),
+                    from_user=entity if req.chat else None,
+                )
+            if not messages:
+                raise HTTPException(status_code=404, detail="No messages to interact with")
+            message_to_click = messages[0]
+            logger.debug("Clicking button on message %s", message_to_click.id)
+
+            async with ChatCollector(current_client, chat_entity, entity) as collector:
+                sent_at = datetime.now(timezone.utc)
+                if engine is not None:
+                    engine.start(time.monotonic())
+                try:
+                    # Click the button on the fetched message
+                    # message_to_click is bound to current_client which is used for the collection
+                    with span.phase("click"):
+                        answer = await message_to_click.click(text=req.button_text, data=req.callback_data)
+                except Exception as e:
+                    raise HTTPException(status_code=400, detail=f"Failed to press button: {e}") from e
+                if isinstance(answer, BotCallbackAnswer):
+                    # The bot answered the callback query, even if it sends no message
+                    note_response()
+
+                # Collect the bot's new messages after clicking until timeout is reached
+                with span.phase("collect"):
+                    bot_responses = await self.collect(
+                        collector, req.timeout_sec, session_key, chat, sent_at, on_response, engine, guard
+                    )
+
+        span.set(reply_count=len(bot_responses))
+        return bot_responses
+
+    async def recorded(
+        self,
+        endpoint: str,
+        bot_username: str,
+        request: BaseModel,
+        timeout_sec: Optional[float],
+        creds: TelegramCredentialsRequest,
+        runner: Callable[[Optional[ResponseCallback]], Awaitable[List[BotResponse]]],
+        on_response: Optional[ResponseCallback] = None,
+        engine: Optional[ExpectationEngine] = None,
+    ) -> List[BotResponse]:
+        """Run an interaction live, recording it if enabled, or serve it from the replay file."""
+        params = request.model_dump(mode="json", exclude_none=True)
+        if self.replay is not None:
+            def replayed(bot_response: BotResponse) -> None:
+                if engine is not None:
+                    engine.on_reply(bot_response, time.monotonic())
+                if on_response:
+                    on_response(bot_response)
+
+            def replayed_edit(message_id: int) -> None:
+                if engine is not None:
+                    engine.on_edit(message_id, time.monotonic())
+
+            if engine is not None:
+                engine.start(time.monotonic())
+            return await self.replay.play(endpoint, bot_username, params, timeout_sec, replayed, replayed_edit)
+        if self.recorder is None:
+            return await runner(on_response)
+
+        recording = self.recorder.start(
+            endpoint, bot_username, _session_key(creds.api_id, creds.api_hash, creds.session_string), params
+        )
+
+        def record(bot_response: BotResponse) -> None:
+            recording.add(bot_response)
+            if on_response:
+                on_response(bot_response)
+
         try:
-            yield temp_client
-        finally:
-            logger.debug("Disconnecting temporary client")
-            temp_client.disconnect()
-    else:
-        # Use the global client
-        if client is None:
-            # This should not happen if startup_event ran correctly.
-            raise RuntimeError("Global Telegram client has not been initialized. Check application startup logic.")
+            with recording.active():
+                result = await runner(record)
+        except HTTPException as e:
+            recording.finish(e.status_code, str(e.detail))
+            raise
+        recording.finish()
+        return result
 
-        if not client.is_connected():
-            # This is a fallback/defensive measure. Startup should handle connection.
-            logger.warning("Global client not connected in get_telegram_client; starting now")
-            await client.start()
-        yield client
-        # Global client's lifecycle is managed by startup/shutdown events, now via lifespan manager
+    def reply_guard(self) -> ReplyGuard:
+        return ReplyGuard(self.reply_limits, self.collection_budget)
 
+    async def run_send_message(
+        self,
+        req: SendMessageRequest,
+        creds: TelegramCredentialsRequest,
+        tenant: str,
+        on_response: Optional[ResponseCallback] = None,
+        engine: Optional[ExpectationEngine] = None,
+        guard: Optional[ReplyGuard] = None,
+        background: bool = False,
+    ) -> List[BotResponse]:
+        return await self._run_interaction(
+            "send_message", req, creds, tenant, self._send_message_live, on_response, engine, guard, background
+        )
+
+    async def run_press_button(
+        self,
+        req: PressButtonRequest,
+        creds: TelegramCredentialsRequest,
+        tenant: str,
+        on_response: Optional[ResponseCallback] = None,
+        engine: Optional[ExpectationEngine] = None,
+        guard: Optional[ReplyGuard] = None,
+        background: bool = False,
+    ) -> List[BotResponse]:
+        return await self._run_interaction(
+            "press_button", req, creds, tenant, self._press_button_live, on_response, engine, guard, background
+        )
+
+    async def _run_interaction(
+        self,
+        endpoint: str,
+        req: Union[SendMessageRequest, PressButtonRequest],
+        creds: TelegramCredentialsRequest,
+        tenant: str,
+        live: Callable[..., Awaitable[List[BotResponse]]],
+        on_response: Optional[ResponseCallback],
+        engine: Optional[ExpectationEngine],
+        guard: Optional[ReplyGuard],
+        background: bool,
+    ) -> List[BotResponse]:
+        guard = guard or self.reply_guard()
+        # Fails fast on a bot known to be silent, then waits for memory budget, and only then
+        # takes one of the tenant's slots, so requests waiting for memory hold no slot
+        with self.circuits.interaction(req.bot_username):
+            async with guard, self.admission.slot(tenant, background):
+                return await self.recorded(
+                    endpoint, req.bot_username, req, req.timeout_sec, creds,
+                    lambda callback: live(req, creds, callback, engine, guard), on_response, engine,
+                )
+
+    # Jobs
+
+    async def submit_job(self, request: JobRequest, creds: TelegramCredentialsRequest, tenant: str) -> Job:
+        """Queue a job whose steps are admitted as ``tenant``, within the tenant's queue limit."""
+        if request.callback_url:
+            await self.webhooks.validate(request.callback_url)
+        self.admission.check_backlog(tenant, self.jobs.pending(tenant))
+        try:
+            return self.jobs.submit(request, creds, tenant)
+        except JobQueueFull as e:
+            raise HTTPException(status_code=429, detail=str(e)) from e
+        except JobQueueClosed as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"}) from e
+
+    async def _execute_job(self, job: Job) -> None:
+        """Run the steps of a background job, recording (and optionally pushing) every reply."""
+        request = job.request
+        with self.tracer.trace("job", kind=request.kind.value, job_id=job.job_id):
+            await self._execute_job_steps(job)
+
+    async def _execute_job_steps(self, job: Job) -> None:
+        request = job.request
+        delivery = self.webhooks.start(job.job_id, request.callback_url) if request.callback_url else None
+
+        def on_response(bot_response: BotResponse) -> None:
+            job.add_response(bot_response)
+            if delivery:
+                delivery.push(bot_response)
+
+        try:
+            for index, step in enumerate(_job_steps(request)):
+                job.begin_step()
+                action = step.send_message or step.press_button
+                engine = _expectation_engine(action.expectations if action else None)
+                guard = self.reply_guard()
+                # Each step is admitted as the job's tenant, waiting rather than being turned away
+                if step.send_message is not None:
+                    await self.run_send_message(
+                        step.send_message, job.creds, job.tenant, on_response, engine, guard, background=True
+                    )
+                elif step.press_button is not None:
+                    await self.run_press_button(
+                        step.press_button, job.creds, job.tenant, on_response, engine, guard, background=True
+                    )
+                job.truncated.append(guard.truncated)
+                if delivery and guard.truncated:
+                    delivery.truncate(guard.truncated)
+                verdict = engine.finish(time.monotonic()) if engine else None
+                job.verdicts.append(verdict)
+                if verdict is not None and not verdict.passed:
+                    raise JobFailed(f"expectations failed at step {index}")
+        except (HTTPException, JobFailed) as e:
+            if delivery:
+                delivery.finish(str(e.detail) if isinstance(e, HTTPException) else str(e))
+            raise
+        except asyncio.CancelledError:
+            if delivery:
+                delivery.finish("cancelled")
+            raise
+        except Exception as e:
+            if delivery:
+                delivery.finish(str(e) or type(e).__name__)
+            raise
+        if delivery:
+            delivery.finish()
+
+    # Inline queries
+
+    async def query_inline(
+        self,
+        current_client: "TelegramClient",
+        key: InlineKey,
+        entity: "types.TypeInputPeer",
+        chat_entity: "types.TypeInputPeer",
+        query: str,
+        offset: Optional[str],
+    ) -> Tuple["InlineResults", bool]:
+        """One page of the bot's inline results, from the cache while the bot allows it."""
+        from telethon import errors
+
+        try:
+            return await self.inline_results.get(
+                key, lambda: current_client.inline_query(entity, query, entity=chat_entity, offset=offset)
+            )
+        except errors.BotResponseTimeoutError as e:
+            raise HTTPException(status_code=504, detail="The bot did not answer the inline query in time") from e
+        except errors.RPCError as e:
+            raise HTTPException(status_code=400, detail=f"Inline query failed: {e}") from e
+
+    def check_inline(self) -> None:
+        if self.replay is not None:
+            raise HTTPException(status_code=400, detail="Inline queries are not available in replay mode")
+
+    # History
+
+    async def _get_messages_live(
+        self,
+        bot_username: str,
+        limit: int,
+        creds: TelegramCredentialsRequest,
+        on_response: Optional[ResponseCallback] = None,
+    ) -> List[BotResponse]:
+        api_id = creds.api_id
+        api_hash = creds.api_hash
+        session_string = creds.session_string
+        session_key = _session_key(api_id, api_hash, session_string)
+        span = current_span()
+        span.set(bot=bot_username, account=session_key)
+        async with self.chat_gate.shared(session_key, bot_username), \
+                self.telegram_client(api_id, api_hash, session_string) as current_client:
+            with span.phase("resolve_entity"):
+                entity = await current_client.get_input_entity(bot_username)
+            # Fetch messages newer than the last logical reset, newest first
+            with span.phase("fetch_history"):
+                raw_messages = await current_client.get_messages(
+                    entity, limit=limit, min_id=self.chat_cursors.get(session_key, bot_username)
+                )
+            logger.debug("Fetched %d messages", len(raw_messages))
+            span.set(message_count=len(raw_messages))
+
+            msgs: List[BotResponse] = []
+            # Reverse to get chronological order (oldest of the batch first)
+            for m in reversed(raw_messages):
+                bot_response = self.message_response(m, session_key, bot_username)
+                msgs.append(bot_response)
+                if on_response:
+                    on_response(bot_response)
+        return msgs
+
+    async def run_get_messages(
+        self,
+        endpoint: str,
+        bot_username: str,
+        limit: int,
+        creds: TelegramCredentialsRequest,
+        delta: bool = False,
+        state: Optional[str] = None,
+    ) -> GetMessagesResponse:
+        messages = await self.recorded(
+            endpoint, bot_username, HistoryRequest(bot_username=bot_username, limit=limit), None, creds,
+            lambda callback: self._get_messages_live(bot_username, limit, creds, callback),
+        )
+        if not delta and state is None:
+            return GetMessagesResponse(messages=messages)
+        with current_span().phase("delta"):
+            chat = chat_key(_session_key(creds.api_id, creds.api_hash, creds.session_string), bot_username)
+            result = self.message_deltas.diff(chat, state, messages)
+        current_span().set(delta_messages=len(result.messages), delta_keyboards=len(result.keyboards))
+        return result
+
+
+@asynccontextmanager
+async def lifespan(app_instance: FastAPI):
+    service: Service = app_instance.state.service
+    logger.info("Lifespan startup")
+    await service.start()
+    yield # Application runs here
+    logger.info("Lifespan shutdown")
+    await service.stop()
+
+
+def create_app(app_settings: Optional[Settings] = None) -> FastAPI:
+    """Build the service from ``app_settings`` (by default read from the environment).
+
+    Every app has a state of its own, so tests can start from a clean slate
+    without reloading this module, and several apps can run side by side.
+    """
+    settings = app_settings if app_settings is not None else Settings.from_env()
+    settings.validate()
+    logging.basicConfig(level=logging.DEBUG if settings.debug else logging.INFO)
+    service = Service(settings)
+
+    json_response_class = fast_json_response_class()
+    app_instance = FastAPI(
+        title="Telegram Bot Test API",
+        lifespan=lifespan,
+        # Only override the default when it is faster; see fast_json_response_class
+        **({"default_response_class": json_response_class} if json_response_class else {}),
+    )
+    app_instance.state.service = service
+    app_instance.include_router(router)
+
+    if settings.verbose:
+        app_instance.add_middleware(LogResponseBodyMiddleware, payload_limit=settings.log_payload_limit)
+    app_instance.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_min_size,
+        gzip_level=settings.compression_gzip_level,
+        brotli_quality=settings.compression_brotli_quality,
+    )
+    app_instance.add_middleware(TracingMiddleware, tracer=service.tracer)
+    return app_instance
+
+
+def __getattr__(name: str):
+    # `from src.app import app` and `uvicorn src.app:app` build the app from the environment on first use
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_service(request: Request) -> Service:
+    """State of the app serving the request."""
+    return request.app.state.service
 
-# Old event handlers are removed as their logic is now in the lifespan manager.
 
 async def get_header_credentials(
     api_id: Optional[int] = Header(None, alias="X-Telegram-Api-Id"),
     api_hash: Optional[str] = Header(None, alias="X-Telegram-Api-Hash"),
     session_string: Optional[str] = Header(None, alias="X-Telegram-Session-String"),
+    session_token: Optional[str] = Header(None, alias="X-Telegram-Session-Token"),
+    svc: Service = Depends(get_service),
 ) -> TelegramCredentialsRequest:
     """Extract optional Telegram credentials from request headers."""
-    return TelegramCredentialsRequest(api_id=api_id, api_hash=api_hash, session_string=session_string)
+    return svc.resolve_credentials(TelegramCredentialsRequest(
+        api_id=api_id, api_hash=api_hash, session_string=session_string, session_token=session_token,
+    ))
+
+
+async def get_tenant(
+    api_key: Optional[str] = Header(None, alias="X-Teletest-Api-Key"),
+    creds: TelegramCredentialsRequest = Depends(get_header_credentials),
+    svc: Service = Depends(get_service),
+) -> str:
+    """Tenant the request is admitted as: its API key's, or else its account's."""
+    return svc.admission.identify(api_key, _session_key(creds.api_id, creds.api_hash, creds.session_string))
+
+
+async def get_request_deadline(
+    deadline: Optional[str] = Header(None, alias="X-Request-Deadline"),
+) -> Optional[float]:
+    """``time.monotonic()`` moment by which the caller needs an answer, from a Unix timestamp or ISO 8601 time."""
+    if not deadline:
+        return None
+    try:
+        wall = float(deadline)
+    except ValueError:
+        try:
+            wall = _utc(datetime.fromisoformat(deadline)).timestamp()
+        except ValueError:
+            raise HTTPException(
+                status_code=400, detail="X-Request-Deadline must be a Unix timestamp or an ISO 8601 time"
+            ) from None
+    return time.monotonic() + (wall - time.time())
+
+
+def _within_deadline(timeout_sec: float, deadline: Optional[float]) -> float:
+    """Cut a collection timeout so the replies can still be returned before ``deadline``."""
+    if deadline is None:
+        return timeout_sec
+    remaining = deadline - time.monotonic() - DEADLINE_MARGIN
+    if remaining <= 0:
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
+    return min(timeout_sec, remaining)
+
+
+async def _run_for_caller(request: Request, work: Awaitable[T], deadline: Optional[float] = None) -> T:
+    """Await ``work`` while the caller is still waiting for it.
+
+    The work is cancelled when the client disconnects or ``deadline`` passes,
+    and its cleanup (event handlers, temporary clients, reserved memory) has
+    finished by the time this returns.
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            timeout = DISCONNECT_POLL_INTERVAL
+            if deadline is not None:
+                timeout = max(0.0, min(timeout, deadline - time.monotonic()))
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info("Client disconnected from %s; cancelling", request.url.path)
+                current_span().set(cancelled="disconnect")
+                raise HTTPException(status_code=499, detail="Client closed request")
+            if deadline is not None and time.monotonic() >= deadline:
+                current_span().set(cancelled="deadline")
+                raise HTTPException(status_code=504, detail="Request deadline exceeded")
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+def _parse_markup(message: "types.Message") -> Tuple[Optional[List[List[MessageButton]]], bool]:
+    from telethon import types
 
-def _parse_markup(message: types.Message) -> Tuple[Optional[List[List[MessageButton]]], bool]:
     markup = getattr(message, "reply_markup", None)
     if not markup:
         return None, False
@@ -195,186 +1017,713 @@ def _parse_markup(message: types.Message) -> Tuple[Optional[List[List[MessageBut
     return rows, is_reply_keyboard
 
 
-@app.post("/send-message", response_model=List[BotResponse])
+def _session_key(
+    api_id: Optional[int] = None,
+    api_hash: Optional[str] = None,
+    session_string: Optional[str] = None,
+) -> str:
+    """Stable key identifying which account a request talks through."""
+    if api_id is not None and api_hash and session_string:
+        return hashlib.sha256(session_string.encode()).hexdigest()[:16]
+    return "default"
+
+
+def _wall_clock(monotonic_time: float) -> datetime:
+    """UTC wall-clock time of a ``time.monotonic()`` reading."""
+    return datetime.fromtimestamp(time.time() - (time.monotonic() - monotonic_time), timezone.utc)
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Times without a zone are taken as UTC, like Telegram's message dates
+    return value.replace(tzinfo=timezone.utc) if value is not None and value.tzinfo is None else value
+
+
+def _chat_ref(chat: str) -> Union[str, int]:
+    # Numeric chat ids such as -1001234567890 must reach Telethon as ints
+    return int(chat) if chat.lstrip("-").isdigit() else chat
+
+
+async def _resolve_chat(
+    current_client: "TelegramClient", bot_username: str, chat: Optional[str]
+) -> Tuple["types.TypeInputPeer", "types.TypeInputPeer"]:
+    """Input peers of the bot and of the chat to talk to it in: ``chat``, or else the bot's private chat."""
+    entity = await current_client.get_input_entity(bot_username)
+    if not chat:
+        return entity, entity
+    return entity, await current_client.get_input_entity(_chat_ref(chat))
+
+
+def _expectation_engine(expectations: Optional[List[Expectation]]) -> Optional[ExpectationEngine]:
+    """Build the engine for a request's expectations; invalid expectations are a 400."""
+    if not expectations:
+        return None
+    try:
+        return ExpectationEngine(expectations, time.monotonic())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+def _mark_truncated(response: Response, guard: ReplyGuard) -> None:
+    if guard.truncated:
+        response.headers["X-Teletest-Truncated"] = guard.truncated
+
+
+def _job_steps(request: JobRequest) -> List[ScenarioStep]:
+    if request.kind is JobKind.SEND_MESSAGE:
+        return [ScenarioStep(send_message=request.send_message)]
+    if request.kind is JobKind.PRESS_BUTTON:
+        return [ScenarioStep(press_button=request.press_button)]
+    return request.scenario or []
+
+
+@router.post("/send-message", response_model=Union[List[BotResponse], ExpectationVerdict, AsyncJobAccepted])
 async def send_message(
     req: SendMessageRequest,
+    request: Request,
+    response: Response,
     creds: TelegramCredentialsRequest = Depends(get_header_credentials),
-) -> List[BotResponse]:
-    logger.info("send_message called for %s", req.bot_username)
-    api_id = creds.api_id
-    api_hash = creds.api_hash
-    session_string = creds.session_string
-    
-    bot_responses: List[BotResponse] = []
-
-    async with get_telegram_client(api_id, api_hash, session_string) as current_client:
-        entity = await current_client.get_input_entity(req.bot_username)
-        try:
-            async with current_client.conversation(entity, timeout=req.timeout_sec) as conv:
-                await conv.send_message(req.message_text)
-                
-                # Calculate remaining time for response collection
-                start_time = time.time()
-                remaining_timeout = req.timeout_sec
-                
-                # Loop to collect responses until timeout is reached
-                while remaining_timeout > 0:
-                    try:
-                        # Use the remaining timeout for each response attempt
-                        response = await conv.get_response(timeout=remaining_timeout)
-                        logger.debug("Received response %s", response.raw_text)
-                        reply_markup, reply_kb = _parse_markup(response)
-                        bot_responses.append(BotResponse(
-                            response_type=ResponseType.MESSAGE,
-                            message_id=response.id,
-                            message_text=response.raw_text,
-                            reply_markup=reply_markup,
-                            reply_keyboard=reply_kb,
-                        ))
-                        
-                        # Update remaining timeout
-                        elapsed = time.time() - start_time
-                        remaining_timeout = req.timeout_sec - elapsed
-                        
-                    except asyncio.TimeoutError:
-                        # No more responses within the remaining timeout
-                        logger.debug("No more responses from bot within timeout")
-                        break
-        except asyncio.TimeoutError:
-            # This timeout is for the entire conversation (req.timeout_sec).
-            # Return whatever has been collected so far.
-            logger.warning("Conversation with %s timed out", req.bot_username)
-            return bot_responses
-        
-    return bot_responses
+    tenant: str = Depends(get_tenant),
+    deadline: Optional[float] = Depends(get_request_deadline),
+    svc: Service = Depends(get_service),
+) -> Union[List[BotResponse], ExpectationVerdict, AsyncJobAccepted]:
+    logger.debug("send_message called for %s", req.bot_username)
+    engine = _expectation_engine(req.expectations)
+    if req.callback_url:
+        job = await svc.submit_job(
+            JobRequest(kind=JobKind.SEND_MESSAGE, send_message=req, callback_url=req.callback_url), creds, tenant
+        )
+        response.status_code = 202
+        return AsyncJobAccepted(job_id=job.job_id)
+    req = req.model_copy(update={"timeout_sec": _within_deadline(req.timeout_sec, deadline)})
+    guard = svc.reply_guard()
+    bot_responses = await _run_for_caller(
+        request, svc.run_send_message(req, creds, tenant, engine=engine, guard=guard), deadline
+    )
+    _mark_truncated(response, guard)
+    return engine.finish(time.monotonic()) if engine else bot_responses
 
 
-@app.post("/press-button", response_model=List[BotResponse])
+@router.post("/press-button", response_model=Union[List[BotResponse], ExpectationVerdict, AsyncJobAccepted])
 async def press_button(
     req: PressButtonRequest,
+    request: Request,
+    response: Response,
     creds: TelegramCredentialsRequest = Depends(get_header_credentials),
-) -> List[BotResponse]:
-    logger.info("press_button called for %s", req.bot_username)
+    tenant: str = Depends(get_tenant),
+    deadline: Optional[float] = Depends(get_request_deadline),
+    svc: Service = Depends(get_service),
+) -> Union[List[BotResponse], ExpectationVerdict, AsyncJobAccepted]:
+    logger.debug("press_button called for %s", req.bot_username)
     if not req.button_text and not req.callback_data:
         raise HTTPException(status_code=400, detail="button_text or callback_data required")
+    engine = _expectation_engine(req.expectations)
+
+    if req.callback_url:
+        # Reject invalid reply keyboard presses before accepting the job
+        svc.is_reply_keyboard_press(req, _session_key(creds.api_id, creds.api_hash, creds.session_string))
+        job = await svc.submit_job(
+            JobRequest(kind=JobKind.PRESS_BUTTON, press_button=req, callback_url=req.callback_url), creds, tenant
+        )
+        response.status_code = 202
+        return AsyncJobAccepted(job_id=job.job_id)
+    req = req.model_copy(update={"timeout_sec": _within_deadline(req.timeout_sec, deadline)})
+    guard = svc.reply_guard()
+    bot_responses = await _run_for_caller(
+        request, svc.run_press_button(req, creds, tenant, engine=engine, guard=guard), deadline
+    )
+    _mark_truncated(response, guard)
+    return engine.finish(time.monotonic()) if engine else bot_responses
+
+
+@router.post("/jobs", response_model=JobInfo, status_code=202)
+async def create_job(
+    req: JobRequest,
+    creds: TelegramCredentialsRequest = Depends(get_header_credentials),
+    tenant: str = Depends(get_tenant),
+    svc: Service = Depends(get_service),
+) -> JobInfo:
+    logger.debug("create_job called for %s job", req.kind.value)
+    steps = _job_steps(req)
+    if not steps:
+        raise HTTPException(status_code=400, detail="scenario must contain at least one step")
+    for step in steps:
+        if (step.send_message is None) == (step.press_button is None):
+            raise HTTPException(
+                status_code=400,
+                detail=f"{req.kind.value} job requires exactly one of send_message or press_button per step",
+            )
+        if step.press_button is not None and not step.press_button.button_text and not step.press_button.callback_data:
+            raise HTTPException(status_code=400, detail="button_text or callback_data required")
+        _expectation_engine((step.send_message or step.press_button).expectations)
+    return (await svc.submit_job(req, creds, tenant)).info()
+
+
+@router.get("/jobs/{job_id}", response_model=JobInfo)
+async def get_job(job_id: str, svc: Service = Depends(get_service)) -> JobInfo:
+    info = svc.jobs.get(job_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return info
+
+
+@router.delete("/jobs/{job_id}", response_model=JobInfo)
+async def cancel_job(job_id: str, svc: Service = Depends(get_service)) -> JobInfo:
+    logger.debug("cancel_job called for %s", job_id)
+    info = svc.jobs.cancel(job_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return info
+
+
+@router.post("/profile", response_model=ProfileResponse)
+async def profile(
+    req: ProfileRequest,
+    creds: TelegramCredentialsRequest = Depends(get_header_credentials),
+    tenant: str = Depends(get_tenant),
+    svc: Service = Depends(get_service),
+) -> ProfileResponse:
+    """Send ``message_text`` ``count`` times and report the distribution of time to first reply."""
+    logger.debug("profile called for %s", req.bot_username)
+    if svc.replay is not None:
+        raise HTTPException(status_code=400, detail="Profiling is not available in replay mode")
+    if req.count < 1 or req.concurrency < 1:
+        raise HTTPException(status_code=400, detail="count and concurrency must be positive")
+    if req.count > svc.settings.profile_max_count:
+        raise HTTPException(status_code=400, detail=f"count must not exceed {svc.settings.profile_max_count}")
+
+    span = current_span()
+    span.set(bot=req.bot_username, count=req.count, concurrency=req.concurrency)
+    started = time.monotonic()
+    async with svc.admission.slot(tenant), \
+            svc.telegram_client(creds.api_id, creds.api_hash, creds.session_string) as current_client:
+        with span.phase("resolve_entity"):
+            entity = await current_client.get_input_entity(req.bot_username)
+        profiler = LatencyProfiler(current_client, entity, req.message_text, req.timeout_sec)
+        with span.phase("probe"):
+            await profiler.run(req.count, req.concurrency)
+
+    return ProfileResponse(
+        bot_username=req.bot_username,
+        sent=req.count,
+        replied=profiler.sketch.count,
+        timeouts=profiler.timeouts,
+        errors=profiler.errors,
+        elapsed_ms=int((time.monotonic() - started) * 1000),
+        latency=profiler.sketch.stats(),
+    )
+
+
+@router.post("/load-test")
+async def load_test(
+    req: LoadTestRequest,
+    creds: TelegramCredentialsRequest = Depends(get_header_credentials),
+    tenant: str = Depends(get_tenant),
+    svc: Service = Depends(get_service),
+) -> StreamingResponse:
+    """Drive the bot at ``rate`` messages per second, streaming NDJSON LoadTestSnapshot lines."""
+    logger.debug("load_test called for %s", req.bot_username)
+    if svc.replay is not None:
+        raise HTTPException(status_code=400, detail="Load tests are not available in replay mode")
+    if not req.messages:
+        raise HTTPException(status_code=400, detail="messages must not be empty")
+    if req.rate <= 0 or req.duration_sec <= 0 or req.snapshot_interval_sec <= 0 or req.max_in_flight < 1:
+        raise HTTPException(
+            status_code=400, detail="rate, duration_sec, snapshot_interval_sec and max_in_flight must be positive"
+        )
+    if req.rate * req.duration_sec > svc.settings.load_test_max_messages:
+        raise HTTPException(
+            status_code=400, detail=f"rate * duration_sec must not exceed {svc.settings.load_test_max_messages}"
+        )
 
-    api_id = creds.api_id
-    api_hash = creds.api_hash
-    session_string = creds.session_string
-    
-    bot_responses: List[BotResponse] = []
-
-    async with get_telegram_client(api_id, api_hash, session_string) as current_client:
-        entity = await current_client.get_input_entity(req.bot_username)
-        
-        # Get the latest message to click its button.
-        messages = await current_client.get_messages(entity, limit=1)
-        if not messages:
-            raise HTTPException(status_code=404, detail="No messages to interact with")
-        message_to_click = messages[0]
-        logger.debug("Clicking button on message %s", message_to_click.id)
+    current_span().set(bot=req.bot_username, rate=req.rate, duration_sec=req.duration_sec)
+    # Clients are connected and the bot resolved up front so failures are reported as errors, not as a stream
+    stack = AsyncExitStack()
+    try:
+        await stack.enter_async_context(svc.admission.slot(tenant))
+        targets = []
+        for account in req.accounts or [creds]:
+            account = svc.resolve_credentials(account)
+            current_client = await stack.enter_async_context(
+                svc.telegram_client(account.api_id, account.api_hash, account.session_string)
+            )
+            targets.append((current_client, await current_client.get_input_entity(req.bot_username)))
+    except BaseException:
+        await stack.aclose()
+        raise
+    generator = LoadGenerator(targets, req.messages, req.rate, req.duration_sec, req.timeout_sec, req.max_in_flight)
 
+    async def stream():
+        run = asyncio.create_task(generator.run())
         try:
-            async with current_client.conversation(entity, timeout=req.timeout_sec) as conv:
-                try:
-                    # Click the button on the fetched message
-                    # message_to_click is bound to current_client which is used for the conversation
-                    await message_to_click.click(text=req.button_text, data=req.callback_data)
-                except Exception as e: 
-                    raise HTTPException(status_code=400, detail=f"Failed to press button: {e}") from e
-                
-                # Calculate remaining time for response collection
-                start_time = time.time()
-                remaining_timeout = req.timeout_sec
-                
-                # Loop to collect responses after clicking until timeout is reached
-                while remaining_timeout > 0:
+            async for snapshot in generator.snapshots(run, req.snapshot_interval_sec):
+                yield snapshot.model_dump_json(exclude_none=True) + "\n"
+        finally:
+            # Also reached when the caller disconnects mid-stream
+            run.cancel()
+            await asyncio.gather(run, return_exceptions=True)
+            await stack.aclose()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+def _inline_response(
+    req: InlineQueryRequest, offset: Optional[str], results: "InlineResults", cached: bool
+) -> InlineQueryResponse:
+    parsed = []
+    for result in results:
+        reply_markup, _ = _parse_markup(result.message)
+        parsed.append(InlineResult(
+            id=result.result.id,
+            type=result.type,
+            title=result.title,
+            description=result.description,
+            url=result.url,
+            message_text=getattr(result.message, "message", None),
+            reply_markup=reply_markup,
+        ))
+    return InlineQueryResponse(
+        bot_username=req.bot_username,
+        query=req.query,
+        offset=offset,
+        results=parsed,
+        next_offset=results.next_offset or None,
+        gallery=results.gallery,
+        cache_time=results.cache_time,
+        cached=cached,
+    )
+
+
+@router.post("/inline-query", response_model=InlineQueryResponse)
+async def inline_query(
+    req: InlineQueryRequest,
+    creds: TelegramCredentialsRequest = Depends(get_header_credentials),
+    tenant: str = Depends(get_tenant),
+    svc: Service = Depends(get_service),
+) -> InlineQueryResponse:
+    """Ask the bot for one page of inline results, as typing ``@bot query`` would.
+
+    Pages are cached for the bot's ``cache_time``, so repeated queries are
+    answered without Telegram (or a connection, for temporary clients).
+    """
+    logger.debug("inline_query called for %s", req.bot_username)
+    svc.check_inline()
+    session_key = _session_key(creds.api_id, creds.api_hash, creds.session_string)
+    span = current_span()
+    span.set(bot=req.bot_username, account=session_key)
+    key = inline_key(session_key, req.bot_username, req.chat, req.query, req.offset)
+    results = svc.inline_results.peek(key)
+    cached = results is not None
+    if results is None:
+        async with svc.admission.slot(tenant), \
+                svc.telegram_client(creds.api_id, creds.api_hash, creds.session_string) as current_client:
+            with span.phase("resolve_entity"):
+                entity, chat_entity = await _resolve_chat(current_client, req.bot_username, req.chat)
+            with span.phase("query"):
+                results, cached = await svc.query_inline(
+                    current_client, key, entity, chat_entity, req.query, req.offset
+                )
+    span.set(result_count=len(results), cached=cached)
+    return _inline_response(req, req.offset, results, cached)
+
+
+@router.post("/inline-query/pages")
+async def inline_query_pages(
+    req: InlineQueryRequest,
+    creds: TelegramCredentialsRequest = Depends(get_header_credentials),
+    tenant: str = Depends(get_tenant),
+    svc: Service = Depends(get_service),
+) -> StreamingResponse:
+    """Stream pages of inline results as NDJSON InlineQueryResponse lines, following ``next_offset``.
+
+    Up to ``max_pages`` pages are sent, each as soon as it is known.
+    """
+    logger.debug("inline_query_pages called for %s", req.bot_username)
+    svc.check_inline()
+    if req.max_pages < 1:
+        raise HTTPException(status_code=400, detail="max_pages must be positive")
+    session_key = _session_key(creds.api_id, creds.api_hash, creds.session_string)
+    current_span().set(bot=req.bot_username, account=session_key, max_pages=req.max_pages)
+
+    # The first page is fetched up front so failures are reported as errors, not as a stream
+    stack = AsyncExitStack()
+    try:
+        await stack.enter_async_context(svc.admission.slot(tenant))
+        current_client = await stack.enter_async_context(
+            svc.telegram_client(creds.api_id, creds.api_hash, creds.session_string)
+        )
+        entity, chat_entity = await _resolve_chat(current_client, req.bot_username, req.chat)
+        first = await svc.query_inline(
+            current_client, inline_key(session_key, req.bot_username, req.chat, req.query, req.offset),
+            entity, chat_entity, req.query, req.offset,
+        )
+    except BaseException:
+        await stack.aclose()
+        raise
+
+    async def stream():
+        try:
+            offset = req.offset
+            results, cached = first
+            for page in range(req.max_pages):
+                if page:
+                    key = inline_key(session_key, req.bot_username, req.chat, req.query, offset)
                     try:
-                        # response_event is the message object for NewMessage
-                        response_event = await conv.wait_event(
-                            events.NewMessage(incoming=True, from_users=entity, chats=entity),
-                            timeout=remaining_timeout
+                        results, cached = await svc.query_inline(
+                            current_client, key, entity, chat_entity, req.query, offset
                         )
-                        logger.debug("Received event message %s", response_event.raw_text)
-                        reply_markup, reply_kb = _parse_markup(response_event)
-                        bot_responses.append(BotResponse(
-                            response_type=ResponseType.MESSAGE,
-                            message_id=response_event.id,
-                            message_text=response_event.raw_text,
-                            reply_markup=reply_markup,
-                            reply_keyboard=reply_kb,
-                        ))
-                        
-                        # Update remaining timeout
-                        elapsed = time.time() - start_time
-                        remaining_timeout = req.timeout_sec - elapsed
-                        
-                    except asyncio.TimeoutError:
-                        # No new message event within the remaining timeout
-                        logger.debug("No further events from bot within timeout")
+                    except HTTPException as e:
+                        logger.warning("Inline query page at offset %r failed: %s", offset, e.detail)
                         break
-        except asyncio.TimeoutError:
-            # Conversation timeout (req.timeout_sec).
-            # Return whatever has been collected so far.
-            logger.warning("Conversation with %s timed out during press_button", req.bot_username)
-            return bot_responses
-            
-    return bot_responses
+                response = _inline_response(req, offset, results, cached)
+                yield response.model_dump_json() + "\n"
+                if response.next_offset is None:
+                    break
+                offset = response.next_offset
+        finally:
+            await stack.aclose()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 
-@app.get("/get-messages", response_model=GetMessagesResponse)
+@router.post("/inline-query/choose", response_model=InlineChooseResponse)
+async def choose_inline_result(
+    req: InlineChooseRequest,
+    creds: TelegramCredentialsRequest = Depends(get_header_credentials),
+    tenant: str = Depends(get_tenant),
+    svc: Service = Depends(get_service),
+) -> InlineChooseResponse:
+    """Send one of the bot's inline results to the chat, as tapping it would, then collect the bot's messages there."""
+    from telethon import errors, functions
+
+    logger.debug("choose_inline_result called for %s", req.bot_username)
+    svc.check_inline()
+    session_key = _session_key(creds.api_id, creds.api_hash, creds.session_string)
+    chat = conversation(req.bot_username, req.chat)
+    span = current_span()
+    span.set(bot=req.bot_username, account=session_key, result_id=req.result_id)
+    key = inline_key(session_key, req.bot_username, req.chat, req.query, req.offset)
+    guard = svc.reply_guard()
+
+    async with guard, svc.admission.slot(tenant), svc.chat_gate.shared(session_key, chat), \
+            svc.telegram_client(creds.api_id, creds.api_hash, creds.session_string) as current_client:
+        with span.phase("resolve_entity"):
+            entity, chat_entity = await _resolve_chat(current_client, req.bot_username, req.chat)
+        async with ChatCollector(current_client, chat_entity, entity) as collector:
+            # A cached query id may have expired on Telegram's side first; then ask again once
+            for attempt in range(2):
+                with span.phase("query"):
+                    results, _ = await svc.query_inline(
+                        current_client, key, entity, chat_entity, req.query, req.offset
+                    )
+                if not any(result.result.id == req.result_id for result in results):
+                    raise HTTPException(status_code=404, detail=f"The query has no result {req.result_id!r}")
+                send = functions.messages.SendInlineBotResultRequest(
+                    peer=chat_entity, query_id=results.query_id, id=req.result_id
+                )
+                sent_at = datetime.now(timezone.utc)
+                try:
+                    with span.phase("send"):
+                        # As InlineResult.click does, to get the sent message from the updates
+                        sent = current_client._get_response_message(send, await current_client(send), chat_entity)
+                    break
+                except errors.QueryIdInvalidError:
+                    svc.inline_results.forget(key)
+                    if attempt:
+                        raise HTTPException(status_code=409, detail="The inline query expired; query again")
+            sent_response = svc.message_response(sent, session_key, chat, sent_at)
+            replies: List[BotResponse] = []
+            if req.timeout_sec > 0:
+                with span.phase("collect"):
+                    replies = await svc.collect(collector, req.timeout_sec, session_key, chat, sent_at, guard=guard)
+
+    span.set(reply_count=len(replies))
+    return InlineChooseResponse(sent=sent_response, replies=replies)
+
+
+@router.post("/warmup", response_model=WarmupResponse)
+async def warmup(
+    req: WarmupRequest,
+    creds: TelegramCredentialsRequest = Depends(get_header_credentials),
+    tenant: str = Depends(get_tenant),
+    svc: Service = Depends(get_service),
+) -> WarmupResponse:
+    """Resolve bots ahead of the first interactions with them, reporting how long each took.
+
+    Without ``bot_usernames`` every bot in the account's dialogs is warmed.
+    """
+    logger.debug("warmup called for %s bots", len(req.bot_usernames) if req.bot_usernames is not None else "dialog")
+    max_bots = svc.settings.warmup_max_bots
+    if svc.replay is not None:
+        raise HTTPException(status_code=400, detail="Warm-up is not available in replay mode")
+    if req.concurrency < 1:
+        raise HTTPException(status_code=400, detail="concurrency must be positive")
+    if req.bot_usernames is None and not req.dialogs:
+        raise HTTPException(status_code=400, detail="bot_usernames is required when dialogs is false")
+    if req.bot_usernames is not None and len(req.bot_usernames) > max_bots:
+        raise HTTPException(status_code=400, detail=f"bot_usernames must not exceed {max_bots}")
+    if creds.session_string and svc.sessions.find(creds.api_id, creds.api_hash, creds.session_string) is None:
+        # A temporary client and its cache are gone once the request ends
+        raise HTTPException(
+            status_code=400, detail="Warm-up needs the default account or a session registered with POST /sessions"
+        )
+
+    span = current_span()
+    started = time.monotonic()
+    async with svc.admission.slot(tenant), \
+            svc.telegram_client(creds.api_id, creds.api_hash, creds.session_string) as current_client:
+        warmer = EntityWarmer(current_client, req.concurrency)
+        if req.dialogs:
+            with span.phase("dialogs"):
+                await warmer.read_dialogs(req.dialog_limit)
+        bot_usernames = req.bot_usernames if req.bot_usernames is not None else warmer.dialog_bots
+        with span.phase("resolve"):
+            results = await warmer.resolve(bot_usernames[:max_bots])
+
+    resolved = sum(result.resolved for result in results)
+    span.set(bots=len(results), resolved=resolved, dialogs_read=warmer.dialogs_read)
+    return WarmupResponse(
+        results=results,
+        resolved=resolved,
+        failed=len(results) - resolved,
+        dialogs_read=warmer.dialogs_read,
+        elapsed_ms=int((time.monotonic() - started) * 1000),
+    )
+
+
+@router.get("/get-messages", response_model=GetMessagesResponse)
 async def get_messages(
     bot_username: str,
     limit: int = 5,
+    delta: bool = False,
+    state: Optional[str] = None,
     creds: TelegramCredentialsRequest = Depends(get_header_credentials),
+    svc: Service = Depends(get_service),
 ) -> GetMessagesResponse:
-    logger.info("get_messages called for %s", bot_username)
-    api_id = creds.api_id
-    api_hash = creds.api_hash
-    session_string = creds.session_string
-    async with get_telegram_client(api_id, api_hash, session_string) as current_client:
-        entity = await current_client.get_input_entity(bot_username)
-        messages = await current_client.get_messages(entity, limit=limit)
-        logger.debug("Fetched %d messages", len(messages))
-        msgs: List[BotResponse] = []
-        for m in reversed(messages):
-            reply_markup, reply_kb = _parse_markup(m)
-            msgs.append(BotResponse(
-                response_type=ResponseType.MESSAGE,
-                message_id=m.id,
-                message_text=m.raw_text,
-                reply_markup=reply_markup,
-                reply_keyboard=reply_kb,
-            ))
-    return GetMessagesResponse(messages=msgs)
-
-
-@app.get("/get-updates", response_model=GetMessagesResponse)
+    """Latest messages of the chat, oldest first.
+
+    With ``delta`` (implied by ``state``) only messages that are new or
+    changed since the poll that returned ``state`` are sent, and keyboards
+    are sent once in ``keyboards``, referenced by ``reply_markup_hash``.
+    """
+    logger.debug("get_messages called for %s", bot_username)
+    return await svc.run_get_messages("get_messages", bot_username, limit, creds, delta, state)
+
+
+@router.get("/get-updates", response_model=GetMessagesResponse)
 async def get_updates(
     bot_username: str,
     limit: int = 10, # Default limit for updates
+    delta: bool = False,
+    state: Optional[str] = None,  # As for /get-messages
     creds: TelegramCredentialsRequest = Depends(get_header_credentials),
+    svc: Service = Depends(get_service),
 ) -> GetMessagesResponse:
-    logger.info("get_updates called for %s", bot_username)
-    api_id = creds.api_id
-    api_hash = creds.api_hash
-    session_string = creds.session_string
-    async with get_telegram_client(api_id, api_hash, session_string) as current_client:
-        entity = await current_client.get_input_entity(bot_username)
-        # Fetch messages, newest first
-        raw_messages = await current_client.get_messages(entity, limit=limit)
-        logger.debug("Fetched %d updates", len(raw_messages))
-        
-        processed_messages: List[BotResponse] = []
-        if raw_messages:
-            # Reverse to get chronological order (oldest of the batch first)
-            for m in reversed(raw_messages):
-                reply_markup, reply_kb = _parse_markup(m)
-                processed_messages.append(BotResponse(
-                    response_type=ResponseType.MESSAGE,
-                    message_id=m.id,
-                    message_text=m.raw_text,
-                    reply_markup=reply_markup,
-                    reply_keyboard=reply_kb,
-                ))
-    return GetMessagesResponse(messages=processed_messages)
+    logger.debug("get_updates called for %s", bot_username)
+    return await svc.run_get_messages("get_updates", bot_username, limit, creds, delta, state)
+
+
+@router.post("/sessions", response_model=SessionInfo, status_code=201)
+async def create_session(req: TelegramCredentialsRequest, svc: Service = Depends(get_service)) -> SessionInfo:
+    """Register credentials once and get a token to send as X-Telegram-Session-Token instead.
+
+    The session's client is connected here and stays connected until the
+    session is deleted or left idle for SESSION_IDLE_TIMEOUT seconds.
+    Registering the same credentials again returns the existing session.
+    """
+    if req.api_id is None or not req.api_hash or not req.session_string:
+        raise HTTPException(status_code=400, detail="api_id, api_hash and session_string are required")
+    creds = TelegramCredentialsRequest(api_id=req.api_id, api_hash=req.api_hash, session_string=req.session_string)
+    account = _session_key(creds.api_id, creds.api_hash, creds.session_string)
+    logger.debug("create_session called for account %s", account)
+    current_span().set(account=account)
+    return svc.sessions.info(await svc.sessions.register(creds, account))
+
+
+@router.get("/sessions/{token}", response_model=SessionInfo)
+async def get_session(token: str, svc: Service = Depends(get_service)) -> SessionInfo:
+    session = svc.sessions.get(token)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return svc.sessions.info(session)
+
+
+@router.delete("/sessions/{token}", response_model=SessionInfo)
+async def delete_session(token: str, svc: Service = Depends(get_service)) -> SessionInfo:
+    """Release the session; its client disconnects once requests using it have finished."""
+    session = await svc.sessions.release(token)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return svc.sessions.info(session)
+
+
+@router.get("/health", response_model=HealthStatus)
+async def health(svc: Service = Depends(get_service)) -> HealthStatus:
+    """Liveness: answers while the process runs, whatever its state."""
+    return svc.health()
+
+
+@router.get("/ready", response_model=HealthStatus)
+async def ready(response: Response, svc: Service = Depends(get_service)) -> HealthStatus:
+    """Readiness: a 503 while starting, draining or disconnected from Telegram, so no new work is routed here."""
+    status = svc.health()
+    if not status.ready:
+        response.status_code = 503
+    return status
+
+
+@router.post("/drain", response_model=HealthStatus, status_code=202)
+async def drain(wait: bool = False, svc: Service = Depends(get_service)) -> HealthStatus:
+    """Start draining ahead of shutdown, e.g. from a pre-stop hook; with ``wait``, return once drained.
+
+    New interactions and jobs are turned away with a 503 from now on, and
+    readiness fails. A drain cannot be undone; the process is expected to stop.
+    """
+    if wait:
+        await svc.drain(svc.settings.drain_timeout)
+    else:
+        svc.start_drain()
+    return svc.health()
+
+
+@router.get("/tenants", response_model=List[TenantUsage])
+async def list_tenants(svc: Service = Depends(get_service)) -> List[TenantUsage]:
+    """Quotas and usage of every tenant, for capacity planning."""
+    return svc.admission.usage()
+
+
+@router.get("/tenants/{tenant}", response_model=TenantUsage)
+async def get_tenant_usage(tenant: str, svc: Service = Depends(get_service)) -> TenantUsage:
+    usage = svc.admission.usage(tenant)
+    if not usage:
+        raise HTTPException(status_code=404, detail=f"No usage recorded for tenant {tenant}")
+    return usage[0]
+
+
+@router.get("/circuits", response_model=List[BotCircuit])
+async def list_circuits(svc: Service = Depends(get_service)) -> List[BotCircuit]:
+    """Circuit breaker state of every bot the service has talked to."""
+    return svc.circuits.all()
+
+
+@router.get("/circuits/{bot_username}", response_model=BotCircuit)
+async def get_circuit(bot_username: str, svc: Service = Depends(get_service)) -> BotCircuit:
+    info = svc.circuits.get(bot_username)
+    if info is None:
+        raise HTTPException(status_code=404, detail="No interactions with this bot yet")
+    return info
+
+
+@router.delete("/circuits/{bot_username}", response_model=BotCircuit)
+async def reset_circuit(bot_username: str, svc: Service = Depends(get_service)) -> BotCircuit:
+    """Close the bot's circuit, e.g. after fixing it, without waiting for a probe."""
+    logger.debug("reset_circuit called for %s", bot_username)
+    info = svc.circuits.reset(bot_username)
+    if info is None:
+        raise HTTPException(status_code=404, detail="No interactions with this bot yet")
+    return info
+
+
+@router.get("/search", response_model=SearchResponse)
+async def search(
+    bot_username: str,
+    query: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+    limit: int = 20,
+    refresh: bool = True,
+    creds: TelegramCredentialsRequest = Depends(get_header_credentials),
+    svc: Service = Depends(get_service),
+) -> SearchResponse:
+    """Search the chat with the bot in the local index, newest first.
+
+    With ``refresh`` the index first fetches the messages that are newer than
+    those already indexed (the whole history on the chat's first search).
+    Without it the index answers alone, kept current by the update listener
+    for the default account.
+    """
+    logger.debug("search called for %s", bot_username)
+    if svc.replay is not None:
+        raise HTTPException(status_code=400, detail="Search is not available in replay mode")
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
+    session_key = _session_key(creds.api_id, creds.api_hash, creds.session_string)
+    span = current_span()
+    span.set(bot=bot_username, account=session_key)
+
+    indexed = 0
+    async with svc.chat_gate.shared(session_key, bot_username), \
+            svc.telegram_client(creds.api_id, creds.api_hash, creds.session_string) as current_client:
+        with span.phase("resolve_entity"):
+            entity = await current_client.get_input_entity(bot_username)
+        if refresh:
+            with span.phase("backfill"):
+                indexed = await svc.message_index.backfill(current_client, session_key, entity)
+
+    with span.phase("query"):
+        hits = await svc.message_index.search(
+            session_key, MessageIndex.peer_id(entity), query, _utc(since), _utc(until), before_id, limit,
+        )
+    span.set(hit_count=len(hits), indexed=indexed)
+    return SearchResponse(
+        hits=hits,
+        next_before_id=hits[-1].message_id if len(hits) == limit else None,
+        indexed=indexed,
+    )
+
+
+@router.post("/reset-chat", response_model=ResetChatResponse)
+async def reset_chat(
+    req: ResetChatRequest,
+    creds: TelegramCredentialsRequest = Depends(get_header_credentials),
+    svc: Service = Depends(get_service),
+) -> ResetChatResponse:
+    """Start the chat with the bot afresh.
+
+    ``delete`` clears the history on Telegram in server-side batches;
+    ``logical`` only hides the current history from this service, which
+    needs a single request. Either way the reset waits for interactions with
+    the bot already in flight, and new ones wait for the reset.
+    """
+    logger.debug("reset_chat called for %s (%s)", req.bot_username, req.mode.value)
+    session_key = _session_key(creds.api_id, creds.api_hash, creds.session_string)
+    span = current_span()
+    span.set(bot=req.bot_username, account=session_key, mode=req.mode.value)
+    result = ResetChatResponse(bot_username=req.bot_username, mode=req.mode)
+
+    async with svc.chat_gate.exclusive(session_key, req.bot_username):
+        if svc.replay is not None:
+            # Nothing to reset on Telegram; only forget what was learned about the chat
+            svc.reply_keyboards.invalidate(session_key, req.bot_username)
+            svc.chat_cursors.clear(session_key, req.bot_username)
+            return result
+
+        from telethon import functions
+
+        async with svc.telegram_client(creds.api_id, creds.api_hash, creds.session_string) as current_client:
+            with span.phase("resolve_entity"):
+                entity = await current_client.get_input_entity(req.bot_username)
+
+            if req.mode == ResetMode.LOGICAL:
+                with span.phase("fetch_history"):
+                    latest = await current_client.get_messages(entity, limit=1)
+                result.cursor = max(latest[0].id if latest else 0, svc.chat_cursors.get(session_key, req.bot_username))
+                svc.chat_cursors.set(session_key, req.bot_username, result.cursor)
+                return result
+
+            with span.phase("delete_history"):
+                while True:
+                    affected = await current_client(functions.messages.DeleteHistoryRequest(
+                        peer=entity, max_id=0, just_clear=not req.revoke, revoke=req.revoke,
+                    ))
+                    result.deleted += affected.pts_count
+                    # A non-zero offset means the server stopped early; repeat until it's all gone
+                    if not affected.offset:
+                        break
+
+            await svc.message_index.forget(session_key, MessageIndex.peer_id(entity))
+
+        svc.reply_keyboards.invalidate(session_key, req.bot_username)
+        svc.chat_cursors.clear(session_key, req.bot_username)
+    span.set(deleted=result.deleted)
+    return result
@@ -0,0 +1,163 @@
+import contextvars
+import logging
+import math
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+from fastapi import HTTPException
+
+from .chats import bot_key
+from .models import BotCircuit, CircuitState
+
+logger = logging.getLogger(__name__)
+
+
+class _Interaction:
+    __slots__ = ("responded",)
+
+    def __init__(self) -> None:
+        self.responded = False
+
+
+_current_interaction: contextvars.ContextVar[Optional[_Interaction]] = contextvars.ContextVar(
+    "teletest_current_interaction", default=None
+)
+
+
+def note_response() -> None:
+    """Mark the interaction running in this context as answered by the bot."""
+    interaction = _current_interaction.get()
+    if interaction is not None:
+        interaction.responded = True
+
+
+class _Circuit:
+    def __init__(self, bot_username: str) -> None:
+        self.bot_username = bot_username
+        self.state = CircuitState.CLOSED
+        self.silent = 0
+        self.opened_at = 0.0  # time.monotonic()
+        self.opened_wall: Optional[datetime] = None
+        self.last_response_at: Optional[datetime] = None
+        self.probing = False
+        self.rejected = 0
+
+
+class CircuitBreakers:
+    """Per-bot circuit breakers fed by whether interactions got any response.
+
+    After ``threshold`` interactions in a row end without a reply, the bot's
+    circuit opens and further interactions fail fast with a 503 instead of
+    each waiting out its timeout. Once ``open_sec`` has passed one
+    interaction is let through as a probe (half-open): a response closes the
+    circuit, silence opens it again. Interactions that fail with an error
+    say nothing about the bot and are not counted. A ``threshold`` of 0
+    disables the breakers.
+    """
+
+    def __init__(self, threshold: int = 5, open_sec: float = 30) -> None:
+        self.threshold = threshold
+        self.open_sec = open_sec
+        self._circuits: Dict[str, _Circuit] = {}
+
+    @contextmanager
+    def interaction(self, bot_username: str) -> Iterator[None]:
+        """Admit one interaction with the bot and record its outcome; raises a 503 while the circuit is open."""
+        if self.threshold <= 0:
+            yield
+            return
+        key = bot_key(bot_username)
+        circuit = self._circuits.get(key)
+        if circuit is None:
+            circuit = self._circuits[key] = _Circuit(bot_username)
+        probe = self._admit(circuit)
+        interaction = _Interaction()
+        token = _current_interaction.set(interaction)
+        try:
+            yield
+        except BaseException:
+            if interaction.responded:
+                self._record(circuit, True)
+            elif probe:
+                # Inconclusive probe; let the next interaction probe instead
+                circuit.probing = False
+            raise
+        else:
+            self._record(circuit, interaction.responded)
+        finally:
+            _current_interaction.reset(token)
+
+    def _admit(self, circuit: _Circuit) -> bool:
+        """Let an interaction through, returning whether it is the half-open probe."""
+        if circuit.state is CircuitState.CLOSED:
+            return False
+        now = time.monotonic()
+        if circuit.state is CircuitState.OPEN and now >= circuit.opened_at + self.open_sec:
+            circuit.state = CircuitState.HALF_OPEN
+        if circuit.state is CircuitState.HALF_OPEN and not circuit.probing:
+            logger.info("Probing bot %s", circuit.bot_username)
+            circuit.probing = True
+            return True
+        circuit.rejected += 1
+        retry_after = max(1, math.ceil(circuit.opened_at + self.open_sec - now))
+        raise HTTPException(
+            status_code=503,
+            detail=f"Bot {circuit.bot_username} did not respond to the last {circuit.silent} interactions;"
+                   " failing fast until a probe gets a response",
+            headers={"Retry-After": str(retry_after), "X-Teletest-Circuit": circuit.state.value},
+        )
+
+    def _record(self, circuit: _Circuit, responded: bool) -> None:
+        circuit.probing = False
+        if responded:
+            if circuit.state is not CircuitState.CLOSED:
+                logger.info("Bot %s responded again; closing its circuit", circuit.bot_username)
+            circuit.state = CircuitState.CLOSED
+            circuit.silent = 0
+            circuit.rejected = 0
+            circuit.last_response_at = datetime.now(timezone.utc)
+            return
+        circuit.silent += 1
+        if circuit.state is CircuitState.HALF_OPEN or (
+            circuit.state is CircuitState.CLOSED and circuit.silent >= self.threshold
+        ):
+            logger.warning(
+                "Bot %s did not respond to %d interactions in a row; opening its circuit",
+                circuit.bot_username, circuit.silent,
+            )
+            circuit.state = CircuitState.OPEN
+            circuit.opened_at = time.monotonic()
+            circuit.opened_wall = datetime.now(timezone.utc)
+
+    def _info(self, circuit: _Circuit) -> BotCircuit:
+        state = circuit.state
+        if state is CircuitState.OPEN and time.monotonic() >= circuit.opened_at + self.open_sec:
+            state = CircuitState.HALF_OPEN
+        return BotCircuit(
+            bot_username=circuit.bot_username,
+            state=state,
+            consecutive_silent=circuit.silent,
+            opened_at=circuit.opened_wall if state is not CircuitState.CLOSED else None,
+            last_response_at=circuit.last_response_at,
+            rejected=circuit.rejected,
+        )
+
+    def get(self, bot_username: str) -> Optional[BotCircuit]:
+        circuit = self._circuits.get(bot_key(bot_username))
+        return self._info(circuit) if circuit is not None else None
+
+    def all(self) -> List[BotCircuit]:
+        return [self._info(circuit) for circuit in self._circuits.values()]
+
+    def reset(self, bot_username: str) -> Optional[BotCircuit]:
+        """Close the bot's circuit and forget its history."""
+        circuit = self._circuits.pop(bot_key(bot_username), None)
+        if circuit is None:
+            return None
+        circuit.state = CircuitState.CLOSED
+        circuit.silent = 0
+        circuit.rejected = 0
+        circuit.probing = False
+        return self._info(circuit)
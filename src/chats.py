@@ -0,0 +1,115 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+
+def bot_key(bot_username: str) -> str:
+    """Username per-bot state is kept under: lowercase, without the leading ``@``."""
+    return bot_username.lower().lstrip("@")
+
+
+def chat_key(session_key: str, bot_username: str) -> Tuple[str, str]:
+    return session_key, bot_key(bot_username)
+
+
+def conversation(bot_username: str, chat: Optional[str] = None) -> str:
+    """Name per-chat state is kept under: the bot's private chat, or the bot within the group ``chat``."""
+    return f"{bot_username} in {chat}" if chat else bot_username
+
+
+class _GateState:
+    __slots__ = ("readers", "readers_waiting", "writer", "writers_waiting", "changed")
+
+    def __init__(self) -> None:
+        self.readers = 0
+        self.readers_waiting = 0  # Interactions held back by a reset; they resume on this state
+        self.writer = False
+        self.writers_waiting = 0
+        self.changed = asyncio.Condition()
+
+
+class ChatGate:
+    """Read/write gate per (session, bot) chat.
+
+    Interactions hold the gate shared and run concurrently; a chat reset holds
+    it exclusively, so it waits for in-flight interactions to finish and new
+    ones wait for the reset. A waiting reset blocks new interactions so it
+    cannot be starved.
+    """
+
+    def __init__(self) -> None:
+        self._chats: Dict[Tuple[str, str], _GateState] = {}
+
+    def _state(self, key: Tuple[str, str]) -> _GateState:
+        state = self._chats.get(key)
+        if state is None:
+            state = self._chats[key] = _GateState()
+        return state
+
+    def _discard_if_idle(self, key: Tuple[str, str], state: _GateState) -> None:
+        idle = not (state.readers or state.readers_waiting or state.writer or state.writers_waiting)
+        if idle and self._chats.get(key) is state:
+            del self._chats[key]
+
+    @asynccontextmanager
+    async def shared(self, session_key: str, bot_username: str) -> AsyncIterator[None]:
+        key = chat_key(session_key, bot_username)
+        state = self._state(key)
+        async with state.changed:
+            state.readers_waiting += 1
+            try:
+                await state.changed.wait_for(lambda: not state.writer and not state.writers_waiting)
+            except BaseException:
+                state.readers_waiting -= 1
+                self._discard_if_idle(key, state)
+                raise
+            state.readers_waiting -= 1
+            state.readers += 1
+        try:
+            yield
+        finally:
+            async with state.changed:
+                state.readers -= 1
+                state.changed.notify_all()
+                self._discard_if_idle(key, state)
+
+    @asynccontextmanager
+    async def exclusive(self, session_key: str, bot_username: str) -> AsyncIterator[None]:
+        key = chat_key(session_key, bot_username)
+        state = self._state(key)
+        async with state.changed:
+            state.writers_waiting += 1
+            try:
+                await state.changed.wait_for(lambda: not state.writer and not state.readers)
+            except BaseException:
+                state.writers_waiting -= 1
+                # Interactions held back by this reset may proceed
+                state.changed.notify_all()
+                self._discard_if_idle(key, state)
+                raise
+            state.writers_waiting -= 1
+            state.writer = True
+        try:
+            yield
+        finally:
+            async with state.changed:
+                state.writer = False
+                state.changed.notify_all()
+                self._discard_if_idle(key, state)
+
+
+class ChatCursors:
+    """Per-chat logical start of history: messages up to the cursor are treated as gone."""
+
+    def __init__(self) -> None:
+        self._cursors: Dict[Tuple[str, str], int] = {}
+
+    def get(self, session_key: str, bot_username: str) -> int:
+        """Highest hidden message id, or 0 when the whole history is visible."""
+        return self._cursors.get(chat_key(session_key, bot_username), 0)
+
+    def set(self, session_key: str, bot_username: str, message_id: int) -> None:
+        self._cursors[chat_key(session_key, bot_username)] = message_id
+
+    def clear(self, session_key: str, bot_username: str) -> Optional[int]:
+        return self._cursors.pop(chat_key(session_key, bot_username), None)
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import random
+from typing import Callable, Dict, Optional, Set
+
+from telethon import TelegramClient
+from telethon.network import (
+    ConnectionTcpAbridged,
+    ConnectionTcpFull,
+    ConnectionTcpIntermediate,
+    ConnectionTcpObfuscated,
+)
+from telethon.sessions import StringSession
+
+from .settings import ClientSettings
+
+logger = logging.getLogger(__name__)
+
+CONNECTION_MODES = {
+    "tcp_full": ConnectionTcpFull,
+    "tcp_abridged": ConnectionTcpAbridged,
+    "tcp_intermediate": ConnectionTcpIntermediate,
+    "tcp_obfuscated": ConnectionTcpObfuscated,
+}
+
+
+class SessionNotAuthorized(RuntimeError):
+    """The session string is not (or no longer) authorized; reconnecting will not help."""
+
+
+class PooledTelegramClient(TelegramClient):
+    """TelegramClient whose RPCs wait for one of ``max_in_flight`` slots."""
+
+    def __init__(self, *args, max_in_flight: int = 0, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._in_flight = asyncio.Semaphore(max_in_flight) if max_in_flight > 0 else None
+
+    async def __call__(self, request, ordered=False, flood_sleep_threshold=None):
+        if self._in_flight is None:
+            return await super().__call__(request, ordered, flood_sleep_threshold)
+        async with self._in_flight:
+            return await super().__call__(request, ordered, flood_sleep_threshold)
+
+
+class ClientFactory:
+    """Creates, connects and supervises Telegram clients.
+
+    Connecting is single-flight per client: concurrent callers finding a
+    client disconnected all wait for the same attempt instead of each
+    starting their own. Attempts back off exponentially with full jitter, so
+    clients dropped by the same network blip do not reconnect in lockstep.
+    """
+
+    def __init__(self, settings: ClientSettings) -> None:
+        if settings.connection not in CONNECTION_MODES:
+            raise ValueError(
+                f"Unknown connection mode {settings.connection!r}; expected one of {', '.join(CONNECTION_MODES)}"
+            )
+        self.settings = settings
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._supervisors: Dict[int, asyncio.Task] = {}
+        self._clients: Set[TelegramClient] = set()  # Created and not yet released
+        self._closed = False
+
+    def create(self, session_string: str, api_id: int, api_hash: str) -> PooledTelegramClient:
+        s = self.settings
+        client = PooledTelegramClient(
+            StringSession(session_string),
+            int(api_id),
+            api_hash,
+            connection=CONNECTION_MODES[s.connection],
+            timeout=s.timeout,
+            request_retries=s.request_retries,
+            connection_retries=s.connection_retries,
+            retry_delay=s.retry_delay * random.uniform(1, 2),
+            auto_reconnect=s.auto_reconnect,
+            flood_sleep_threshold=s.flood_sleep_threshold,
+            entity_cache_limit=s.entity_cache_limit,
+            loop=asyncio.get_running_loop(),
+            max_in_flight=s.max_in_flight,
+        )
+        self._clients.add(client)
+        return client
+
+    async def connect(self, client: TelegramClient) -> None:
+        """Connect ``client`` unless it already is, retrying with jittered exponential backoff.
+
+        Authorization is checked with ``get_me``, which also caches the
+        account's own entity, so a fresh connection costs one round trip
+        instead of separate authorization and warm-up calls.
+        """
+        lock = self._locks.setdefault(id(client), asyncio.Lock())
+        async with lock:
+            if client.is_connected():
+                return
+            s = self.settings
+            for attempt in range(s.reconnect_attempts):
+                try:
+                    await client.connect()
+                    break
+                except (OSError, asyncio.TimeoutError) as e:
+                    if attempt == s.reconnect_attempts - 1:
+                        raise
+                    delay = random.uniform(0, min(s.reconnect_max_delay, s.reconnect_base_delay * 2 ** attempt))
+                    logger.warning("Telegram connection attempt %d failed (%s); retrying in %.2fs", attempt + 1, e, delay)
+                    await asyncio.sleep(delay)
+            if await client.get_me(input_peer=True) is None:
+                await client.disconnect()
+                raise SessionNotAuthorized("Telegram session is not authorized")
+
+    def supervise(self, client: TelegramClient, on_failure: Optional[Callable[[str], None]] = None) -> None:
+        """Keep ``client`` connected after Telethon's own reconnect attempts give up.
+
+        A session that is no longer authorized is not retried; supervision
+        stops and ``on_failure`` is told why.
+        """
+        key = id(client)
+        task = asyncio.create_task(self._supervise(client, on_failure))
+        self._supervisors[key] = task
+        task.add_done_callback(lambda done: self._supervisors.pop(key, None) if self._supervisors.get(key) is done else None)
+
+    async def _supervise(self, client: TelegramClient, on_failure: Optional[Callable[[str], None]]) -> None:
+        while not self._closed:
+            try:
+                await client.disconnected
+            except Exception as e:
+                logger.debug("Telegram client disconnected with error: %s", e)
+            if self._closed:
+                return
+            logger.warning("Telegram client disconnected; reconnecting")
+            try:
+                await self.connect(client)
+            except SessionNotAuthorized as e:
+                logger.error("Telegram client cannot reconnect: %s; giving up", e)
+                if on_failure:
+                    on_failure(str(e))
+                return
+            except Exception as e:
+                logger.error("Telegram client reconnect failed: %s", e)
+                await asyncio.sleep(self.settings.reconnect_max_delay)
+
+    def forget(self, client: TelegramClient) -> None:
+        self._locks.pop(id(client), None)
+        self._clients.discard(client)
+
+    async def release(self, client: TelegramClient) -> None:
+        """Stop supervising ``client``, then disconnect and forget it."""
+        task = self._supervisors.pop(id(client), None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self.forget(client)
+        await client.disconnect()
+
+    async def aclose(self) -> None:
+        """Stop supervising, then disconnect every client not released yet, all at once."""
+        self._closed = True
+        tasks = list(self._supervisors.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        clients = [client for client in self._clients if client.is_connected()]
+        self._clients.clear()
+        self._locks.clear()
+        if not clients:
+            return
+        logger.info("Disconnecting %d Telegram clients", len(clients))
+        try:
+            results = await asyncio.wait_for(
+                asyncio.gather(*(client.disconnect() for client in clients), return_exceptions=True),
+                self.settings.timeout,
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Telegram clients did not disconnect within %ss", self.settings.timeout)
+            return
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning("Failed to disconnect a Telegram client: %s", result)
@@ -0,0 +1,115 @@
+import asyncio
+import time
+import weakref
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from telethon import TelegramClient, events
+    from telethon.tl.custom import Message
+
+RouteKey = Tuple[int, Optional[int]]  # (chat id, sender id); a None sender matches everyone in the chat
+
+
+class UpdateRouter:
+    """Hands a client's incoming new and edited messages to the collectors waiting for them.
+
+    A single pair of event handlers serves all collectors of the client and
+    finds the recipients of each update by its (chat id, sender id) in a
+    dict. A busy group therefore costs the same per update however many
+    requests are waiting, instead of passing every update through one
+    filter chain per waiting request.
+    """
+
+    _routers: "weakref.WeakKeyDictionary[TelegramClient, UpdateRouter]" = weakref.WeakKeyDictionary()
+
+    def __init__(self, client: "TelegramClient") -> None:
+        self._client = client
+        self._routes: Dict[RouteKey, List["ChatCollector"]] = {}
+        self._attached = False
+
+    @classmethod
+    def of(cls, client: "TelegramClient") -> "UpdateRouter":
+        router = cls._routers.get(client)
+        if router is None:
+            router = cls._routers[client] = cls(client)
+        return router
+
+    def add(self, key: RouteKey, collector: "ChatCollector") -> None:
+        if not self._attached:
+            from telethon import events
+
+            self._client.add_event_handler(self._on_new, events.NewMessage(incoming=True))
+            self._client.add_event_handler(self._on_edited, events.MessageEdited(incoming=True))
+            self._attached = True
+        self._routes.setdefault(key, []).append(collector)
+
+    def remove(self, key: RouteKey, collector: "ChatCollector") -> None:
+        collectors = self._routes.get(key)
+        if collectors is None:
+            return
+        if collector in collectors:
+            collectors.remove(collector)
+        if not collectors:
+            del self._routes[key]
+
+    async def _on_new(self, event: "events.NewMessage.Event") -> None:
+        self._dispatch(ChatCollector.NEW, event)
+
+    async def _on_edited(self, event: "events.MessageEdited.Event") -> None:
+        self._dispatch(ChatCollector.EDITED, event)
+
+    def _dispatch(self, kind: str, event: "events.NewMessage.Event") -> None:
+        if not self._routes:
+            return
+        chat_id = event.chat_id
+        received_at = time.monotonic()
+        for key in ((chat_id, event.sender_id), (chat_id, None)):
+            for collector in self._routes.get(key, ()):
+                collector.deliver(kind, event.message, received_at)
+
+
+class ChatCollector:
+    """Receives new and edited messages from one chat, optionally from one sender only.
+
+    The collector is routed to on entry, before anything is sent or clicked,
+    so no reply can slip through between the action and the start of
+    collection. Each item carries the ``time.monotonic()`` moment it was
+    received. In groups and channels, messages sent on behalf of the chat
+    itself are collected too: that is how a bot's posts appear in a channel.
+    """
+
+    NEW = "new"
+    EDITED = "edited"
+
+    def __init__(self, client: "TelegramClient", chat, sender=None) -> None:
+        self._client = client
+        self._chat = chat
+        self._sender = sender
+        self._keys: List[RouteKey] = []
+        self._queue: "asyncio.Queue[Tuple[str, Message, float]]" = asyncio.Queue()
+
+    async def __aenter__(self) -> "ChatCollector":
+        from telethon import utils
+
+        chat_id = utils.get_peer_id(self._chat)
+        sender_id = utils.get_peer_id(self._sender) if self._sender is not None else None
+        self._keys = [(chat_id, sender_id)]
+        if sender_id is not None and sender_id != chat_id and chat_id < 0:
+            # Posts sent as the chat itself
+            self._keys.append((chat_id, chat_id))
+        router = UpdateRouter.of(self._client)
+        for key in self._keys:
+            router.add(key, self)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        router = UpdateRouter.of(self._client)
+        for key in self._keys:
+            router.remove(key, self)
+
+    def deliver(self, kind: str, message: "Message", received_at: float) -> None:
+        self._queue.put_nowait((kind, message, received_at))
+
+    async def get(self, timeout: Optional[float]) -> Tuple[str, "Message", float]:
+        """Next ``(kind, message, received_at)``; raises ``asyncio.TimeoutError`` after ``timeout``."""
+        return await asyncio.wait_for(self._queue.get(), timeout=timeout)
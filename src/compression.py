@@ -0,0 +1,147 @@
+import inspect
+import logging
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import routing
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def fast_json_response_class() -> Optional[type]:
+    """Response class to install as the app default, or None to keep FastAPI's own.
+
+    Recent FastAPI versions serialize response models straight to JSON bytes
+    in Pydantic's core, which beats any custom class (and is disabled by
+    setting one). Older versions build a dict and ``json.dumps`` it; there
+    orjson is used when installed.
+    """
+    if "dump_json" in inspect.signature(routing.serialize_response).parameters:
+        return None
+    if orjson is None:
+        return None
+    from fastapi.responses import ORJSONResponse
+    return ORJSONResponse
+
+
+class _GzipEncoder:
+    def __init__(self, level: int) -> None:
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def encode(self, data: bytes, final: bool) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class _BrotliEncoder:
+    def __init__(self, quality: int) -> None:
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def encode(self, data: bytes, final: bool) -> bytes:
+        out = self._compressor.process(data)
+        return out + (self._compressor.finish() if final else self._compressor.flush())
+
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    accepted: Dict[str, float] = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    return accepted
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses of at least ``minimum_size`` bytes.
+
+    Brotli is preferred when the client accepts it and the ``brotli`` package
+    is installed, gzip otherwise. Streaming responses are compressed chunk by
+    chunk and flushed after each one, so NDJSON lines still arrive as they
+    are produced.
+    """
+
+    def __init__(self, app: Any, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _choose(self, scope: dict) -> Optional[str]:
+        header = ""
+        for key, value in scope["headers"]:
+            if key == b"accept-encoding":
+                header = value.decode("latin-1")
+                break
+        accepted = _accepted_encodings(header)
+        if brotli is not None and accepted.get("br", 0) > 0:
+            return "br"
+        if accepted.get("gzip", 0) > 0:
+            return "gzip"
+        return None
+
+    def _encoder(self, encoding: str):
+        if encoding == "br":
+            return _BrotliEncoder(self.brotli_quality)
+        return _GzipEncoder(self.gzip_level)
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        encoding = self._choose(scope) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[dict] = None
+        encoder = None
+        passthrough = False
+
+        async def send_wrapper(message: dict) -> None:
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                headers: List[Tuple[bytes, bytes]] = list(start["headers"])
+                already_encoded = any(k == b"content-encoding" for k, _ in headers)
+                if already_encoded or (not more_body and len(body) < self.minimum_size):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = self._encoder(encoding)
+                headers = [(k, v) for k, v in headers if k != b"content-length"]
+                headers.append((b"content-encoding", encoding.encode()))
+                headers.append((b"vary", b"Accept-Encoding"))
+                if not more_body:
+                    body = encoder.encode(body, final=True)
+                    headers.append((b"content-length", str(len(body)).encode()))
+                    await send({**start, "headers": headers})
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send({**start, "headers": headers})
+
+            await send({"type": "http.response.body", "body": encoder.encode(body, final=not more_body), "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
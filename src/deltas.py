@@ -0,0 +1,106 @@
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from .models import BotResponse, GetMessagesResponse, MessageButton
+
+Keyboard = List[List[MessageButton]]
+
+
+def _digest(data: str) -> str:
+    return hashlib.blake2b(data.encode(), digest_size=8).hexdigest()
+
+
+def keyboard_hash(keyboard: Keyboard) -> str:
+    """Content hash addressing a keyboard grid; equal grids hash alike in every chat."""
+    return _digest(json.dumps(
+        [[[button.text, button.callback_data] for button in row] for row in keyboard], separators=(",", ":"),
+    ))
+
+
+class _State:
+    __slots__ = ("versions", "keyboards")
+
+    def __init__(self, versions: Dict[int, str], keyboards: FrozenSet[str]) -> None:
+        self.versions = versions  # Message id -> content hash
+        self.keyboards = keyboards  # Keyboard hashes the poller holds
+
+
+class MessageDeltas:
+    """Polling state that lets a poll return only what changed since the previous one.
+
+    A poll's state token names what the poller has seen: the content of each
+    message in its window and the keyboards they show. Given that token, the
+    next poll only returns new and changed messages. Keyboards are addressed
+    by content hash and sent once; a message whose keyboard the poller
+    already holds only carries its hash. Messages that left the window are
+    listed in ``removed``. Tokens are digests of the state, so polls that see
+    no change get the same token back; they are only valid for the (account,
+    bot) chat they were issued for. Only the latest ``max_states`` states are
+    kept; an unknown token is answered in full.
+    """
+
+    def __init__(self, max_states: int = 10000) -> None:
+        self.max_states = max_states
+        # Keyed by the chat's (account, bot) key and the token
+        self._states: "OrderedDict[Tuple[str, str, str], _State]" = OrderedDict()
+
+    def _lookup(self, chat: Tuple[str, str], token: Optional[str]) -> Optional[_State]:
+        key = (*chat, token) if token else None
+        state = self._states.get(key) if key else None
+        if state is not None:
+            self._states.move_to_end(key)
+        return state
+
+    def _remember(self, chat: Tuple[str, str], versions: Dict[int, str], keyboards: FrozenSet[str]) -> str:
+        token = _digest(json.dumps(sorted(versions.items()), separators=(",", ":")))
+        key = (*chat, token)
+        if key in self._states:
+            self._states.move_to_end(key)
+        else:
+            self._states[key] = _State(versions, keyboards)
+            while len(self._states) > self.max_states:
+                self._states.popitem(last=False)
+        return token
+
+    def diff(self, chat: Tuple[str, str], token: Optional[str], messages: List[BotResponse]) -> GetMessagesResponse:
+        """Delta response for ``messages``, the poll's current window of ``chat``, against the state ``token`` names."""
+        previous = self._lookup(chat, token)
+        seen = previous.versions if previous is not None else {}
+        held = previous.keyboards if previous is not None else frozenset()
+
+        versions: Dict[int, str] = {}
+        window_keyboards = set()
+        changed: List[BotResponse] = []
+        keyboards: Dict[str, Keyboard] = {}
+        for message in messages:
+            markup_hash, version = self._version(message)
+            if message.message_id is not None:
+                versions[message.message_id] = version
+                if markup_hash is not None:
+                    window_keyboards.add(markup_hash)
+                if seen.get(message.message_id) == version:
+                    continue
+            if markup_hash is not None:
+                if markup_hash not in held:
+                    keyboards[markup_hash] = message.reply_markup
+                message = message.model_copy(update={"reply_markup": None, "reply_markup_hash": markup_hash})
+            changed.append(message)
+
+        removed = sorted(message_id for message_id in seen if message_id not in versions)
+        return GetMessagesResponse(
+            messages=changed,
+            state=self._remember(chat, versions, frozenset(window_keyboards)),
+            keyboards=keyboards,
+            removed=removed or None,
+        )
+
+    @staticmethod
+    def _version(message: BotResponse) -> Tuple[Optional[str], str]:
+        markup_hash = keyboard_hash(message.reply_markup) if message.reply_markup else None
+        version = _digest(json.dumps(
+            [message.response_type.value, message.message_text, markup_hash, message.reply_keyboard],
+            separators=(",", ":"),
+        ))
+        return markup_hash, version
@@ -0,0 +1,139 @@
+import re
+from enum import Enum
+from typing import Dict, List, Optional
+
+from .models import (
+    BotResponse,
+    Expectation,
+    ExpectationResult,
+    ExpectationType,
+    ExpectationVerdict,
+)
+
+
+class _State(str, Enum):
+    PENDING = "pending"
+    PASSED = "passed"
+    FAILED = "failed"
+
+
+class ExpectationEngine:
+    """Evaluates declarative expectations incrementally while replies arrive.
+
+    ``reply_matches`` and ``has_button`` are judged on replies as received.
+    With an ``index`` they are decided as soon as that reply arrives; without
+    one they pass on the first matching reply. ``edited_within`` with an
+    ``index`` needs that reply to be edited within ``within_ms`` of its
+    arrival; without one any message in the chat must be edited within
+    ``within_ms`` of the message being sent, as marked by ``start``. All
+    times are ``time.monotonic()``.
+    """
+
+    def __init__(self, expectations: List[Expectation], started_at: float) -> None:
+        for i, exp in enumerate(expectations):
+            if exp.index is not None and exp.index < 0:
+                raise ValueError(f"expectation {i}: index must not be negative")
+            if exp.type is ExpectationType.REPLY_MATCHES and exp.pattern is None:
+                raise ValueError(f"expectation {i}: reply_matches requires pattern")
+            if exp.type is ExpectationType.HAS_BUTTON and exp.text is None:
+                raise ValueError(f"expectation {i}: has_button requires text")
+            if exp.type is ExpectationType.EDITED_WITHIN and exp.within_ms is None:
+                raise ValueError(f"expectation {i}: edited_within requires within_ms")
+        self._expectations = expectations
+        try:
+            self._patterns: Dict[int, re.Pattern] = {
+                i: re.compile(exp.pattern) for i, exp in enumerate(expectations) if exp.pattern is not None
+            }
+        except re.error as e:
+            raise ValueError(f"invalid pattern: {e}") from e
+        self._started_at = started_at
+        self._states = [_State.PENDING] * len(expectations)
+        self._details: List[Optional[str]] = [None] * len(expectations)
+        self._replies: List[BotResponse] = []
+        self._received_at: List[float] = []
+
+    def start(self, now: float) -> None:
+        """Mark the moment the message or click went out; waits before it do not count."""
+        self._started_at = now
+
+    @property
+    def decided(self) -> bool:
+        """True once the verdict can no longer change."""
+        return _State.FAILED in self._states or all(s is _State.PASSED for s in self._states)
+
+    def on_reply(self, response: BotResponse, now: float) -> None:
+        index = len(self._replies)
+        self._replies.append(response)
+        self._received_at.append(now)
+        for i, exp in self._pending():
+            if exp.index is not None and exp.index != index:
+                continue
+            if exp.type is ExpectationType.REPLY_MATCHES:
+                if self._patterns[i].search(response.message_text or ""):
+                    self._pass(i)
+                elif exp.index is not None:
+                    self._fail(i, f"reply {index} {response.message_text!r} does not match")
+            elif exp.type is ExpectationType.HAS_BUTTON:
+                if any(b.text == exp.text for row in response.reply_markup or [] for b in row):
+                    self._pass(i)
+                elif exp.index is not None:
+                    self._fail(i, f"reply {index} has no button {exp.text!r}")
+
+    def on_edit(self, message_id: int, now: float) -> None:
+        # Settle windows that closed before this edit arrived
+        self.tick(now)
+        for i, exp in self._pending():
+            if exp.type is not ExpectationType.EDITED_WITHIN:
+                continue
+            if exp.index is None:
+                self._pass(i)
+            elif exp.index < len(self._replies) and self._replies[exp.index].message_id == message_id:
+                self._pass(i)
+
+    def tick(self, now: float) -> None:
+        """Fail ``edited_within`` expectations whose window has closed."""
+        for i, exp in self._pending():
+            deadline = self._edit_deadline(exp)
+            if deadline is not None and now > deadline:
+                self._fail(i, f"no edit within {exp.within_ms} ms")
+
+    def next_deadline(self) -> Optional[float]:
+        """Earliest moment a pending expectation may fail without further events."""
+        deadlines = [
+            d for _, exp in self._pending() if (d := self._edit_deadline(exp)) is not None
+        ]
+        return min(deadlines) if deadlines else None
+
+    def finish(self, now: float) -> ExpectationVerdict:
+        """Fail whatever is still pending and build the verdict."""
+        for i, _ in self._pending():
+            self._fail(i, "not satisfied before timeout")
+        results = [
+            ExpectationResult(index=i, passed=state is _State.PASSED, detail=self._details[i])
+            for i, state in enumerate(self._states)
+        ]
+        return ExpectationVerdict(
+            passed=all(r.passed for r in results),
+            results=results,
+            reply_count=len(self._replies),
+            elapsed_ms=int((now - self._started_at) * 1000),
+        )
+
+    def _pending(self):
+        return [(i, exp) for i, exp in enumerate(self._expectations) if self._states[i] is _State.PENDING]
+
+    def _edit_deadline(self, exp: Expectation) -> Optional[float]:
+        if exp.type is not ExpectationType.EDITED_WITHIN or exp.within_ms is None:
+            return None
+        if exp.index is None:
+            return self._started_at + exp.within_ms / 1000
+        if exp.index < len(self._received_at):
+            return self._received_at[exp.index] + exp.within_ms / 1000
+        return None
+
+    def _pass(self, i: int) -> None:
+        self._states[i] = _State.PASSED
+
+    def _fail(self, i: int, detail: str) -> None:
+        self._states[i] = _State.FAILED
+        self._details[i] = detail
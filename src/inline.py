@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Optional, Tuple
+
+from .chats import bot_key
+
+if TYPE_CHECKING:
+    from telethon.tl.custom import InlineResults
+
+logger = logging.getLogger(__name__)
+
+# (account, bot, chat, query, offset)
+InlineKey = Tuple[str, str, Optional[str], str, str]
+
+
+def inline_key(account: str, bot_username: str, chat: Optional[str], query: str, offset: Optional[str]) -> InlineKey:
+    return account, bot_key(bot_username), chat, query, offset or ""
+
+
+class InlineResultCache:
+    """Inline query results, kept for as long as the bot's ``cache_time`` allows.
+
+    Entries are per account, since query ids and personal results belong to
+    the account that asked. Lifetimes are capped at ``max_ttl`` seconds, and
+    only the ``max_entries`` most recently used are kept. Concurrent misses
+    for the same page share one query to Telegram.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_ttl: float = 300) -> None:
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._entries: "OrderedDict[InlineKey, Tuple[float, InlineResults]]" = OrderedDict()
+        self._pending: Dict[InlineKey, "asyncio.Future[InlineResults]"] = {}
+
+    def peek(self, key: InlineKey) -> Optional["InlineResults"]:
+        """Fresh cached results for ``key``, if any."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, results = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return results
+
+    def forget(self, key: InlineKey) -> None:
+        self._entries.pop(key, None)
+
+    async def get(self, key: InlineKey, fetch: Callable[[], Awaitable["InlineResults"]]) -> Tuple["InlineResults", bool]:
+        """Results for ``key`` and whether they came from the cache; ``fetch`` queries Telegram on a miss."""
+        results = self.peek(key)
+        if results is not None:
+            return results, True
+        future = self._pending.get(key)
+        if future is None:
+            future = self._pending[key] = asyncio.ensure_future(self._fetch(key, fetch))
+            # Still awaited by the fetch's other callers if this one is cancelled
+            future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        return await asyncio.shield(future), False
+
+    async def _fetch(self, key: InlineKey, fetch: Callable[[], Awaitable["InlineResults"]]) -> "InlineResults":
+        try:
+            results = await fetch()
+        finally:
+            self._pending.pop(key, None)
+        ttl = min(results.cache_time, self.max_ttl)
+        if ttl > 0:
+            self._entries[key] = (time.monotonic() + ttl, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return results
@@ -0,0 +1,354 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from .models import (
+    BotResponse,
+    JobInfo,
+    JobRequest,
+    JobStatus,
+    ExpectationVerdict,
+    TelegramCredentialsRequest,
+)
+
+logger = logging.getLogger(__name__)
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobQueueClosed(Exception):
+    pass
+
+
+class JobFailed(Exception):
+    """Raised by an executor to fail a job with a message but without a traceback."""
+
+
+@dataclass
+class Job:
+    job_id: str
+    request: JobRequest
+    creds: TelegramCredentialsRequest  # Kept in memory only, never persisted
+    tenant: str = "default"  # Admitted as, for each step; kept in memory only too
+    status: JobStatus = JobStatus.QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    results: List[List[BotResponse]] = field(default_factory=list)
+    verdicts: List[Optional[ExpectationVerdict]] = field(default_factory=list)
+    truncated: List[Optional[str]] = field(default_factory=list)
+    error: Optional[str] = None
+    task: Optional[asyncio.Task] = None
+
+    def begin_step(self) -> None:
+        self.results.append([])
+
+    def add_response(self, response: BotResponse) -> None:
+        self.results[-1].append(response)
+
+    def info(self) -> JobInfo:
+        return JobInfo(
+            job_id=self.job_id,
+            kind=self.request.kind,
+            status=self.status,
+            created_at=self.created_at,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            results=self.results,
+            verdicts=self.verdicts,
+            truncated=self.truncated,
+            error=self.error,
+        )
+
+
+JobExecutor = Callable[[Job], Awaitable[None]]
+
+
+class JobStore:
+    """Optional SQLite persistence of job state and results.
+
+    Writes happen on a worker thread (see JobQueue), so the connection may
+    be used from any thread, one at a time.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                request TEXT NOT NULL,
+                results TEXT NOT NULL,
+                error TEXT,
+                verdicts TEXT,
+                truncated TEXT
+            )"""
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column in ("verdicts", "truncated"):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+        # Jobs left unfinished by a previous process can never complete: their
+        # credentials were only held in memory.
+        self._db.execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status IN (?, ?)",
+            (JobStatus.FAILED.value, "interrupted by restart", time.time(),
+             JobStatus.QUEUED.value, JobStatus.RUNNING.value),
+        )
+        self._db.commit()
+
+    @staticmethod
+    def row(job: Job) -> Tuple[Any, ...]:
+        """The job's current state as a row; taken on the event loop, while nothing else changes the job."""
+        return (
+            job.job_id,
+            job.request.kind.value,
+            job.status.value,
+            job.created_at,
+            job.started_at,
+            job.finished_at,
+            job.request.model_dump_json(exclude_none=True),
+            json.dumps([[r.model_dump(mode="json", exclude_none=True) for r in step] for step in job.results]),
+            job.error,
+            json.dumps([v.model_dump(mode="json") if v else None for v in job.verdicts]),
+            json.dumps(job.truncated),
+        )
+
+    def save(self, rows: List[Tuple[Any, ...]]) -> None:
+        """Write ``rows`` in one transaction."""
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    def load(self, job_id: str) -> Optional[JobInfo]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT job_id, kind, status, created_at, started_at, finished_at, results, error, verdicts, truncated"
+                " FROM jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return JobInfo(
+            job_id=row[0],
+            kind=row[1],
+            status=row[2],
+            created_at=row[3],
+            started_at=row[4],
+            finished_at=row[5],
+            results=json.loads(row[6]),
+            error=row[7],
+            verdicts=json.loads(row[8] or "[]"),
+            truncated=json.loads(row[9] or "[]"),
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class JobQueue:
+    """In-memory job queue executed by a bounded pool of worker tasks.
+
+    Finished jobs stay in memory up to ``max_finished`` (oldest evicted first);
+    with a ``db_path`` every state change is also written to SQLite so results
+    outlive eviction and restarts. A single writer task saves the jobs changed
+    since its last write in one transaction on a worker thread, so the event
+    loop never waits on the disk and bursts of changes share a commit.
+    """
+
+    def __init__(
+        self,
+        executor: JobExecutor,
+        workers: int = 16,
+        max_queued: int = 10000,
+        max_finished: int = 1000,
+        db_path: Optional[str] = None,
+    ) -> None:
+        self._executor = executor
+        self._workers = workers
+        self._max_queued = max_queued
+        self._max_finished = max_finished
+        self._db_path = db_path
+        self._store: Optional[JobStore] = None
+        self._queue: Optional["asyncio.Queue[Job]"] = None
+        self._active: Dict[str, Job] = {}
+        self._pending: "Counter[str]" = Counter()  # Active jobs by tenant
+        self._finished: "OrderedDict[str, Job]" = OrderedDict()
+        self._worker_tasks: List[asyncio.Task] = []
+        self._closed = False
+        self._unsaved: Dict[str, Job] = {}  # Changed since the writer last saved them
+        self._unsaved_event = asyncio.Event()
+        self._writer_task: Optional[asyncio.Task] = None
+
+    @property
+    def active(self) -> int:
+        """Jobs queued or running."""
+        return len(self._active)
+
+    async def start(self) -> None:
+        if self._db_path and self._store is None:
+            self._store = await asyncio.to_thread(JobStore, self._db_path)
+            self._writer_task = asyncio.create_task(self._writer())
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self._max_queued)
+        if not self._worker_tasks:
+            self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self._workers)]
+
+    def pending(self, tenant: str) -> int:
+        """Jobs of ``tenant`` queued or running."""
+        return self._pending[tenant]
+
+    def submit(self, request: JobRequest, creds: TelegramCredentialsRequest, tenant: str = "default") -> Job:
+        if self._queue is None:
+            raise RuntimeError("Job queue has not been started")
+        if self._closed:
+            raise JobQueueClosed("The service is shutting down and accepts no jobs")
+        job = Job(job_id=uuid.uuid4().hex, request=request, creds=creds, tenant=tenant)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull("Job queue is full") from None
+        self._active[job.job_id] = job
+        self._pending[tenant] += 1
+        self._persist(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[JobInfo]:
+        job = self._active.get(job_id) or self._finished.get(job_id) or self._unsaved.get(job_id)
+        if job is not None:
+            return job.info()
+        if self._store is not None:
+            return self._store.load(job_id)
+        return None
+
+    def cancel(self, job_id: str) -> Optional[JobInfo]:
+        job = self._active.get(job_id)
+        if job is None:
+            return self.get(job_id)
+        if job.task is not None:
+            job.task.cancel()
+        else:
+            # Still queued; the worker that dequeues it will skip it.
+            self._finish(job, JobStatus.CANCELLED, "cancelled")
+        return job.info()
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status is JobStatus.QUEUED:
+                    await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        job.status = JobStatus.RUNNING
+        job.started_at = time.time()
+        self._persist(job)
+        job.task = asyncio.create_task(self._executor(job))
+        try:
+            await job.task
+        except asyncio.CancelledError:
+            self._finish(job, JobStatus.CANCELLED, "cancelled")
+            current = asyncio.current_task()
+            if current is not None and current.cancelling():
+                # The worker itself is being cancelled (shutdown), not just the job.
+                raise
+        except HTTPException as e:
+            self._finish(job, JobStatus.FAILED, str(e.detail))
+        except JobFailed as e:
+            self._finish(job, JobStatus.FAILED, str(e))
+        except Exception as e:
+            logger.exception("Job %s failed", job.job_id)
+            self._finish(job, JobStatus.FAILED, str(e) or type(e).__name__)
+        else:
+            self._finish(job, JobStatus.SUCCEEDED)
+        finally:
+            job.task = None
+
+    def _finish(self, job: Job, status: JobStatus, error: Optional[str] = None) -> None:
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        if self._active.pop(job.job_id, None) is not None:
+            self._pending[job.tenant] -= 1
+            if not self._pending[job.tenant]:
+                del self._pending[job.tenant]
+        self._finished[job.job_id] = job
+        while len(self._finished) > self._max_finished:
+            self._finished.popitem(last=False)
+        self._persist(job)
+
+    def _persist(self, job: Job) -> None:
+        if self._store is not None:
+            self._unsaved[job.job_id] = job
+            self._unsaved_event.set()
+
+    def _take_unsaved(self) -> List[Tuple[Any, ...]]:
+        rows = [JobStore.row(job) for job in self._unsaved.values()]
+        self._unsaved.clear()
+        return rows
+
+    async def _writer(self) -> None:
+        assert self._store is not None
+        while True:
+            await self._unsaved_event.wait()
+            self._unsaved_event.clear()
+            rows = self._take_unsaved()
+            try:
+                await asyncio.to_thread(self._store.save, rows)
+            except Exception:
+                logger.exception("Failed to save %d jobs", len(rows))
+
+    def close(self) -> None:
+        """Refuse further jobs; those queued and running still run."""
+        self._closed = True
+
+    async def wait_idle(self, timeout: float) -> bool:
+        """Wait up to ``timeout`` seconds for the queued and running jobs to finish; False if some did not."""
+        if self._queue is None:
+            return True
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def aclose(self) -> None:
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._queue = None
+        for job in list(self._active.values()):
+            self._finish(job, JobStatus.CANCELLED, "cancelled by shutdown")
+        if self._writer_task is not None:
+            # Let a write in progress complete, then save what is left
+            self._writer_task.cancel()
+            await asyncio.gather(self._writer_task, return_exceptions=True)
+            self._writer_task = None
+        if self._store is not None:
+            rows = self._take_unsaved()
+            if rows:
+                await asyncio.to_thread(self._store.save, rows)
+            await asyncio.to_thread(self._store.close)
+            self._store = None
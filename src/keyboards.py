@@ -0,0 +1,84 @@
+import logging
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from .chats import chat_key
+from .models import MessageButton
+
+if TYPE_CHECKING:
+    from telethon import types
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ChatKeyboardState:
+    """What we last observed in one chat with a bot."""
+    rows: Optional[List[List[MessageButton]]] = None  # Active reply keyboard, if any
+    single_use: bool = False
+    latest_message_id: int = 0
+    latest_has_inline: bool = False
+
+
+class ReplyKeyboardTracker:
+    """Tracks the currently active reply keyboard per (session, bot) chat.
+
+    State is fed from messages the service observes while talking to bots, so
+    pressing a reply keyboard button can be validated locally and sent as plain
+    text without fetching the chat history first.
+    """
+
+    def __init__(self) -> None:
+        self._chats: Dict[Tuple[str, str], ChatKeyboardState] = {}
+
+    def observe(
+        self,
+        session_key: str,
+        bot_username: str,
+        message: "types.Message",
+        rows: Optional[List[List[MessageButton]]],
+    ) -> None:
+        """Update chat state from a message seen in the chat (incoming or outgoing)."""
+        from telethon import types
+
+        state = self._chats.setdefault(chat_key(session_key, bot_username), ChatKeyboardState())
+        if message.id < state.latest_message_id:
+            # Older than what we already know about; it cannot change the current keyboard.
+            return
+        state.latest_message_id = message.id
+        markup = getattr(message, "reply_markup", None)
+        state.latest_has_inline = isinstance(markup, types.ReplyInlineMarkup)
+
+        if getattr(message, "out", False):
+            # Telegram hides a single-use keyboard once one of its buttons is sent.
+            if state.rows and state.single_use and self._contains(state.rows, message.raw_text):
+                state.rows = None
+                state.single_use = False
+            return
+
+        if isinstance(markup, types.ReplyKeyboardMarkup):
+            state.rows = rows
+            state.single_use = bool(markup.single_use)
+        elif isinstance(markup, types.ReplyKeyboardHide):
+            state.rows = None
+            state.single_use = False
+
+    def match(self, session_key: str, bot_username: str, button_text: str) -> Optional[bool]:
+        """Check ``button_text`` against the active reply keyboard.
+
+        Returns ``None`` when the tracker cannot decide (no reply keyboard known,
+        or the latest message carries an inline keyboard that may own the button),
+        otherwise whether the text is one of the active reply buttons.
+        """
+        state = self._chats.get(chat_key(session_key, bot_username))
+        if state is None or state.rows is None or state.latest_has_inline:
+            return None
+        return self._contains(state.rows, button_text)
+
+    def invalidate(self, session_key: str, bot_username: str) -> None:
+        """Forget everything known about a chat."""
+        self._chats.pop(chat_key(session_key, bot_username), None)
+
+    @staticmethod
+    def _contains(rows: List[List[MessageButton]], text: Optional[str]) -> bool:
+        return any(button.text == text for row in rows for button in row)
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Optional, Tuple
+
+from fastapi import HTTPException
+
+from .models import BotResponse
+
+logger = logging.getLogger(__name__)
+
+# Rough per-object overhead used when estimating the memory held by a reply
+_REPLY_OVERHEAD = 512
+_BUTTON_OVERHEAD = 128
+
+
+@dataclass(frozen=True)
+class ReplyLimits:
+    """Caps applied to the replies collected by a single request."""
+    max_replies: int = 100
+    max_text_bytes: int = 1024 * 1024  # UTF-8 bytes of message text across all replies
+    max_buttons: int = 200  # Buttons kept per reply markup
+
+
+class MemoryBudget:
+    """Global byte budget shared by all in-flight collections.
+
+    ``acquire`` waits in FIFO order until enough budget is free, so a burst
+    of requests queues up instead of exhausting memory; after ``max_wait``
+    seconds the request is rejected with a 503. Collections already running
+    grow their share with ``try_acquire``, which never waits.
+    """
+
+    def __init__(self, total_bytes: int, max_wait: float = 30.0) -> None:
+        self.total_bytes = total_bytes
+        self.max_wait = max_wait
+        self._available = total_bytes
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+
+    @property
+    def used_bytes(self) -> int:
+        return self.total_bytes - self._available
+
+    async def acquire(self, nbytes: int) -> None:
+        if not self._waiters and self._available >= nbytes:
+            self._available -= nbytes
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (nbytes, waiter)
+        self._waiters.append(entry)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as we gave up
+                self.release(nbytes)
+            else:
+                waiter.cancel()
+                self._waiters.remove(entry)
+                self._wake()
+            if isinstance(e, asyncio.TimeoutError):
+                raise HTTPException(
+                    status_code=503,
+                    detail="Too many replies are being collected; retry later",
+                    headers={"Retry-After": str(max(1, int(self.max_wait)))},
+                ) from e
+            raise
+
+    def try_acquire(self, nbytes: int) -> bool:
+        if self._available < nbytes:
+            return False
+        self._available -= nbytes
+        return True
+
+    def release(self, nbytes: int) -> None:
+        self._available += nbytes
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self._waiters[0][0] <= self._available:
+            nbytes, waiter = self._waiters.popleft()
+            self._available -= nbytes
+            waiter.set_result(None)
+
+
+class ReplyGuard:
+    """Applies ReplyLimits to one collection and accounts its replies against the budget.
+
+    Used as an async context manager around the collection: entering reserves
+    an initial chunk of the budget (waiting if needed) and leaving returns
+    everything reserved. ``truncated`` names the limit that ended collection.
+    """
+
+    def __init__(self, limits: ReplyLimits, budget: MemoryBudget, chunk_bytes: int = 64 * 1024) -> None:
+        self.limits = limits
+        self._budget = budget
+        self._chunk_bytes = chunk_bytes
+        self._reserved = 0
+        self._used = 0
+        self._text_bytes = 0
+        self.count = 0
+        self.truncated: Optional[str] = None  # "replies", "text_bytes" or "memory"
+
+    async def __aenter__(self) -> "ReplyGuard":
+        await self._budget.acquire(self._chunk_bytes)
+        self._reserved = self._chunk_bytes
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._budget.release(self._reserved)
+        self._reserved = 0
+
+    @property
+    def exhausted(self) -> bool:
+        """True once no further reply may be collected."""
+        return self.truncated is not None
+
+    def admit(self, response: BotResponse) -> Optional[BotResponse]:
+        """Cut ``response`` to the limits and account for it; None if it must be dropped."""
+        if self.exhausted:
+            return None
+        limits = self.limits
+
+        if response.reply_markup:
+            buttons = 0
+            rows = []
+            for row in response.reply_markup:
+                if buttons + len(row) > limits.max_buttons:
+                    rows.append(row[:limits.max_buttons - buttons])
+                    response.truncated = True
+                    break
+                rows.append(row)
+                buttons += len(row)
+            response.reply_markup = [row for row in rows if row]
+
+        if response.message_text:
+            encoded = response.message_text.encode()
+            remaining = limits.max_text_bytes - self._text_bytes
+            if len(encoded) > remaining:
+                response.message_text = encoded[:remaining].decode(errors="ignore")
+                response.truncated = True
+                encoded = response.message_text.encode()
+                self.truncated = "text_bytes"
+            self._text_bytes += len(encoded)
+
+        size = self._size(response)
+        if self._used + size > self._reserved:
+            grow = max(size, self._chunk_bytes)
+            if not self._budget.try_acquire(grow):
+                logger.warning("Collection memory budget exhausted; dropping further replies")
+                self.truncated = "memory"
+                return None
+            self._reserved += grow
+        self._used += size
+
+        self.count += 1
+        if self.count >= limits.max_replies and self.truncated is None:
+            self.truncated = "replies"
+        return response
+
+    @staticmethod
+    def _size(response: BotResponse) -> int:
+        size = _REPLY_OVERHEAD + len((response.message_text or "").encode())
+        for row in response.reply_markup or []:
+            for button in row:
+                size += _BUTTON_OVERHEAD + len(button.text) + len(button.callback_data or "")
+        return size
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from contextlib import AsyncExitStack
+from typing import TYPE_CHECKING, AsyncIterator, List, Optional, Sequence, Set, Tuple
+
+from .collector import ChatCollector
+from .models import LoadTestSnapshot
+from .profiling import Probe, QuantileSketch, ReplyRouter
+
+if TYPE_CHECKING:
+    from telethon import TelegramClient
+
+logger = logging.getLogger(__name__)
+
+
+class _Target:
+    """One account's chat with the bot under load."""
+
+    def __init__(self, client: "TelegramClient", entity) -> None:
+        self.client = client
+        self.entity = entity
+        self.router: Optional[ReplyRouter] = None
+
+
+class LoadGenerator:
+    """Drives a bot at a fixed message rate with an open-loop schedule.
+
+    Message ``i`` is due at ``start + i / rate`` no matter how earlier messages
+    fared, and its latency is measured from that due time rather than from
+    the actual send. A slow bot or a slow send therefore shows up as latency
+    instead of silently lowering the offered load (no coordinated omission).
+    Messages are spread round-robin over the targets (one per account) and the
+    ``messages`` templates; ``{i}`` in a template is replaced by the message
+    number. Messages that would exceed ``max_in_flight`` are skipped, not
+    delayed.
+    """
+
+    def __init__(
+        self,
+        targets: Sequence[Tuple["TelegramClient", object]],
+        messages: Sequence[str],
+        rate: float,
+        duration_sec: float,
+        timeout_sec: float,
+        max_in_flight: int,
+    ) -> None:
+        self._targets = [_Target(client, entity) for client, entity in targets]
+        self._messages = messages
+        self._rate = rate
+        self._total = int(rate * duration_sec)
+        self._timeout_sec = timeout_sec
+        self._max_in_flight = max_in_flight
+        self._in_flight: Set[asyncio.Task] = set()
+        self._started_at = 0.0
+        self._done = False
+        self.sent = 0
+        self.replied = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.skipped = 0
+        self.latency = QuantileSketch()
+        self._window = QuantileSketch()
+        self._window_started_at = 0.0
+        self._window_sent = 0
+
+    async def run(self) -> None:
+        routing: List[asyncio.Task] = []
+        async with AsyncExitStack() as stack:
+            for target in self._targets:
+                collector = await stack.enter_async_context(ChatCollector(target.client, target.entity, target.entity))
+                target.router = ReplyRouter(collector)
+                routing.append(asyncio.create_task(target.router.run()))
+            try:
+                await self._schedule()
+            finally:
+                self._done = True
+                for task in list(self._in_flight) + routing:
+                    task.cancel()
+
+    async def _schedule(self) -> None:
+        self._started_at = self._window_started_at = time.monotonic()
+        for i in range(self._total):
+            due = self._started_at + i / self._rate
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(self._in_flight) >= self._max_in_flight:
+                self.skipped += 1
+                continue
+            task = asyncio.create_task(self._send(i, due))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+        if self._in_flight:
+            await asyncio.wait(set(self._in_flight))
+
+    async def _send(self, i: int, due: float) -> None:
+        target = self._targets[i % len(self._targets)]
+        text = self._messages[i % len(self._messages)].replace("{i}", str(i))
+        probe: Probe = target.router.expect(due)
+        try:
+            sent = await target.client.send_message(target.entity, text)
+            probe.message_id = sent.id
+            self.sent += 1
+            self._window_sent += 1
+            received_at = await asyncio.wait_for(probe.reply, due + self._timeout_sec - time.monotonic())
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+        except Exception as e:
+            logger.warning("Load test message %d failed: %s", i, e)
+            self.errors += 1
+        else:
+            self.replied += 1
+            latency_ms = (received_at - due) * 1000
+            self.latency.add(latency_ms)
+            self._window.add(latency_ms)
+        finally:
+            target.router.discard(probe)
+
+    def snapshot(self) -> LoadTestSnapshot:
+        """Totals so far plus rates and latency since the previous snapshot."""
+        now = time.monotonic()
+        window_sec = max(now - self._window_started_at, 1e-9)
+        snapshot = LoadTestSnapshot(
+            elapsed_ms=int((now - self._started_at) * 1000) if self._started_at else 0,
+            sent=self.sent,
+            replied=self.replied,
+            timeouts=self.timeouts,
+            errors=self.errors,
+            skipped=self.skipped,
+            in_flight=len(self._in_flight),
+            send_rate=round(self._window_sent / window_sec, 2),
+            reply_rate=round(self._window.count / window_sec, 2),
+            window_latency=self._window.stats(),
+            latency=self.latency.stats(),
+            done=self._done,
+        )
+        self._window = QuantileSketch()
+        self._window_started_at = now
+        self._window_sent = 0
+        return snapshot
+
+    async def snapshots(self, run: "asyncio.Task[None]", interval: float) -> AsyncIterator[LoadTestSnapshot]:
+        """Yield a snapshot every ``interval`` seconds while ``run`` is going, then a final one."""
+        while not run.done():
+            await asyncio.wait({run}, timeout=interval)
+            if not run.done():
+                yield self.snapshot()
+        self._done = True
+        final = self.snapshot()
+        if not run.cancelled() and (error := run.exception()) is not None:
+            final.error = str(error) or type(error).__name__
+        yield final
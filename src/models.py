@@ -1,5 +1,6 @@
+from datetime import datetime
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from enum import Enum
 
 class ResponseType(str, Enum):
@@ -12,6 +13,14 @@ class TelegramCredentialsRequest(BaseModel):
     api_id: Optional[int] = None
     api_hash: Optional[str] = None
     session_string: Optional[str] = None
+    session_token: Optional[str] = None  # From POST /sessions; stands in for the three fields above
+
+class SessionInfo(BaseModel):
+    token: str
+    account: str  # Key the session's chats, recordings and search index entries are filed under
+    created_at: datetime
+    last_used_at: datetime
+    expires_at: Optional[datetime] = None  # When it is released if left idle; None while in use
 
 class MessageButton(BaseModel):
     text: str
@@ -23,6 +32,7 @@ class BotResponse(BaseModel):
     message_text: Optional[str] = None  # For MESSAGE, EDITED_MESSAGE
     reply_markup: Optional[List[List[MessageButton]]] = None # For MESSAGE, EDITED_MESSAGE
     reply_keyboard: Optional[bool] = None  # True if reply markup is a ReplyKeyboardMarkup
+    reply_markup_hash: Optional[str] = None  # Delta polls: key of reply_markup in GetMessagesResponse.keyboards
     
     # For CALLBACK_ANSWER
     callback_answer_text: Optional[str] = None
@@ -31,16 +41,292 @@ class BotResponse(BaseModel):
     # For POPUP
     popup_message: Optional[str] = None
 
+    # Timing; sent_at and received_at are only set for replies collected live
+    sent_at: Optional[datetime] = None  # When the message or button press that triggered the reply was sent
+    date: Optional[datetime] = None  # Telegram server date of the message (second resolution)
+    received_at: Optional[datetime] = None  # When the service received the reply
+
+    truncated: Optional[bool] = None  # Text or reply_markup was cut to the configured limits
+
+class ExpectationType(str, Enum):
+    REPLY_MATCHES = "reply_matches"  # Reply text matches regex `pattern`
+    HAS_BUTTON = "has_button"  # Reply has a button with `text`
+    EDITED_WITHIN = "edited_within"  # A message is edited within `within_ms`
+
+class Expectation(BaseModel):
+    type: ExpectationType
+    index: Optional[int] = None  # 0-based reply index; None means any reply
+    pattern: Optional[str] = None  # For REPLY_MATCHES
+    text: Optional[str] = None  # For HAS_BUTTON
+    within_ms: Optional[int] = None  # For EDITED_WITHIN
+
+class ExpectationResult(BaseModel):
+    index: int  # Position in the request's expectations list
+    passed: bool
+    detail: Optional[str] = None
+
+class ExpectationVerdict(BaseModel):
+    passed: bool
+    results: List[ExpectationResult]
+    reply_count: int
+    elapsed_ms: int
+
 class SendMessageRequest(BaseModel):
     bot_username: str
     message_text: str
-    timeout_sec: int = 5
+    chat: Optional[str] = None  # Group or channel to talk to the bot in instead of its private chat
+    timeout_sec: float = 5
+    callback_url: Optional[str] = None  # Deliver replies to this URL instead of the response
+    expectations: Optional[List[Expectation]] = None  # Return a verdict instead of the replies
 
 class PressButtonRequest(BaseModel):
     bot_username: str
+    chat: Optional[str] = None  # As for SendMessageRequest
     button_text: Optional[str] = None
     callback_data: Optional[str] = None
-    timeout_sec: int = 5
+    timeout_sec: float = 5
+    callback_url: Optional[str] = None  # Deliver replies to this URL instead of the response
+    expectations: Optional[List[Expectation]] = None  # Return a verdict instead of the replies
+
+class InlineQueryRequest(BaseModel):
+    bot_username: str
+    query: str = ""
+    offset: Optional[str] = None  # A previous page's next_offset
+    chat: Optional[str] = None  # Group or channel the query is typed in; defaults to the bot's private chat
+    max_pages: int = 10  # /inline-query/pages only: pages streamed at most
+
+class InlineResult(BaseModel):
+    id: str
+    type: str  # "article", "photo", "gif", ...
+    title: Optional[str] = None
+    description: Optional[str] = None
+    url: Optional[str] = None
+    message_text: Optional[str] = None  # Text or caption sent when the result is chosen
+    reply_markup: Optional[List[List[MessageButton]]] = None
+
+class InlineQueryResponse(BaseModel):
+    bot_username: str
+    query: str
+    offset: Optional[str] = None
+    results: List[InlineResult]
+    next_offset: Optional[str] = None  # Pass back as offset for the next page; None on the last page
+    gallery: bool = False
+    cache_time: int  # Seconds the bot allows the results to be cached
+    cached: bool  # Served from the service's cache rather than Telegram
+
+class InlineChooseRequest(BaseModel):
+    bot_username: str
+    query: str = ""
+    offset: Optional[str] = None  # Offset of the page the result is on
+    chat: Optional[str] = None  # Where to send the result; defaults to the bot's private chat
+    result_id: str
+    timeout_sec: float = 0  # Collect the bot's messages in the chat this long after sending
+
+class InlineChooseResponse(BaseModel):
+    sent: BotResponse  # The message the result was sent as
+    replies: List[BotResponse]
+
+class TenantUsage(BaseModel):
+    tenant: str  # Name of an API key's tenant, or the account key of credential tenants
+    weight: float
+    max_concurrency: int
+    rate: float  # Requests per second; 0 when not limited
+    max_queued: int
+    in_flight: int
+    queued: int
+    admitted: int
+    completed: int
+    rejected: int  # Turned away with a full queue
+    rate_limited: int
+    timed_out: int  # Gave up waiting in the queue
+    busy_sec: float  # Total time requests held a slot
+    avg_wait_ms: float  # Queueing delay of admitted requests
+    max_wait_ms: float
+    last_seen_at: Optional[datetime] = None
+
+class ServiceState(str, Enum):
+    STARTING = "starting"
+    READY = "ready"
+    DRAINING = "draining"  # Finishing what runs; new interactions and jobs are turned away
+    STOPPED = "stopped"
+
+class HealthStatus(BaseModel):
+    state: ServiceState
+    ready: bool  # Whether to route new requests here
+    telegram_connected: Optional[bool] = None  # The default client's connection; None in replay mode
+    in_flight: int  # Admitted interaction requests running
+    queued: int  # Interaction requests waiting for a slot
+    jobs_active: int  # Jobs queued or running
+    reason: Optional[str] = None  # Why the default client failed for good, e.g. its session was revoked
+
+class ResetMode(str, Enum):
+    DELETE = "delete"  # Delete the chat history on Telegram
+    LOGICAL = "logical"  # Only hide the current history from this service
+
+class ResetChatRequest(BaseModel):
+    bot_username: str
+    mode: ResetMode = ResetMode.DELETE
+    revoke: bool = False  # DELETE only: also delete the messages for the bot
+
+class ResetChatResponse(BaseModel):
+    bot_username: str
+    mode: ResetMode
+    deleted: int = 0  # Messages deleted (DELETE)
+    cursor: Optional[int] = None  # Last hidden message id (LOGICAL)
+
+class HistoryRequest(BaseModel):
+    # Parameters of /get-messages and /get-updates, as recorded for replay
+    bot_username: str
+    limit: int
 
 class GetMessagesResponse(BaseModel):
     messages: List[BotResponse]
+    # Delta polls only: token to send back as `state`, and the keyboards the poller does not hold yet
+    state: Optional[str] = None
+    keyboards: Optional[Dict[str, List[List[MessageButton]]]] = None
+    removed: Optional[List[int]] = None  # Ids of messages that left the window since the token
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"  # Interactions go through
+    OPEN = "open"  # The bot stopped responding; interactions fail fast
+    HALF_OPEN = "half_open"  # The next interaction probes whether the bot is back
+
+class BotCircuit(BaseModel):
+    bot_username: str
+    state: CircuitState
+    consecutive_silent: int  # Interactions in a row that got no response
+    opened_at: Optional[datetime] = None
+    last_response_at: Optional[datetime] = None
+    rejected: int = 0  # Interactions failed fast since the circuit opened
+
+class SearchHit(BaseModel):
+    message_id: int
+    message_text: str
+    date: datetime
+    outgoing: bool  # Sent by the account rather than the bot
+
+class SearchResponse(BaseModel):
+    hits: List[SearchHit]
+    next_before_id: Optional[int] = None  # Pass as before_id to get the next page
+    indexed: int = 0  # Messages added to the index while answering this request
+
+class AsyncJobAccepted(BaseModel):
+    job_id: str
+
+class WebhookBatch(BaseModel):
+    job_id: str
+    sequence: int
+    responses: List[BotResponse]
+    dropped: int = 0  # Replies discarded so far because delivery fell behind
+    done: bool = False
+    error: Optional[str] = None
+    truncated: Optional[str] = None  # Limit that ended a step's collection early, on the first batch after it
+
+class JobKind(str, Enum):
+    SEND_MESSAGE = "send_message"
+    PRESS_BUTTON = "press_button"
+    SCENARIO = "scenario"
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+class ScenarioStep(BaseModel):
+    # Exactly one of the actions must be set
+    send_message: Optional[SendMessageRequest] = None
+    press_button: Optional[PressButtonRequest] = None
+
+class JobRequest(BaseModel):
+    kind: JobKind
+    send_message: Optional[SendMessageRequest] = None  # For SEND_MESSAGE
+    press_button: Optional[PressButtonRequest] = None  # For PRESS_BUTTON
+    scenario: Optional[List[ScenarioStep]] = None  # For SCENARIO
+    callback_url: Optional[str] = None  # Also push replies to this webhook
+
+class JobInfo(BaseModel):
+    job_id: str
+    kind: JobKind
+    status: JobStatus
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    results: List[List[BotResponse]] = []  # Replies collected per executed step
+    verdicts: List[Optional[ExpectationVerdict]] = []  # Per executed step, if it had expectations
+    truncated: List[Optional[str]] = []  # Per executed step, the limit that ended its collection early
+    error: Optional[str] = None
+
+class ProfileRequest(BaseModel):
+    bot_username: str
+    message_text: str
+    count: int = 10  # Messages to send
+    concurrency: int = 1  # Messages awaiting a reply at once
+    timeout_sec: int = 5  # Per message
+
+class LatencyStats(BaseModel):
+    min_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+    mean_ms: float
+
+class ProfileResponse(BaseModel):
+    bot_username: str
+    sent: int
+    replied: int
+    timeouts: int
+    errors: int
+    elapsed_ms: int
+    latency: Optional[LatencyStats] = None  # Time to first reply; None if nothing replied
+
+class WarmupRequest(BaseModel):
+    bot_usernames: Optional[List[str]] = None  # Defaults to the bots among the account's dialogs
+    dialogs: bool = True  # Read the dialogs first, so bots found there need no username lookup
+    dialog_limit: Optional[int] = None  # Dialogs read at most; None reads them all
+    concurrency: int = 4  # Username lookups in flight at once
+
+class WarmupSource(str, Enum):
+    DIALOGS = "dialogs"  # Cached from the dialog list
+    RESOLVED = "resolved"  # Looked up by username
+
+class WarmupResult(BaseModel):
+    bot_username: str
+    resolved: bool
+    source: Optional[WarmupSource] = None
+    elapsed_ms: float
+    error: Optional[str] = None
+
+class WarmupResponse(BaseModel):
+    results: List[WarmupResult]
+    resolved: int
+    failed: int
+    dialogs_read: int
+    elapsed_ms: int
+
+class LoadTestRequest(BaseModel):
+    bot_username: str
+    messages: List[str]  # Sent round-robin; "{i}" is replaced by the message number
+    rate: float  # Messages per second, across all accounts
+    duration_sec: float
+    timeout_sec: int = 5  # Per message, counted from its scheduled send time
+    accounts: Optional[List[TelegramCredentialsRequest]] = None  # Defaults to the request's account
+    snapshot_interval_sec: float = 1.0
+    max_in_flight: int = 1000  # Messages beyond this many awaiting a reply are skipped
+
+class LoadTestSnapshot(BaseModel):
+    elapsed_ms: int
+    sent: int
+    replied: int
+    timeouts: int
+    errors: int
+    skipped: int
+    in_flight: int
+    send_rate: float  # Messages per second since the previous snapshot
+    reply_rate: float  # Replies per second since the previous snapshot
+    window_latency: Optional[LatencyStats] = None  # Since the previous snapshot
+    latency: Optional[LatencyStats] = None  # Since the start
+    done: bool = False
+    error: Optional[str] = None
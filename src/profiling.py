@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, Optional
+
+from .collector import ChatCollector
+from .models import LatencyStats
+
+if TYPE_CHECKING:
+    from telethon import TelegramClient
+    from telethon.tl.custom import Message
+
+logger = logging.getLogger(__name__)
+
+
+class QuantileSketch:
+    """Streaming quantile estimate with bounded relative error (a DDSketch).
+
+    Values are counted in logarithmically sized buckets, so memory depends on
+    the value range rather than the number of samples, and every reported
+    quantile is within ``relative_accuracy`` of a real sample. Min, max and
+    mean are exact.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01) -> None:
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._buckets: Dict[int, int] = {}
+        self._zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value <= 0:
+            self._zeros += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self._buckets[key] = self._buckets.get(key, 0) + 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self._zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self._buckets):
+            seen += self._buckets[key]
+            if rank < seen:
+                # Bucket midpoint, clamped to the exact extremes
+                value = 2 * self._gamma ** key / (self._gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def stats(self) -> Optional[LatencyStats]:
+        if self.count == 0:
+            return None
+        return LatencyStats(
+            min_ms=round(self.min, 2),
+            p50_ms=round(self.quantile(0.5), 2),
+            p95_ms=round(self.quantile(0.95), 2),
+            p99_ms=round(self.quantile(0.99), 2),
+            max_ms=round(self.max, 2),
+            mean_ms=round(self.total / self.count, 2),
+        )
+
+
+class Probe:
+    """One sent message awaiting its first reply; ``reply`` resolves to the receive time."""
+
+    __slots__ = ("sent_at", "message_id", "reply")
+
+    def __init__(self, sent_at: float) -> None:
+        self.sent_at = sent_at
+        self.message_id: Optional[int] = None
+        self.reply: "asyncio.Future[float]" = asyncio.get_running_loop().create_future()
+
+
+class ReplyRouter:
+    """Attributes the bot's new messages in one chat to the probes awaiting a reply.
+
+    A reply is attributed to the probe it quotes (``reply_to``) or else to the
+    oldest unanswered probe, which assumes the bot answers each message once
+    and in order; extra replies are ignored.
+    """
+
+    def __init__(self, collector: ChatCollector) -> None:
+        self._collector = collector
+        self._waiting: Deque[Probe] = deque()
+
+    def expect(self, sent_at: float) -> Probe:
+        """Register a probe before its message is sent: the reply may arrive before ``send_message`` returns."""
+        probe = Probe(sent_at)
+        self._waiting.append(probe)
+        return probe
+
+    def discard(self, probe: Probe) -> None:
+        if probe in self._waiting:
+            self._waiting.remove(probe)
+
+    async def run(self) -> None:
+        while True:
+            kind, message, received_at = await self._collector.get(timeout=None)
+            if kind != ChatCollector.NEW:
+                continue
+            probe = self._match(message)
+            if probe is not None:
+                self._waiting.remove(probe)
+                if not probe.reply.done():
+                    probe.reply.set_result(received_at)
+
+    def _match(self, message: "Message") -> Optional[Probe]:
+        reply_to = message.reply_to_msg_id
+        if reply_to is not None:
+            # A reply to a probe that already timed out matches nothing
+            return next((probe for probe in self._waiting if probe.message_id == reply_to), None)
+        return self._waiting[0] if self._waiting else None
+
+
+class LatencyProfiler:
+    """Sends a message to a bot repeatedly and measures the time to its first reply.
+
+    Up to ``concurrency`` probes are in flight at once.
+    """
+
+    def __init__(self, client: "TelegramClient", entity, text: str, timeout_sec: float) -> None:
+        self._client = client
+        self._entity = entity
+        self._text = text
+        self._timeout_sec = timeout_sec
+        self.sketch = QuantileSketch()
+        self.timeouts = 0
+        self.errors = 0
+
+    async def run(self, count: int, concurrency: int) -> None:
+        semaphore = asyncio.Semaphore(concurrency)
+        async with ChatCollector(self._client, self._entity, self._entity) as collector:
+            router = ReplyRouter(collector)
+            routing = asyncio.create_task(router.run())
+            try:
+                await asyncio.gather(*(self._probe(router, semaphore) for _ in range(count)))
+            finally:
+                routing.cancel()
+
+    async def _probe(self, router: ReplyRouter, semaphore: asyncio.Semaphore) -> None:
+        async with semaphore:
+            probe = router.expect(time.monotonic())
+            try:
+                sent = await self._client.send_message(self._entity, self._text)
+                probe.message_id = sent.id
+                received_at = await asyncio.wait_for(probe.reply, self._timeout_sec)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+            except Exception as e:
+                logger.warning("Profile probe failed: %s", e)
+                self.errors += 1
+            else:
+                self.sketch.add((received_at - probe.sent_at) * 1000)
+            finally:
+                router.discard(probe)
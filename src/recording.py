@@ -0,0 +1,166 @@
+import asyncio
+import contextvars
+import json
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO
+
+from fastapi import HTTPException
+
+from .chats import bot_key
+from .models import BotResponse
+
+logger = logging.getLogger(__name__)
+
+# Request fields that do not influence what the bot answers
+_IGNORED_FIELDS = ("bot_username", "timeout_sec", "callback_url", "expectations")
+
+
+def _fingerprint(endpoint: str, bot_username: str, params: Dict[str, Any]) -> str:
+    relevant = {k: v for k, v in params.items() if k not in _IGNORED_FIELDS}
+    return json.dumps([endpoint, bot_key(bot_username), relevant], sort_keys=True, separators=(",", ":"))
+
+
+_current_recording: contextvars.ContextVar[Optional["Recording"]] = contextvars.ContextVar(
+    "teletest_current_recording", default=None
+)
+
+
+def note_edit(message_id: int) -> None:
+    """Record an edit of ``message_id`` in the interaction being recorded in this context, if any."""
+    recording = _current_recording.get()
+    if recording is not None:
+        recording.edit(message_id)
+
+
+class Recording:
+    """One interaction being recorded: its request and every reply and edit with its offset in seconds."""
+
+    def __init__(self, recorder: "InteractionRecorder", endpoint: str, bot_username: str, account: str, params: Dict[str, Any]) -> None:
+        self._recorder = recorder
+        self._start = time.perf_counter()
+        self.record: Dict[str, Any] = {
+            "endpoint": endpoint,
+            "bot": bot_key(bot_username),
+            "account": account,
+            "request": params,
+            "at": time.time(),
+            "events": [],
+        }
+
+    def add(self, response: BotResponse) -> None:
+        self.record["events"].append({
+            "t": round(time.perf_counter() - self._start, 4),
+            "response": response.model_dump(mode="json", exclude_none=True),
+        })
+
+    def edit(self, message_id: int) -> None:
+        self.record["events"].append({"t": round(time.perf_counter() - self._start, 4), "edited": message_id})
+
+    @contextmanager
+    def active(self) -> Iterator[None]:
+        """Make this the recording note_edit adds to, in the current context."""
+        token = _current_recording.set(self)
+        try:
+            yield
+        finally:
+            _current_recording.reset(token)
+
+    def finish(self, status: int = 200, detail: Optional[str] = None) -> None:
+        self.record["status"] = status
+        if detail is not None:
+            self.record["detail"] = detail
+        self._recorder.write(self.record)
+
+
+class InteractionRecorder:
+    """Appends every interaction as one compact JSON line to ``path``."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file: Optional[TextIO] = None
+
+    def start(self, endpoint: str, bot_username: str, account: str, params: Dict[str, Any]) -> Recording:
+        return Recording(self, endpoint, bot_username, account, params)
+
+    def write(self, record: Dict[str, Any]) -> None:
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record, separators=(",", ":")))
+        self._file.write("\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ReplayBackend:
+    """Serves interactions from a recording file instead of Telegram.
+
+    Recorded interactions matching the same request are replayed in recording
+    order; once exhausted the last one keeps being served. Recorded edits are
+    passed to ``on_edit`` at their offsets, between the replies. ``speed``
+    scales the recorded timings (``2`` is twice as fast); ``0`` replays instantly.
+    """
+
+    def __init__(self, path: str, speed: float = 0.0) -> None:
+        self.path = path
+        self.speed = speed
+        self._records: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._cursors: Dict[str, int] = defaultdict(int)
+
+    def _load(self) -> Dict[str, List[Dict[str, Any]]]:
+        if self._records is None:
+            records: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    records[_fingerprint(record["endpoint"], record["bot"], record["request"])].append(record)
+            self._records = records
+            logger.info("Loaded %d recorded interactions from %s", sum(map(len, records.values())), self.path)
+        return self._records
+
+    async def play(
+        self,
+        endpoint: str,
+        bot_username: str,
+        params: Dict[str, Any],
+        timeout_sec: Optional[float] = None,
+        on_response: Optional[Callable[[BotResponse], None]] = None,
+        on_edit: Optional[Callable[[int], None]] = None,
+    ) -> List[BotResponse]:
+        key = _fingerprint(endpoint, bot_username, params)
+        candidates = self._load().get(key)
+        if not candidates:
+            raise HTTPException(status_code=404, detail="No recorded interaction matches this request")
+        index = self._cursors[key]
+        self._cursors[key] = index + 1
+        record = candidates[min(index, len(candidates) - 1)]
+
+        responses: List[BotResponse] = []
+        start = time.perf_counter()
+        for event in record["events"]:
+            if timeout_sec is not None and event["t"] > timeout_sec:
+                break
+            if self.speed > 0:
+                delay = event["t"] / self.speed - (time.perf_counter() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if "edited" in event:
+                if on_edit:
+                    on_edit(event["edited"])
+                continue
+            response = BotResponse(**event["response"])
+            responses.append(response)
+            if on_response:
+                on_response(response)
+
+        if record.get("status", 200) != 200:
+            raise HTTPException(status_code=record["status"], detail=record.get("detail"))
+        return responses
@@ -0,0 +1,273 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+from .models import SearchHit
+
+if TYPE_CHECKING:
+    from telethon import TelegramClient
+    from telethon.tl.custom import Message
+
+logger = logging.getLogger(__name__)
+
+# Rows written per transaction while backfilling
+_BACKFILL_BATCH = 500
+
+
+def fts_query(text: str) -> str:
+    """FTS5 expression requiring every word of ``text``; a trailing ``*`` matches word prefixes."""
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*")
+        if word:
+            terms.append('"' + word.replace('"', '""') + '"' + ("*" if prefix else ""))
+    return " AND ".join(terms)
+
+
+class MessageIndex:
+    """Local full-text index of the chats between accounts and bots.
+
+    A chat is indexed on first use by downloading its history once; later
+    backfills only fetch messages newer than the highest id indexed so far.
+    Clients passed to ``attach`` also index new and edited messages of the
+    chats already tracked as they arrive; a writer task saves them in batches.
+    SQLite runs in worker threads, one statement batch at a time, so the
+    event loop never waits on the index.
+    """
+
+    def __init__(self, path: str = ":memory:") -> None:
+        self._path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()  # The connection is used from one worker thread at a time
+        self._tracked: Set[Tuple[str, int]] = set()
+        self._locks: Dict[Tuple[str, int], asyncio.Lock] = {}
+        self._unsaved: List[tuple] = []  # Live messages the writer has not saved yet
+        self._unsaved_event = asyncio.Event()
+        # Orders saving live messages against forgetting a chat, so forgotten rows are not written back
+        self._writing = asyncio.Lock()
+        self._writer_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._db is not None:
+            return
+        await asyncio.to_thread(self._open)
+        self._writer_task = asyncio.create_task(self._writer())
+
+    def _open(self) -> None:
+        path = self._path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        try:
+            self._db.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS messages (
+                    account TEXT NOT NULL,
+                    peer_id INTEGER NOT NULL,
+                    message_id INTEGER NOT NULL,
+                    date REAL NOT NULL,
+                    outgoing INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    PRIMARY KEY (account, peer_id, message_id)
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                    text, content='messages', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+                );
+                CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+                    INSERT INTO messages_fts(rowid, text) VALUES (new.rowid, new.text);
+                END;
+                CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+                    INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+                END;
+                CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE OF text ON messages BEGIN
+                    INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+                    INSERT INTO messages_fts(rowid, text) VALUES (new.rowid, new.text);
+                END;
+                CREATE TABLE IF NOT EXISTS chats (
+                    account TEXT NOT NULL,
+                    peer_id INTEGER NOT NULL,
+                    max_id INTEGER NOT NULL,
+                    PRIMARY KEY (account, peer_id)
+                );
+                """
+            )
+        except sqlite3.OperationalError as e:
+            raise RuntimeError(f"SQLite FTS5 is required for message search: {e}") from e
+        self._db.commit()
+        self._tracked = {
+            (account, peer_id) for account, peer_id in self._db.execute("SELECT account, peer_id FROM chats")
+        }
+
+    @staticmethod
+    def peer_id(entity) -> int:
+        from telethon import utils
+        return utils.get_peer_id(entity)
+
+    def _row(self, account: str, peer_id: int, message: "Message") -> tuple:
+        return (
+            account, peer_id, message.id, message.date.timestamp(), int(bool(message.out)), message.raw_text or "",
+        )
+
+    def _upsert(self, rows: List[tuple]) -> None:
+        self._db.executemany(
+            "INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (account, peer_id, message_id) DO UPDATE SET text = excluded.text",
+            rows,
+        )
+
+    async def backfill(self, client: "TelegramClient", account: str, entity) -> int:
+        """Index the chat's messages newer than those already indexed; returns how many were added.
+
+        Concurrent backfills of one chat share a single download.
+        """
+        peer_id = self.peer_id(entity)
+        key = (account, peer_id)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            max_id = await asyncio.to_thread(self._max_id, key)
+            added = 0
+            batch: List[tuple] = []
+            async for message in client.iter_messages(entity, min_id=max_id, reverse=True):
+                max_id = max(max_id, message.id)
+                if message.raw_text:
+                    batch.append(self._row(account, peer_id, message))
+                if len(batch) >= _BACKFILL_BATCH:
+                    added += await asyncio.to_thread(self._commit_batch, key, batch, max_id)
+                    batch = []
+            added += await asyncio.to_thread(self._commit_batch, key, batch, max_id)
+            self._tracked.add(key)
+        if added:
+            logger.debug("Indexed %d messages of chat %s", added, peer_id)
+        return added
+
+    def _max_id(self, key: Tuple[str, int]) -> int:
+        with self._db_lock:
+            row = self._db.execute("SELECT max_id FROM chats WHERE account = ? AND peer_id = ?", key).fetchone()
+        return row[0] if row else 0
+
+    def _commit_batch(self, key: Tuple[str, int], batch: List[tuple], max_id: int) -> int:
+        # Rows and the watermark are committed together, so an interrupted backfill resumes where it stopped
+        with self._db_lock:
+            self._upsert(batch)
+            self._db.execute(
+                "INSERT INTO chats VALUES (?, ?, ?)"
+                " ON CONFLICT (account, peer_id) DO UPDATE SET max_id = excluded.max_id",
+                (*key, max_id),
+            )
+            self._db.commit()
+        return len(batch)
+
+    def _save(self, rows: List[tuple]) -> None:
+        with self._db_lock:
+            self._upsert(rows)
+            self._db.commit()
+
+    async def _flush(self) -> None:
+        async with self._writing:
+            rows, self._unsaved = self._unsaved, []
+            if rows:
+                await asyncio.to_thread(self._save, rows)
+
+    async def _writer(self) -> None:
+        while True:
+            await self._unsaved_event.wait()
+            self._unsaved_event.clear()
+            try:
+                await self._flush()
+            except Exception:
+                logger.exception("Failed to index new messages")
+
+    def attach(self, client: "TelegramClient", account: str) -> None:
+        """Index new and edited messages of tracked chats as ``client`` receives them."""
+        from telethon import events
+
+        async def on_message(event) -> None:
+            key = (account, event.chat_id)
+            if key not in self._tracked or not event.message.raw_text:
+                return
+            self._unsaved.append(self._row(account, event.chat_id, event.message))
+            self._unsaved_event.set()
+
+        client.add_event_handler(on_message, events.NewMessage(func=lambda e: e.is_private))
+        client.add_event_handler(on_message, events.MessageEdited(func=lambda e: e.is_private))
+
+    async def search(
+        self,
+        account: str,
+        peer_id: int,
+        query: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        before_id: Optional[int] = None,
+        limit: int = 20,
+    ) -> List[SearchHit]:
+        """Indexed messages of the chat matching all filters, newest first."""
+        # Messages received so far are searchable, even if the writer has not got to them yet
+        await self._flush()
+        sql = "SELECT m.message_id, m.date, m.outgoing, m.text FROM messages m"
+        where = ["m.account = ?", "m.peer_id = ?"]
+        params: list = [account, peer_id]
+        match = fts_query(query) if query else ""
+        if match:
+            sql += " JOIN messages_fts f ON f.rowid = m.rowid"
+            where.append("messages_fts MATCH ?")
+            params.append(match)
+        if since is not None:
+            where.append("m.date >= ?")
+            params.append(since.timestamp())
+        if until is not None:
+            where.append("m.date < ?")
+            params.append(until.timestamp())
+        if before_id is not None:
+            where.append("m.message_id < ?")
+            params.append(before_id)
+        sql += " WHERE " + " AND ".join(where) + " ORDER BY m.message_id DESC LIMIT ?"
+        params.append(limit)
+        rows = await asyncio.to_thread(self._query, sql, params)
+        return [
+            SearchHit(
+                message_id=message_id,
+                message_text=text,
+                date=datetime.fromtimestamp(date, timezone.utc),
+                outgoing=bool(outgoing),
+            )
+            for message_id, date, outgoing, text in rows
+        ]
+
+    def _query(self, sql: str, params: list) -> List[tuple]:
+        with self._db_lock:
+            return self._db.execute(sql, params).fetchall()
+
+    async def forget(self, account: str, peer_id: int) -> None:
+        """Drop a chat from the index, e.g. after its history was deleted."""
+        key = (account, peer_id)
+        async with self._writing:
+            self._tracked.discard(key)
+            self._unsaved = [row for row in self._unsaved if row[:2] != key]
+            await asyncio.to_thread(self._delete, key)
+
+    def _delete(self, key: Tuple[str, int]) -> None:
+        with self._db_lock:
+            self._db.execute("DELETE FROM messages WHERE account = ? AND peer_id = ?", key)
+            self._db.execute("DELETE FROM chats WHERE account = ? AND peer_id = ?", key)
+            self._db.commit()
+
+    async def aclose(self) -> None:
+        """Save the messages still pending, then close the index."""
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            await asyncio.gather(self._writer_task, return_exceptions=True)
+            self._writer_task = None
+        if self._db is not None:
+            await self._flush()
+            await asyncio.to_thread(self._close)
+
+    def _close(self) -> None:
+        with self._db_lock:
+            self._db.close()
+            self._db = None
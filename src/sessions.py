@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import secrets
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+from .models import SessionInfo, TelegramCredentialsRequest
+
+if TYPE_CHECKING:
+    from telethon import TelegramClient
+
+logger = logging.getLogger(__name__)
+
+# Connects and warms the client of a new session (None when there is nothing to connect, as in replay mode)
+ClientOpener = Callable[[TelegramCredentialsRequest, str], Awaitable[Optional["TelegramClient"]]]
+ClientCloser = Callable[["TelegramClient"], Awaitable[None]]
+
+
+class Session:
+    """Credentials registered once, and the connected client serving them."""
+
+    __slots__ = ("token", "creds", "account", "client", "created_at", "last_used", "users", "closed")
+
+    def __init__(
+        self, token: str, creds: TelegramCredentialsRequest, account: str, client: Optional["TelegramClient"]
+    ) -> None:
+        self.token = token
+        self.creds = creds
+        self.account = account
+        self.client = client
+        self.created_at = datetime.now(timezone.utc)
+        self.last_used = time.monotonic()
+        self.users = 0  # Requests currently using the client
+        self.closed = False
+
+
+class SessionRegistry:
+    """Sessions registered by token, each with a long-lived client.
+
+    Registering connects the session's client once; requests carrying the
+    token, or the same credentials, then reuse it instead of connecting a
+    temporary client for every request. Registering the same credentials
+    again returns the existing session. A session is released when deleted,
+    after ``idle_timeout`` seconds without use (0 keeps it until shutdown),
+    or on shutdown; its client is disconnected once no request uses it.
+    """
+
+    def __init__(
+        self,
+        open_client: ClientOpener,
+        close_client: ClientCloser,
+        idle_timeout: float = 900,
+        max_sessions: int = 100,
+    ) -> None:
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._open_client = open_client
+        self._close_client = close_client
+        self._by_token: Dict[str, Session] = {}
+        self._by_session_string: Dict[str, Session] = {}
+        self._registering: Dict[str, asyncio.Lock] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.idle_timeout > 0 and self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep())
+
+    async def register(self, creds: TelegramCredentialsRequest, account: str) -> Session:
+        """Session for ``creds``, connecting its client unless they are registered already.
+
+        Concurrent registrations of the same credentials share one connection.
+        """
+        lock = self._registering.setdefault(creds.session_string, asyncio.Lock())
+        async with lock:
+            existing = self._by_session_string.get(creds.session_string)
+            if existing is not None and self._matches(existing, creds.api_id, creds.api_hash):
+                existing.last_used = time.monotonic()
+                return existing
+            if len(self._by_token) >= self.max_sessions:
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"At most {self.max_sessions} sessions may be registered; delete unused ones first",
+                )
+            client = await self._open_client(creds, account)
+            session = Session(secrets.token_urlsafe(16), creds, account, client)
+            if existing is not None:
+                # Same session string under another app; the new registration replaces it
+                await self._drop(existing)
+            self._by_token[session.token] = session
+            self._by_session_string[creds.session_string] = session
+        logger.info("Registered session for account %s", account)
+        return session
+
+    @staticmethod
+    def _matches(session: Session, api_id: Optional[int], api_hash: Optional[str]) -> bool:
+        return session.creds.api_id == api_id and session.creds.api_hash == api_hash
+
+    def resolve(self, token: str) -> Session:
+        """The session behind ``token``; unknown and expired tokens are a 401."""
+        session = self._by_token.get(token)
+        if session is None:
+            raise HTTPException(status_code=401, detail="Unknown or expired session token")
+        session.last_used = time.monotonic()
+        return session
+
+    def get(self, token: str) -> Optional[Session]:
+        return self._by_token.get(token)
+
+    def find(
+        self, api_id: Optional[int], api_hash: Optional[str], session_string: Optional[str]
+    ) -> Optional[Session]:
+        """Registered session with a client for these credentials, if any."""
+        session = self._by_session_string.get(session_string) if session_string else None
+        if session is None or session.client is None or not self._matches(session, api_id, api_hash):
+            return None
+        return session
+
+    @asynccontextmanager
+    async def use(self, session: Session) -> AsyncIterator["TelegramClient"]:
+        """Hold the session's client for one request, keeping the session from expiring meanwhile."""
+        session.users += 1
+        try:
+            yield session.client
+        finally:
+            session.users -= 1
+            session.last_used = time.monotonic()
+            if session.closed and not session.users:
+                await self._close(session)
+
+    async def release(self, token: str) -> Optional[Session]:
+        session = self._by_token.get(token)
+        if session is None:
+            return None
+        await self._drop(session)
+        logger.info("Released session for account %s", session.account)
+        return session
+
+    async def _drop(self, session: Session) -> None:
+        # The sweeper, a release and a re-registration may each get here for the same session
+        if session.closed:
+            return
+        self._by_token.pop(session.token, None)
+        if self._by_session_string.get(session.creds.session_string) is session:
+            del self._by_session_string[session.creds.session_string]
+            lock = self._registering.get(session.creds.session_string)
+            if lock is not None and not lock.locked():
+                del self._registering[session.creds.session_string]
+        session.closed = True
+        if not session.users:
+            await self._close(session)
+
+    async def _close(self, session: Session) -> None:
+        if session.client is None:
+            return
+        try:
+            await self._close_client(session.client)
+        except Exception as e:
+            logger.warning("Failed to disconnect the client of session for account %s: %s", session.account, e)
+
+    def info(self, session: Session) -> SessionInfo:
+        now = time.monotonic()
+        wall_now = datetime.now(timezone.utc)
+        expires_at = None
+        if self.idle_timeout > 0 and not session.users and not session.closed:
+            expires_at = wall_now + timedelta(seconds=session.last_used + self.idle_timeout - now)
+        return SessionInfo(
+            token=session.token,
+            account=session.account,
+            created_at=session.created_at,
+            last_used_at=wall_now - timedelta(seconds=now - session.last_used),
+            expires_at=expires_at,
+        )
+
+    async def _sweep(self) -> None:
+        interval = min(max(self.idle_timeout / 2, 1), 30)
+        while True:
+            await asyncio.sleep(interval)
+            for session in list(self._by_token.values()):
+                # Dropping one session awaits its client, meanwhile the next may have been used or dropped
+                if session.closed or session.users or session.last_used > time.monotonic() - self.idle_timeout:
+                    continue
+                logger.info("Releasing session for account %s after %.0fs idle", session.account, self.idle_timeout)
+                try:
+                    await self._drop(session)
+                except Exception:
+                    logger.exception("Failed to release session for account %s", session.account)
+
+    async def aclose(self) -> None:
+        """Release every session, disconnecting the clients even if requests still hold them."""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        sessions = list(self._by_token.values())
+        self._by_token.clear()
+        self._by_session_string.clear()
+        for session in sessions:
+            session.closed = True
+        await asyncio.gather(*(self._close(session) for session in sessions))
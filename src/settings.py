@@ -0,0 +1,178 @@
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Mapping, Optional, Tuple
+
+from .admission import TenantQuota, parse_tenants
+from .limits import ReplyLimits
+
+
+def _flag(value: str) -> bool:
+    return value.lower() in ("1", "true", "yes")
+
+
+@dataclass(frozen=True)
+class ClientSettings:
+    """Transport tuning applied to every Telegram client the service creates."""
+    connection: str = "tcp_full"  # Key of clients.CONNECTION_MODES
+    timeout: float = 10  # Seconds per network operation
+    request_retries: int = 5
+    connection_retries: int = 5  # Telethon's own reconnect attempts before giving up
+    retry_delay: float = 1  # Base delay between Telethon's attempts; jittered per client
+    auto_reconnect: bool = True
+    flood_sleep_threshold: int = 60  # FloodWaits up to this many seconds are slept through
+    entity_cache_limit: int = 5000
+    max_in_flight: int = 32  # Concurrent RPCs per client; 0 disables the cap
+    reconnect_base_delay: float = 0.5
+    reconnect_max_delay: float = 30
+    reconnect_attempts: int = 8
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Everything the service is configured with; see ``from_env`` for the variable names."""
+    api_id: Optional[int] = None
+    api_hash: Optional[str] = None
+    session_string: Optional[str] = None
+
+    debug: bool = False
+    verbose: bool = False  # Log every response body
+    log_payload_limit: int = 200  # Message texts and bodies in log records are cut to this many characters
+    trace_sample_rate: float = 0.0
+    trace_file: str = "teletest-trace.json"
+
+    record_file: Optional[str] = None  # Record every interaction here
+    replay_file: Optional[str] = None  # Serve interactions from here without Telegram
+    replay_speed: float = 0.0
+
+    telegram: ClientSettings = field(default_factory=ClientSettings)
+
+    webhook_batch_size: int = 10
+    webhook_flush_interval: float = 0.5
+    webhook_max_pending: int = 1000
+    webhook_max_retries: int = 3
+    webhook_allowed_hosts: Tuple[str, ...] = ()  # Only these hosts (or *.domain) may receive webhooks, if set
+    webhook_allow_private: bool = False  # Let webhooks reach loopback, private and link-local addresses
+
+    job_workers: int = 16
+    job_max_queued: int = 10000
+    job_max_finished: int = 1000
+    job_db_path: Optional[str] = None
+
+    search_db_path: Optional[str] = None  # Persist the message search index here instead of in memory
+
+    session_idle_timeout: float = 900  # Registered sessions unused this long are released; 0 keeps them
+    session_max_count: int = 100
+
+    delta_max_states: int = 10000  # Poll states kept for delta /get-messages and /get-updates
+
+    inline_cache_max_entries: int = 1000  # Pages of inline results kept
+    inline_cache_max_ttl: float = 300  # Caps the cache_time bots ask for
+
+    breaker_threshold: int = 5  # Silent interactions in a row that open a bot's circuit; 0 disables
+    breaker_open_sec: float = 30  # How long an open circuit fails fast before probing the bot
+
+    admission_capacity: int = 256  # Interaction requests running at once across tenants; 0 for no limit
+    admission_queue_timeout: float = 30
+    drain_timeout: float = 30  # On shutdown, how long running interactions and jobs may take to finish
+    tenant_quota: TenantQuota = field(default_factory=TenantQuota)  # Applies to tenants without their own
+    tenants: Dict[str, TenantQuota] = field(default_factory=dict)
+    tenant_api_keys: Dict[str, str] = field(default_factory=dict)  # API key -> tenant
+
+    reply_limits: ReplyLimits = field(default_factory=ReplyLimits)
+    collection_memory_budget: int = 256 * 1024 * 1024
+    collection_queue_timeout: float = 30
+
+    profile_max_count: int = 1000  # Messages sent by a single /profile call
+    load_test_max_messages: int = 100000  # Messages scheduled by a single /load-test call
+    warmup_max_bots: int = 1000  # Bots resolved by a single /warmup call
+
+    compression_min_size: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+
+    @classmethod
+    def from_env(cls, environ: Optional[Mapping[str, str]] = None) -> "Settings":
+        """Read settings from ``environ``, or from the process environment plus a ``.env`` file."""
+        if environ is None:
+            from dotenv import load_dotenv
+            load_dotenv()
+            environ = os.environ
+        env = environ.get
+        api_id = env("API_ID")
+        tenant_quota = TenantQuota(
+            max_concurrency=int(env("TENANT_MAX_CONCURRENCY", "64")),
+            rate=float(env("TENANT_RATE", "0")),
+            burst=int(env("TENANT_BURST", "0")),
+            max_queued=int(env("TENANT_MAX_QUEUED", "1000")),
+        )
+        tenants, tenant_api_keys = parse_tenants(env("TENANTS", ""), tenant_quota)
+        return cls(
+            api_id=int(api_id) if api_id else None,
+            api_hash=env("API_HASH") or None,
+            session_string=env("SESSION_STRING") or None,
+            debug=_flag(env("DEBUG", "0")),
+            verbose=_flag(env("VERBOSE", "0")),
+            log_payload_limit=int(env("LOG_PAYLOAD_LIMIT", "200")),
+            trace_sample_rate=float(env("TRACE_SAMPLE_RATE", "0")),
+            trace_file=env("TRACE_FILE", "teletest-trace.json"),
+            record_file=env("RECORD_FILE") or None,
+            replay_file=env("REPLAY_FILE") or None,
+            replay_speed=float(env("REPLAY_SPEED", "0")),
+            telegram=ClientSettings(
+                connection=env("TELEGRAM_CONNECTION", "tcp_full"),
+                timeout=float(env("TELEGRAM_TIMEOUT", "10")),
+                request_retries=int(env("TELEGRAM_REQUEST_RETRIES", "5")),
+                connection_retries=int(env("TELEGRAM_CONNECTION_RETRIES", "5")),
+                retry_delay=float(env("TELEGRAM_RETRY_DELAY", "1")),
+                auto_reconnect=_flag(env("TELEGRAM_AUTO_RECONNECT", "1")),
+                flood_sleep_threshold=int(env("TELEGRAM_FLOOD_SLEEP_THRESHOLD", "60")),
+                entity_cache_limit=int(env("TELEGRAM_ENTITY_CACHE_LIMIT", "5000")),
+                max_in_flight=int(env("TELEGRAM_MAX_IN_FLIGHT", "32")),
+                reconnect_base_delay=float(env("TELEGRAM_RECONNECT_BASE_DELAY", "0.5")),
+                reconnect_max_delay=float(env("TELEGRAM_RECONNECT_MAX_DELAY", "30")),
+                reconnect_attempts=int(env("TELEGRAM_RECONNECT_ATTEMPTS", "8")),
+            ),
+            webhook_batch_size=int(env("WEBHOOK_BATCH_SIZE", "10")),
+            webhook_flush_interval=float(env("WEBHOOK_FLUSH_INTERVAL", "0.5")),
+            webhook_max_pending=int(env("WEBHOOK_MAX_PENDING", "1000")),
+            webhook_max_retries=int(env("WEBHOOK_MAX_RETRIES", "3")),
+            webhook_allowed_hosts=tuple(
+                host.strip().lower() for host in env("WEBHOOK_ALLOWED_HOSTS", "").split(",") if host.strip()
+            ),
+            webhook_allow_private=_flag(env("WEBHOOK_ALLOW_PRIVATE", "0")),
+            job_workers=int(env("JOB_WORKERS", "16")),
+            job_max_queued=int(env("JOB_MAX_QUEUED", "10000")),
+            job_max_finished=int(env("JOB_MAX_FINISHED", "1000")),
+            job_db_path=env("JOB_DB_PATH") or None,
+            search_db_path=env("SEARCH_DB_PATH") or None,
+            session_idle_timeout=float(env("SESSION_IDLE_TIMEOUT", "900")),
+            session_max_count=int(env("SESSION_MAX_COUNT", "100")),
+            delta_max_states=int(env("DELTA_MAX_STATES", "10000")),
+            inline_cache_max_entries=int(env("INLINE_CACHE_MAX_ENTRIES", "1000")),
+            inline_cache_max_ttl=float(env("INLINE_CACHE_MAX_TTL", "300")),
+            breaker_threshold=int(env("BREAKER_THRESHOLD", "5")),
+            breaker_open_sec=float(env("BREAKER_OPEN_SEC", "30")),
+            admission_capacity=int(env("ADMISSION_CAPACITY", "256")),
+            admission_queue_timeout=float(env("ADMISSION_QUEUE_TIMEOUT", "30")),
+            drain_timeout=float(env("DRAIN_TIMEOUT", "30")),
+            tenant_quota=tenant_quota,
+            tenants=tenants,
+            tenant_api_keys=tenant_api_keys,
+            reply_limits=ReplyLimits(
+                max_replies=int(env("REPLY_MAX_COUNT", "100")),
+                max_text_bytes=int(env("REPLY_MAX_TEXT_BYTES", str(1024 * 1024))),
+                max_buttons=int(env("REPLY_MAX_BUTTONS", "200")),
+            ),
+            collection_memory_budget=int(env("COLLECTION_MEMORY_BUDGET", str(256 * 1024 * 1024))),
+            collection_queue_timeout=float(env("COLLECTION_QUEUE_TIMEOUT", "30")),
+            profile_max_count=int(env("PROFILE_MAX_COUNT", "1000")),
+            load_test_max_messages=int(env("LOAD_TEST_MAX_MESSAGES", "100000")),
+            warmup_max_bots=int(env("WARMUP_MAX_BOTS", "1000")),
+            compression_min_size=int(env("COMPRESSION_MIN_SIZE", "1024")),
+            compression_gzip_level=int(env("COMPRESSION_GZIP_LEVEL", "6")),
+            compression_brotli_quality=int(env("COMPRESSION_BROTLI_QUALITY", "4")),
+        )
+
+    def validate(self) -> None:
+        if self.replay_file is None and not all([self.api_id, self.api_hash, self.session_string]):
+            raise RuntimeError("Default API_ID, API_HASH, and SESSION_STRING must be set in environment variables")
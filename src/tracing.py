@@ -0,0 +1,199 @@
+import asyncio
+import contextvars
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, List, Optional, Set, Union
+
+logger = logging.getLogger(__name__)
+
+# Offset turning perf_counter readings into wall-clock microseconds.
+_EPOCH_OFFSET = time.time() - time.perf_counter()
+
+
+class Truncated:
+    """Log argument that truncates its value only if the record is actually formatted."""
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: int) -> None:
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        text = self.value if isinstance(self.value, str) else repr(self.value)
+        if len(text) <= self.limit:
+            return text
+        return f"{text[:self.limit]}... ({len(text)} chars)"
+
+    __repr__ = __str__
+
+
+class _NoopSpan:
+    """Span handed out for unsampled requests; every operation is a no-op."""
+
+    __slots__ = ()
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    def phase(self, name: str, **attrs: Any) -> "_NoopSpan":
+        return self
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: contextvars.ContextVar[Union["Span", _NoopSpan]] = contextvars.ContextVar(
+    "teletest_current_span", default=NOOP_SPAN
+)
+
+
+def current_span() -> Union["Span", _NoopSpan]:
+    """The root span of the request being handled, or a no-op span."""
+    return _current_span.get()
+
+
+class Span:
+    __slots__ = ("name", "attrs", "trace_id", "_tracer", "_start", "_token", "_root")
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: int, attrs: dict, root: bool) -> None:
+        self.name = name
+        self.attrs = attrs
+        self.trace_id = trace_id
+        self._tracer = tracer
+        self._root = root
+        self._start = 0.0
+        self._token: Optional[contextvars.Token] = None
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def phase(self, name: str, **attrs: Any) -> "Span":
+        """Child span timing one phase of the traced request."""
+        return Span(self._tracer, name, self.trace_id, attrs, root=False)
+
+    def __enter__(self) -> "Span":
+        self._start = time.perf_counter()
+        if self._root:
+            self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        end = time.perf_counter()
+        if self._token is not None:
+            _current_span.reset(self._token)
+            self._token = None
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self._tracer.export(self, self._start, end)
+
+
+class Tracer:
+    """Samples requests and exports their spans in Chrome Trace Event format.
+
+    The output file is a JSON array of complete ("X") events which can be
+    opened in Perfetto or chrome://tracing; the closing bracket is optional in
+    that format, so the file is simply appended to. Buffered events are
+    written by worker threads, so the event loop never waits on the file.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, path: Optional[str] = None, flush_every: int = 64) -> None:
+        self.sample_rate = sample_rate
+        self.path = path
+        self._flush_every = flush_every
+        self._buffer: List[str] = []
+        self._file_lock = threading.Lock()  # Writes of consecutive flushes must not interleave
+        self._writes: Set[asyncio.Task] = set()
+        self._ids = itertools.count(1)
+        self._pid = os.getpid()
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 and bool(self.path)
+
+    def trace(self, name: str, **attrs: Any) -> Union[Span, _NoopSpan]:
+        """Start a root span, or return the no-op span if the request is not sampled."""
+        if not self.enabled or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return NOOP_SPAN
+        return Span(self, name, next(self._ids), attrs, root=True)
+
+    def export(self, span: Span, start: float, end: float) -> None:
+        event = {
+            "name": span.name,
+            "cat": "teletest",
+            "ph": "X",
+            "ts": int((start + _EPOCH_OFFSET) * 1_000_000),
+            "dur": int((end - start) * 1_000_000),
+            "pid": self._pid,
+            "tid": span.trace_id,
+            "args": span.attrs,
+        }
+        self._buffer.append(json.dumps(event, default=str))
+        if len(self._buffer) >= self._flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        """Start appending the buffered events to the file in a worker thread."""
+        if not self._buffer or not self.path:
+            return
+        lines, self._buffer = self._buffer, []
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(lines)
+            return
+        task = loop.create_task(asyncio.to_thread(self._write, lines))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def aclose(self) -> None:
+        """Write the buffered events and wait for every write to finish."""
+        self.flush()
+        await asyncio.gather(*self._writes)
+
+    def _write(self, lines: List[str]) -> None:
+        with self._file_lock:
+            try:
+                new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+                with open(self.path, "a", encoding="utf-8") as f:
+                    if new_file:
+                        f.write("[\n")
+                    f.write(",\n".join(lines))
+                    f.write(",\n")
+            except OSError as e:
+                logger.warning("Failed to write traces to %s: %s", self.path, e)
+
+
+class TracingMiddleware:
+    """ASGI middleware opening a root span for sampled HTTP requests."""
+
+    def __init__(self, app: Any, tracer: Tracer) -> None:
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        span = self.tracer.trace("request", method=scope["method"], endpoint=scope["path"])
+        if span is NOOP_SPAN:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                span.set(status=message["status"])
+            await send(message)
+
+        with span:
+            await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, List, Optional, Set
+
+from .chats import bot_key
+from .models import WarmupResult, WarmupSource
+
+if TYPE_CHECKING:
+    from telethon import TelegramClient
+
+logger = logging.getLogger(__name__)
+
+
+class EntityWarmer:
+    """Fills a client's entity cache before the first interactions with many bots.
+
+    Reading the dialog list caches the access hash of every bot the account
+    has talked to, up to a hundred per request. Only bots missing from it
+    are looked up by username, at most ``concurrency`` at a time. After a
+    FloodWait that the client would not sleep through, no further lookups
+    are made; the remaining bots are reported as skipped instead of adding
+    to the wait.
+    """
+
+    def __init__(self, client: "TelegramClient", concurrency: int = 4) -> None:
+        self.client = client
+        self._slots = asyncio.Semaphore(concurrency)
+        self._flood: Optional[str] = None
+        self._in_dialogs: Set[str] = set()
+        self.dialogs_read = 0
+        self.dialog_bots: List[str] = []  # Usernames of the bots found in the dialogs, in dialog order
+
+    async def read_dialogs(self, limit: Optional[int] = None) -> None:
+        from telethon import types
+
+        async for dialog in self.client.iter_dialogs(limit=limit):
+            self.dialogs_read += 1
+            entity = dialog.entity
+            if isinstance(entity, types.User) and entity.bot and entity.username:
+                key = bot_key(entity.username)
+                if key not in self._in_dialogs:
+                    self._in_dialogs.add(key)
+                    self.dialog_bots.append(entity.username)
+        logger.debug("Read %d dialogs with %d bots", self.dialogs_read, len(self.dialog_bots))
+
+    async def resolve(self, bot_usernames: List[str]) -> List[WarmupResult]:
+        """Resolve each bot once, in the given order; bots read from the dialogs resolve from the cache."""
+        seen: Set[str] = set()
+        unique = []
+        for username in bot_usernames:
+            if bot_key(username) not in seen:
+                seen.add(bot_key(username))
+                unique.append(username)
+        return list(await asyncio.gather(*(self._resolve(username) for username in unique)))
+
+    async def _resolve(self, bot_username: str) -> WarmupResult:
+        from telethon import errors
+
+        source = WarmupSource.DIALOGS if bot_key(bot_username) in self._in_dialogs else WarmupSource.RESOLVED
+        async with self._slots:
+            if self._flood is not None:
+                return WarmupResult(
+                    bot_username=bot_username, resolved=False, elapsed_ms=0, error=f"Skipped after {self._flood}"
+                )
+            started = time.monotonic()
+            error = None
+            try:
+                await self.client.get_input_entity(bot_username)
+            except errors.FloodWaitError as e:
+                self._flood = f"FloodWait of {e.seconds}s"
+                logger.warning("Warm-up hit a %s; skipping the remaining lookups", self._flood)
+                error = self._flood
+            except Exception as e:
+                error = str(e) or type(e).__name__
+            elapsed_ms = round((time.monotonic() - started) * 1000, 2)
+        if error is not None:
+            return WarmupResult(bot_username=bot_username, resolved=False, elapsed_ms=elapsed_ms, error=error)
+        return WarmupResult(bot_username=bot_username, resolved=True, source=source, elapsed_ms=elapsed_ms)
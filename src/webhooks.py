@@ -0,0 +1,230 @@
+import asyncio
+import ipaddress
+import logging
+import socket
+from collections import deque
+from typing import Deque, Iterable, List, Optional, Set
+from urllib.parse import urlsplit
+
+import httpx
+from fastapi import HTTPException
+
+from .models import BotResponse, WebhookBatch
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookBlocked(Exception):
+    """The webhook URL points somewhere the service may not send requests to."""
+
+
+class WebhookPolicy:
+    """Where webhooks may be sent, so callers cannot aim the service at internal endpoints.
+
+    With ``allowed_hosts`` only those hosts, or subdomains of ``*.domain``
+    entries, are accepted. Otherwise any host is, as long as every address it
+    resolves to is public: loopback, private, link-local (cloud metadata
+    included), reserved and multicast addresses are refused unless
+    ``allow_private`` is set. Listed hosts are trusted wherever they point.
+    Addresses are checked when a job is submitted and again before every
+    delivery attempt, so a name re-pointed since is caught as well.
+    """
+
+    def __init__(self, allowed_hosts: Iterable[str] = (), allow_private: bool = False) -> None:
+        self.allowed_hosts = frozenset(host.lower() for host in allowed_hosts)
+        self.allow_private = allow_private
+
+    def _host(self, url: str) -> str:
+        try:
+            parts = urlsplit(url)
+            parts.port  # Raises on an invalid port
+        except ValueError as e:
+            raise WebhookBlocked(f"invalid URL: {e}") from None
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise WebhookBlocked("only absolute http and https URLs are accepted")
+        if parts.username or parts.password:
+            raise WebhookBlocked("URLs with credentials are not accepted")
+        host = parts.hostname.lower()
+        if self.allowed_hosts and not self._listed(host):
+            raise WebhookBlocked(f"host {host} is not allowed")
+        return host
+
+    def _listed(self, host: str) -> bool:
+        return host in self.allowed_hosts or any(
+            allowed.startswith("*.") and host.endswith(allowed[1:]) for allowed in self.allowed_hosts
+        )
+
+    def _check_address(self, host: str, address: str) -> None:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])
+        if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise WebhookBlocked(f"host {host} resolves to the non-public address {ip}")
+
+    async def check(self, url: str) -> None:
+        """Refuse ``url`` unless every address its host resolves to may be reached."""
+        host = self._host(url)
+        if self.allow_private or self._listed(host):
+            return
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise WebhookBlocked(f"host {host} does not resolve: {e}") from None
+        for info in infos:
+            self._check_address(host, info[4][0])
+
+
+class WebhookDelivery:
+    """Delivers the replies of a single interaction to a callback URL in batches.
+
+    Replies wait in a bounded queue; when the receiver is slow or failing the
+    oldest pending replies are dropped and reported via ``dropped``.
+    """
+
+    def __init__(
+        self,
+        job_id: str,
+        url: str,
+        http: httpx.AsyncClient,
+        batch_size: int,
+        flush_interval: float,
+        max_pending: int,
+        max_retries: int,
+        policy: WebhookPolicy,
+    ) -> None:
+        self.job_id = job_id
+        self.url = url
+        self._http = http
+        self._policy = policy
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._max_retries = max_retries
+        self._pending: Deque[BotResponse] = deque(maxlen=max_pending)
+        self._wakeup = asyncio.Event()
+        self._finished = False
+        self._error: Optional[str] = None
+        self._sequence = 0
+        self._dropped = 0
+        self._truncated: Optional[str] = None
+
+    def push(self, response: BotResponse) -> None:
+        if len(self._pending) == self._pending.maxlen:
+            self._dropped += 1
+        self._pending.append(response)
+        if len(self._pending) >= self._batch_size:
+            self._wakeup.set()
+
+    def truncate(self, limit: str) -> None:
+        """Report on the next batch that ``limit`` ended a step's collection early."""
+        self._truncated = limit
+
+    def finish(self, error: Optional[str] = None) -> None:
+        self._finished = True
+        self._error = error
+        self._wakeup.set()
+
+    async def run(self) -> None:
+        while True:
+            if not self._finished and len(self._pending) < self._batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self._flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+
+            done = self._finished and len(self._pending) <= self._batch_size
+            if not self._pending and not done:
+                continue
+            batch = [self._pending.popleft() for _ in range(min(self._batch_size, len(self._pending)))]
+            await self._post(batch, done)
+            if done:
+                return
+
+    async def _post(self, batch: List[BotResponse], done: bool) -> None:
+        payload = WebhookBatch(
+            job_id=self.job_id,
+            sequence=self._sequence,
+            responses=batch,
+            dropped=self._dropped,
+            done=done,
+            error=self._error if done else None,
+            truncated=self._truncated,
+        )
+        self._truncated = None
+        self._sequence += 1
+        body = payload.model_dump(mode="json")
+        for attempt in range(self._max_retries + 1):
+            try:
+                await self._policy.check(self.url)
+            except WebhookBlocked as e:
+                logger.warning("Dropping webhook batch %d for job %s: %s", payload.sequence, self.job_id, e)
+                self._dropped += len(batch)
+                return
+            try:
+                resp = await self._http.post(self.url, json=body)
+                resp.raise_for_status()
+                return
+            except httpx.HTTPError as e:
+                if attempt == self._max_retries:
+                    logger.warning("Dropping webhook batch %d for job %s: %s", payload.sequence, self.job_id, e)
+                    self._dropped += len(batch)
+                    return
+                await asyncio.sleep(min(2 ** attempt * 0.5, 10))
+
+
+class WebhookDispatcher:
+    """Pushes replies of background jobs to their webhooks."""
+
+    def __init__(
+        self,
+        batch_size: int = 10,
+        flush_interval: float = 0.5,
+        max_pending: int = 1000,
+        max_retries: int = 3,
+        request_timeout: float = 10.0,
+        policy: Optional[WebhookPolicy] = None,
+    ) -> None:
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.request_timeout = request_timeout
+        self.policy = policy or WebhookPolicy()
+        self._http: Optional[httpx.AsyncClient] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def validate(self, url: str) -> None:
+        """Refuse with a 400 a callback URL the policy does not let webhooks reach."""
+        try:
+            await self.policy.check(url)
+        except WebhookBlocked as e:
+            raise HTTPException(status_code=400, detail=f"callback_url refused: {e}") from None
+
+    def start(self, job_id: str, url: str) -> WebhookDelivery:
+        """Begin delivering replies of job ``job_id``; call ``finish`` on the result when done."""
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=self.request_timeout)
+        delivery = WebhookDelivery(
+            job_id,
+            url,
+            self._http,
+            self.batch_size,
+            self.flush_interval,
+            self.max_pending,
+            self.max_retries,
+            self.policy,
+        )
+        task = asyncio.create_task(delivery.run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return delivery
+
+    async def aclose(self) -> None:
+        """Give pending deliveries a moment to flush, then close the HTTP client."""
+        if self._tasks:
+            _, pending = await asyncio.wait(set(self._tasks), timeout=self.request_timeout)
+            for task in pending:
+                task.cancel()
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
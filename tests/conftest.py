@@ -1,9 +1,9 @@
 import subprocess
+import threading
 import time
 import pytest
 import sys
 import os
-import importlib
 import logging
 
 # Configure logging for conftest
@@ -16,14 +16,38 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
+BOT_READY_LINE = "Real aiogram bot polling"
+BOT_READY_TIMEOUT = 30
 
-@pytest.fixture(scope="session", autouse=True)
+
+def wait_for_bot(proc, timeout=BOT_READY_TIMEOUT):
+    """Wait for the bot to print BOT_READY_LINE, failing early if it exits first."""
+    ready = threading.Event()
+
+    def read():
+        # Keeps draining the bot's output after it is ready, so it never blocks on a full pipe
+        for line in proc.stdout:
+            if line.strip() == BOT_READY_LINE:
+                ready.set()
+
+    threading.Thread(target=read, daemon=True).start()
+    deadline = time.monotonic() + timeout
+    while not ready.wait(0.05):
+        if proc.poll() is not None:
+            pytest.fail(f"Test bot exited with code {proc.returncode}:\n{proc.stderr.read()}", pytrace=False)
+        if time.monotonic() > deadline:
+            pytest.fail(f"Test bot did not start polling within {timeout}s", pytrace=False)
+
+
+@pytest.fixture(scope="session")
 def ping_bot(request):
+    # Requested by the tests that talk to Telegram; replay-mode tests run without it
     # Start the bot
     proc = subprocess.Popen(
         [sys.executable, "tests/real_bot/main.py"],
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
+        text=True,
     )
         # Execute get_me.py inside the container to fetch the bot's username
     try:
@@ -53,7 +77,7 @@ def ping_bot(request):
         error_msg = "Timeout while executing get_me.py."
         logger.error(error_msg)
         pytest.fail(error_msg, pytrace=False)
-    time.sleep(3)  # Wait for bot to start up, or better: poll for readiness
+    wait_for_bot(proc)
 
     yield  # Run tests
 
@@ -70,7 +94,7 @@ def app():
     """
     Fixture to provide the FastAPI app instance.
     Ensures required environment variables are set (loaded by ping_bot)
-    and reloads the app module to pick up any environment changes.
+    and builds a fresh app from them.
     """
     logger.info("Setting up app fixture (function-scoped).")
     required_vars = [
@@ -93,9 +117,7 @@ def app():
         pytest.skip(skip_message)
 
     logger.info("All required environment variables are set.")
-    logger.info("Reloading src.app module to pick up environment variables...")
-    import src.app as app_module
-    importlib.reload(app_module)
-    logger.info("src.app module reloaded.")
+    from src.app import create_app
+    from src.settings import Settings
 
-    return app_module.app
+    return create_app(Settings.from_env())
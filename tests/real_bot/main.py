@@ -4,6 +4,8 @@ from aiogram import Bot, Dispatcher, types
 from aiogram.types import (
     InlineKeyboardButton,
     InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
     ReplyKeyboardMarkup,
     KeyboardButton,
     ReplyKeyboardRemove,
@@ -119,6 +121,23 @@ async def handle_option2(message: types.Message):
 async def remove_kb(message: types.Message):
     await message.answer("Keyboard removed", reply_markup=ReplyKeyboardRemove())
 
+# Inline mode (enable it with BotFather's /setinline): two pages of two articles each
+@dp.inline_query()
+async def inline(query: types.InlineQuery):
+    page = int(query.offset or 0)
+    results = [
+        InlineQueryResultArticle(
+            id=f"{page}-{i}",
+            title=f"{query.query or 'result'} {page}-{i}",
+            input_message_content=InputTextMessageContent(message_text=f"inline: {query.query} {page}-{i}"),
+            reply_markup=InlineKeyboardMarkup(
+                inline_keyboard=[[InlineKeyboardButton(text="A", callback_data="A")]]
+            ),
+        )
+        for i in range(2)
+    ]
+    await query.answer(results, cache_time=60, next_offset="1" if page == 0 else "")
+
 # Generic callback handler for unhandled callback data (must be after specific ones)
 @dp.callback_query()
 async def callback_other(callback_query: types.CallbackQuery):
@@ -137,6 +156,12 @@ async def echo(message: types.Message):
     #     await message.answer(f"Unknown command: {message.text}")
 
 
+@dp.startup()
+async def on_startup():
+    # tests/conftest.py waits for this line before running the tests
+    print("Real aiogram bot polling", flush=True)
+
+
 async def main():
     print("Real aiogram bot started")
     await dp.start_polling(bot)
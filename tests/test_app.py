@@ -1,7 +1,11 @@
+import json
 import os
 import time # Added for sleep
+from dataclasses import replace
+from datetime import datetime
 from typing import Optional # Added for helper type hints
 
+import pytest
 from fastapi.testclient import TestClient
 
 
@@ -21,6 +25,13 @@ def find_message_by_id_in_get_messages(get_messages_response: dict, message_id:
             return m
     return None
 
+def replay_app(path, **settings):
+    """An app serving interactions from the recording at ``path``, without Telegram or the test bot."""
+    from src.app import create_app
+    from src.settings import Settings
+
+    return create_app(Settings(replay_file=str(path), **settings))
+
 
 def test_ping(app, ping_bot): # ping_bot fixture is already here, no change needed for this line
     bot_username = os.getenv("TELEGRAM_TEST_BOT_USERNAME")
@@ -42,6 +53,9 @@ def test_ping(app, ping_bot): # ping_bot fixture is already here, no change need
         # data["message_text"] == "pong" is confirmed by the filter above
         assert "message_id" in data
         assert isinstance(data["message_id"], int)
+        # Replies carry send, server and receive timestamps
+        assert data["sent_at"] and data["date"] and data["received_at"]
+        assert datetime.fromisoformat(data["received_at"]) >= datetime.fromisoformat(data["sent_at"])
 
 
 def test_buttons_and_press(app, ping_bot):
@@ -406,3 +420,981 @@ def test_reply_keyboard(app, ping_bot):
         remove_responses = resp_remove.json()
         remove_msg = find_message_with_text(remove_responses, "Keyboard removed")
         assert remove_msg, f"Remove keyboard response not found in {remove_responses}"
+
+
+def test_press_reply_keyboard_button(app, ping_bot):
+    bot_username = os.getenv("TELEGRAM_TEST_BOT_USERNAME")
+    assert bot_username, "TELEGRAM_TEST_BOT_USERNAME environment variable not set"
+    with TestClient(app) as client:
+        resp_show = client.post(
+            "/send-message",
+            json={"bot_username": bot_username, "message_text": "/reply_kb", "timeout_sec": 5},
+        )
+        assert resp_show.status_code == 200
+        assert find_message_with_text(resp_show.json(), "Choose an option:"), \
+            f"Did not find reply keyboard message in {resp_show.json()}"
+
+        # The active reply keyboard is tracked, so the press is sent as plain text
+        resp_press = client.post(
+            "/press-button",
+            json={"bot_username": bot_username, "button_text": "Option 2", "timeout_sec": 5},
+        )
+        assert resp_press.status_code == 200
+        press_responses = resp_press.json()
+        assert find_message_with_text(press_responses, "You chose option 2"), \
+            f"Response to reply keyboard press not found in {press_responses}"
+
+        # Buttons that are not on the keyboard are rejected without contacting Telegram
+        resp_invalid = client.post(
+            "/press-button",
+            json={"bot_username": bot_username, "button_text": "Option 3", "timeout_sec": 5},
+        )
+        assert resp_invalid.status_code == 400
+
+        resp_remove = client.post(
+            "/send-message",
+            json={"bot_username": bot_username, "message_text": "/remove_kb", "timeout_sec": 5},
+        )
+        assert resp_remove.status_code == 200
+
+
+def test_scenario_job(app, ping_bot):
+    bot_username = os.getenv("TELEGRAM_TEST_BOT_USERNAME")
+    assert bot_username, "TELEGRAM_TEST_BOT_USERNAME environment variable not set"
+    with TestClient(app) as client:
+        resp_create = client.post(
+            "/jobs",
+            json={
+                "kind": "scenario",
+                "scenario": [
+                    {"send_message": {"bot_username": bot_username, "message_text": "/buttons", "timeout_sec": 3}},
+                    {"press_button": {"bot_username": bot_username, "button_text": "B", "timeout_sec": 3}},
+                ],
+            },
+        )
+        assert resp_create.status_code == 202
+        job_id = resp_create.json()["job_id"]
+
+        job = resp_create.json()
+        deadline = time.time() + 20
+        while job["status"] in ("queued", "running") and time.time() < deadline:
+            time.sleep(0.5)
+            job = client.get(f"/jobs/{job_id}").json()
+        assert job["status"] == "succeeded", f"Scenario job did not succeed: {job}"
+        assert len(job["results"]) == 2
+        assert find_message_with_text(job["results"][0], "Choose:")
+        assert find_message_with_text(job["results"][1], "Additionally, I sent a new message because you chose B.")
+
+        assert client.get("/jobs/does-not-exist").status_code == 404
+
+
+def test_send_message_expectations(app, ping_bot):
+    bot_username = os.getenv("TELEGRAM_TEST_BOT_USERNAME")
+    assert bot_username, "TELEGRAM_TEST_BOT_USERNAME environment variable not set"
+    with TestClient(app) as client:
+        start = time.time()
+        resp = client.post(
+            "/send-message",
+            json={
+                "bot_username": bot_username,
+                "message_text": "/edit_test",
+                "timeout_sec": 10,
+                "expectations": [
+                    {"type": "reply_matches", "index": 0, "pattern": "^Original message"},
+                    {"type": "edited_within", "index": 0, "within_ms": 5000},
+                ],
+            },
+        )
+        assert resp.status_code == 200
+        verdict = resp.json()
+        assert verdict["passed"], f"Expectations failed: {verdict}"
+        assert verdict["reply_count"] == 1
+        # The verdict is returned once decided, not after the full timeout
+        assert time.time() - start < 8
+
+        resp_fail = client.post(
+            "/send-message",
+            json={
+                "bot_username": bot_username,
+                "message_text": "/ping",
+                "timeout_sec": 10,
+                "expectations": [{"type": "has_button", "index": 0, "text": "A"}],
+            },
+        )
+        assert resp_fail.status_code == 200
+        failed = resp_fail.json()
+        assert failed["passed"] is False
+        assert failed["results"][0]["detail"]
+
+
+def test_profile(app, ping_bot):
+    bot_username = os.getenv("TELEGRAM_TEST_BOT_USERNAME")
+    assert bot_username, "TELEGRAM_TEST_BOT_USERNAME environment variable not set"
+    with TestClient(app) as client:
+        resp = client.post(
+            "/profile",
+            json={"bot_username": bot_username, "message_text": "/ping", "count": 5, "concurrency": 2},
+        )
+        assert resp.status_code == 200
+        result = resp.json()
+        assert result["sent"] == 5
+        assert result["replied"] + result["timeouts"] + result["errors"] == 5
+        assert result["replied"] > 0, f"Bot never replied: {result}"
+        latency = result["latency"]
+        assert 0 < latency["min_ms"] <= latency["p50_ms"] <= latency["p99_ms"] <= latency["max_ms"]
+
+
+def test_load_test(app, ping_bot):
+    bot_username = os.getenv("TELEGRAM_TEST_BOT_USERNAME")
+    assert bot_username, "TELEGRAM_TEST_BOT_USERNAME environment variable not set"
+    with TestClient(app) as client:
+        with client.stream(
+            "POST",
+            "/load-test",
+            json={
+                "bot_username": bot_username,
+                "messages": ["/ping"],
+                "rate": 2,
+                "duration_sec": 3,
+                "snapshot_interval_sec": 1,
+            },
+        ) as resp:
+            assert resp.status_code == 200
+            snapshots = [json.loads(line) for line in resp.iter_lines() if line]
+        assert len(snapshots) >= 2, "Expected periodic snapshots before the final one"
+        final = snapshots[-1]
+        assert final["done"]
+        assert final["sent"] == 6
+        assert final["replied"] > 0, f"Bot never replied: {final}"
+        assert final["latency"]["p50_ms"] > 0
+
+
+def test_reply_limits(app, ping_bot):
+    from src.app import create_app
+    from src.limits import ReplyLimits
+    from src.settings import Settings
+
+    bot_username = os.getenv("TELEGRAM_TEST_BOT_USERNAME")
+    assert bot_username, "TELEGRAM_TEST_BOT_USERNAME environment variable not set"
+    capped = create_app(replace(Settings.from_env(), reply_limits=ReplyLimits(max_replies=1)))
+    with TestClient(capped) as client:
+        start = time.time()
+        resp = client.post(
+            "/send-message",
+            json={"bot_username": bot_username, "message_text": "/delay_test", "timeout_sec": 10},
+        )
+        assert resp.status_code == 200
+        replies = resp.json()
+        # /delay_test answers twice; collection stops at the cap instead of running into the timeout
+        assert len(replies) == 1
+        assert replies[0]["message_text"] == "Waiting for 3 seconds..."
+        assert resp.headers["X-Teletest-Truncated"] == "replies"
+        assert time.time() - start < 8
+
+
+def test_reset_chat(app, ping_bot):
+    bot_username = os.getenv("TELEGRAM_TEST_BOT_USERNAME")
+    assert bot_username, "TELEGRAM_TEST_BOT_USERNAME environment variable not set"
+    with TestClient(app) as client:
+        resp = client.post("/send-message", json={"bot_username": bot_username, "message_text": "/ping"})
+        assert resp.status_code == 200
+
+        # A logical reset hides the history without touching it on Telegram
+        resp = client.post("/reset-chat", json={"bot_username": bot_username, "mode": "logical"})
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["mode"] == "logical"
+        assert isinstance(data["cursor"], int)
+        resp = client.get("/get-messages", params={"bot_username": bot_username, "limit": 10})
+        assert resp.status_code == 200
+        assert resp.json()["messages"] == []
+
+        resp = client.post("/send-message", json={"bot_username": bot_username, "message_text": "/ping"})
+        assert resp.status_code == 200
+        resp = client.get("/get-messages", params={"bot_username": bot_username, "limit": 10})
+        assert [m["message_text"] for m in resp.json()["messages"]] == ["/ping", "pong"]
+
+        resp = client.post("/reset-chat", json={"bot_username": bot_username})
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["mode"] == "delete"
+        assert data["deleted"] >= 2
+        resp = client.get("/get-messages", params={"bot_username": bot_username, "limit": 10})
+        assert resp.json()["messages"] == []
+
+
+def test_search(app, ping_bot):
+    bot_username = os.getenv("TELEGRAM_TEST_BOT_USERNAME")
+    assert bot_username, "TELEGRAM_TEST_BOT_USERNAME environment variable not set"
+    with TestClient(app) as client:
+        resp = client.post("/send-message", json={"bot_username": bot_username, "message_text": "/ping"})
+        assert resp.status_code == 200
+
+        resp = client.get("/search", params={"bot_username": bot_username, "query": "pong", "limit": 1})
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["indexed"] >= 1
+        assert [h["message_text"] for h in data["hits"]] == ["pong"]
+        assert data["hits"][0]["outgoing"] is False
+        first_id = data["hits"][0]["message_id"]
+
+        # Later searches only fetch what is new
+        resp = client.get("/search", params={"bot_username": bot_username, "query": "pong", "before_id": first_id})
+        assert resp.status_code == 200
+        assert all(h["message_id"] < first_id for h in resp.json()["hits"])
+        resp = client.get("/search", params={"bot_username": bot_username, "query": "/ping", "refresh": False})
+        assert resp.json()["indexed"] == 0
+        assert any(h["outgoing"] for h in resp.json()["hits"])
+
+
+def test_request_deadline(app, ping_bot):
+    bot_username = os.getenv("TELEGRAM_TEST_BOT_USERNAME")
+    assert bot_username, "TELEGRAM_TEST_BOT_USERNAME environment variable not set"
+    with TestClient(app) as client:
+        start = time.time()
+        resp = client.post(
+            "/send-message",
+            json={"bot_username": bot_username, "message_text": "/delay_test", "timeout_sec": 10},
+            headers={"X-Request-Deadline": str(start + 2)},
+        )
+        assert resp.status_code == 200
+        # The deadline ends collection before the second reply arrives
+        assert [r["message_text"] for r in resp.json()] == ["Waiting for 3 seconds..."]
+        assert time.time() - start < 2.5
+
+        resp = client.post(
+            "/send-message",
+            json={"bot_username": bot_username, "message_text": "/ping"},
+            headers={"X-Request-Deadline": "2000-01-01T00:00:00Z"},
+        )
+        assert resp.status_code == 504
+
+
+def test_circuit_breaker(app, ping_bot):
+    from src.app import create_app
+    from src.settings import Settings
+
+    bot_username = os.getenv("TELEGRAM_TEST_BOT_USERNAME")
+    assert bot_username, "TELEGRAM_TEST_BOT_USERNAME environment variable not set"
+    breaking = create_app(replace(Settings.from_env(), breaker_threshold=2, breaker_open_sec=2))
+    with TestClient(breaking) as client:
+        silent = {"bot_username": bot_username, "message_text": "/nonexistentcommand", "timeout_sec": 1}
+        for _ in range(2):
+            assert client.post("/send-message", json=silent).status_code == 200
+        assert client.get(f"/circuits/{bot_username}").json()["state"] == "open"
+
+        # Open: fails fast without waiting for the timeout
+        start = time.time()
+        resp = client.post("/send-message", json={"bot_username": bot_username, "message_text": "/ping"})
+        assert resp.status_code == 503
+        assert resp.headers["X-Teletest-Circuit"] == "open"
+        assert time.time() - start < 0.5
+
+        # After open_sec a probe goes through, and a reply closes the circuit
+        time.sleep(2)
+        resp = client.post("/send-message", json={"bot_username": bot_username, "message_text": "/ping"})
+        assert resp.status_code == 200
+        assert find_message_with_text(resp.json(), "pong")
+        circuit = client.get(f"/circuits/{bot_username}").json()
+        assert circuit["state"] == "closed"
+        assert circuit["consecutive_silent"] == 0
+
+
+def test_session_token(app, ping_bot):
+    bot_username = os.getenv("TELEGRAM_TEST_BOT_USERNAME")
+    assert bot_username, "TELEGRAM_TEST_BOT_USERNAME environment variable not set"
+    with TestClient(app) as client:
+        creds = {
+            "api_id": int(os.environ["API_ID"]),
+            "api_hash": os.environ["API_HASH"],
+            "session_string": os.environ["SESSION_STRING"],
+        }
+        resp = client.post("/sessions", json=creds)
+        assert resp.status_code == 201
+        session = resp.json()
+        assert session["expires_at"] is not None
+        # Registering the same credentials again returns the same session
+        assert client.post("/sessions", json=creds).json()["token"] == session["token"]
+
+        headers = {"X-Telegram-Session-Token": session["token"]}
+        resp = client.post(
+            "/send-message", json={"bot_username": bot_username, "message_text": "/ping"}, headers=headers
+        )
+        assert resp.status_code == 200
+        assert find_message_with_text(resp.json(), "pong")
+
+        assert client.delete(f"/sessions/{session['token']}").status_code == 200
+        assert client.get(f"/sessions/{session['token']}").status_code == 404
+        resp = client.post(
+            "/send-message", json={"bot_username": bot_username, "message_text": "/ping"}, headers=headers
+        )
+        assert resp.status_code == 401
+
+
+def test_get_messages_delta(app, ping_bot):
+    bot_username = os.getenv("TELEGRAM_TEST_BOT_USERNAME")
+    assert bot_username, "TELEGRAM_TEST_BOT_USERNAME environment variable not set"
+    with TestClient(app) as client:
+        resp = client.post("/send-message", json={"bot_username": bot_username, "message_text": "/buttons"})
+        assert resp.status_code == 200
+
+        first = client.get("/get-messages", params={"bot_username": bot_username, "limit": 5, "delta": True}).json()
+        assert first["state"]
+        assert len(first["messages"]) == 5
+        with_keyboard = [m for m in first["messages"] if m.get("reply_markup_hash")]
+        assert with_keyboard
+        assert all(m["reply_markup"] is None for m in with_keyboard)
+        assert all(m["reply_markup_hash"] in first["keyboards"] for m in with_keyboard)
+
+        # Nothing changed: nothing is sent and the token stays the same
+        again = client.get(
+            "/get-messages", params={"bot_username": bot_username, "limit": 5, "state": first["state"]}
+        ).json()
+        assert again["messages"] == []
+        assert again["keyboards"] == {}
+        assert again["state"] == first["state"]
+
+        client.post("/send-message", json={"bot_username": bot_username, "message_text": "/ping"})
+        after = client.get(
+            "/get-messages", params={"bot_username": bot_username, "limit": 5, "state": first["state"]}
+        ).json()
+        assert find_message_with_text(after["messages"], "pong")
+        assert after["state"] != first["state"]
+
+
+def test_warmup(app, ping_bot):
+    bot_username = os.getenv("TELEGRAM_TEST_BOT_USERNAME")
+    assert bot_username, "TELEGRAM_TEST_BOT_USERNAME environment variable not set"
+    with TestClient(app) as client:
+        resp = client.post("/warmup", json={"bot_usernames": [bot_username, f"@{bot_username}"]})
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["resolved"] == 1 and data["failed"] == 0
+        [result] = data["results"]
+        assert result["bot_username"] == bot_username
+        assert result["resolved"] and result["elapsed_ms"] >= 0
+        assert data["dialogs_read"] >= 1
+
+        # Without a list, the bots in the dialogs are warmed, including the one the tests talk to
+        data = client.post("/warmup", json={}).json()
+        assert any(r["bot_username"].lower() == bot_username.lower().lstrip("@") for r in data["results"])
+
+
+def test_group_chat(app, ping_bot):
+    bot_username = os.getenv("TELEGRAM_TEST_BOT_USERNAME")
+    assert bot_username, "TELEGRAM_TEST_BOT_USERNAME environment variable not set"
+    group = os.getenv("TELEGRAM_TEST_GROUP")
+    if not group:
+        pytest.skip("TELEGRAM_TEST_GROUP not set")
+    with TestClient(app) as client:
+        resp = client.post("/send-message", json={
+            "bot_username": bot_username, "chat": group, "message_text": f"/ping@{bot_username.lstrip('@')}",
+        })
+        assert resp.status_code == 200
+        assert find_message_with_text(resp.json(), "pong")
+
+        resp = client.post("/send-message", json={
+            "bot_username": bot_username, "chat": group, "message_text": f"/buttons@{bot_username.lstrip('@')}",
+        })
+        assert find_message_with_text(resp.json(), "Choose:")
+        resp = client.post("/press-button", json={"bot_username": bot_username, "chat": group, "button_text": "A"})
+        assert resp.status_code == 200
+
+
+def test_inline_query(app, ping_bot):
+    bot_username = os.getenv("TELEGRAM_TEST_BOT_USERNAME")
+    assert bot_username, "TELEGRAM_TEST_BOT_USERNAME environment variable not set"
+    query = f"q{time.time_ns()}"
+    with TestClient(app) as client:
+        resp = client.post("/inline-query", json={"bot_username": bot_username, "query": query})
+        if resp.status_code == 400:
+            pytest.skip(f"Inline mode is not enabled for the test bot: {resp.json()['detail']}")
+        assert resp.status_code == 200
+        first = resp.json()
+        assert not first["cached"] and first["cache_time"] > 0
+        assert [r["title"] for r in first["results"]] == [f"{query} 0-0", f"{query} 0-1"]
+        assert first["results"][0]["reply_markup"][0][0]["text"] == "A"
+        assert first["next_offset"] == "1"
+
+        # Within the bot's cache_time the same page comes from the cache
+        again = client.post("/inline-query", json={"bot_username": bot_username, "query": query}).json()
+        assert again["cached"] and again["results"] == first["results"]
+
+        resp = client.post("/inline-query/pages", json={"bot_username": bot_username, "query": query})
+        assert resp.status_code == 200
+        pages = [json.loads(line) for line in resp.text.splitlines() if line]
+        assert [page["offset"] for page in pages] == [None, "1"]
+        assert pages[-1]["next_offset"] is None
+
+        resp = client.post("/inline-query/choose", json={
+            "bot_username": bot_username, "query": query, "result_id": "0-1",
+        })
+        assert resp.status_code == 200
+        assert resp.json()["sent"]["message_text"] == f"inline: {query} 0-1"
+
+        resp = client.post("/inline-query/choose", json={
+            "bot_username": bot_username, "query": query, "result_id": "missing",
+        })
+        assert resp.status_code == 404
+
+
+def test_tenant_admission(app, ping_bot):
+    from src.admission import TenantQuota, parse_tenants
+    from src.app import create_app
+    from src.settings import Settings
+
+    bot_username = os.getenv("TELEGRAM_TEST_BOT_USERNAME")
+    assert bot_username, "TELEGRAM_TEST_BOT_USERNAME environment variable not set"
+    # One request per 100 seconds, and no job may wait
+    tenants, keys = parse_tenants(
+        "team-a:key=key-a,rate=0.01,burst=1,queue=0;team-b:key=key-b", TenantQuota()
+    )
+    admitting = create_app(replace(Settings.from_env(), tenants=tenants, tenant_api_keys=keys))
+    ping = {"bot_username": bot_username, "message_text": "/ping"}
+    with TestClient(admitting) as client:
+        assert client.post("/send-message", json=ping, headers={"X-Teletest-Api-Key": "unknown"}).status_code == 401
+
+        resp = client.post("/send-message", json=ping, headers={"X-Teletest-Api-Key": "key-a"})
+        assert resp.status_code == 200
+        assert find_message_with_text(resp.json(), "pong")
+        # The burst of one is spent until the rate refills it
+        resp = client.post("/send-message", json=ping, headers={"X-Teletest-Api-Key": "key-a"})
+        assert resp.status_code == 429
+        assert 90 <= int(resp.headers["Retry-After"]) <= 100
+        # Jobs count against the tenant's queue as well
+        resp = client.post(
+            "/jobs", json={"kind": "send_message", "send_message": ping}, headers={"X-Teletest-Api-Key": "key-a"}
+        )
+        assert resp.status_code == 429
+        assert int(resp.headers["Retry-After"]) >= 1
+
+        # Other tenants are still served
+        resp = client.post("/send-message", json=ping, headers={"X-Teletest-Api-Key": "key-b"})
+        assert resp.status_code == 200
+        assert find_message_with_text(resp.json(), "pong")
+        # Requests without a key are admitted as their account
+        assert client.post("/send-message", json=ping).status_code == 200
+        usage = {t["tenant"]: t for t in client.get("/tenants").json()}
+        assert usage["team-a"]["admitted"] == 1 and usage["team-a"]["rate"] == 0.01
+        assert usage["team-a"]["rate_limited"] == 1 and usage["team-a"]["rejected"] == 1
+        assert usage["team-b"]["completed"] == 1
+        assert usage["default"]["completed"] == 1
+        assert client.get("/tenants/team-a").json()["in_flight"] == 0
+
+
+def test_drain(app, ping_bot):
+    from src.app import create_app
+    from src.settings import Settings
+
+    bot_username = os.getenv("TELEGRAM_TEST_BOT_USERNAME")
+    assert bot_username, "TELEGRAM_TEST_BOT_USERNAME environment variable not set"
+    draining = create_app(replace(Settings.from_env(), drain_timeout=5))
+    with TestClient(draining) as client:
+        resp = client.get("/ready")
+        assert resp.status_code == 200
+        assert resp.json()["state"] == "ready" and resp.json()["telegram_connected"]
+
+        resp = client.post("/drain", params={"wait": True})
+        assert resp.status_code == 202
+        assert resp.json()["state"] == "draining" and resp.json()["in_flight"] == 0
+
+        # Not ready, and new interactions are sent elsewhere; liveness is unaffected
+        assert client.get("/ready").status_code == 503
+        assert client.get("/health").status_code == 200
+        resp = client.post("/send-message", json={"bot_username": bot_username, "message_text": "/ping"})
+        assert resp.status_code == 503
+        assert resp.headers["Retry-After"] == "1"
+
+
+def test_record_and_replay_edits(tmp_path):
+    from src.models import BotResponse, ResponseType
+    from src.recording import InteractionRecorder, note_edit
+
+    path = tmp_path / "recorded.jsonl"
+    recorder = InteractionRecorder(str(path))
+    request = {"bot_username": "@edit_bot", "message_text": "/edit_test"}
+    recording = recorder.start("send_message", "@edit_bot", "default", request)
+    # As the collection notes them while recording; edits outside a recording are ignored
+    note_edit(1)
+    with recording.active():
+        recording.add(BotResponse(response_type=ResponseType.MESSAGE, message_id=7, message_text="Original"))
+        time.sleep(0.2)
+        note_edit(7)
+    recording.finish()
+    recorder.close()
+    events = json.loads(path.read_text())["events"]
+    assert [event.get("edited") for event in events] == [None, 7]
+    assert events[1]["t"] >= 0.2
+
+    edited = lambda within_ms: {
+        **request,
+        "expectations": [{"type": "edited_within", "index": 0, "within_ms": within_ms}],
+    }
+    with TestClient(replay_app(path, replay_speed=1)) as client:
+        resp = client.post("/send-message", json=edited(2000))
+        assert resp.status_code == 200
+        assert resp.json()["passed"], resp.json()
+        assert resp.json()["reply_count"] == 1
+
+        # Replayed at the recorded offset, the edit misses a shorter window
+        resp = client.post("/send-message", json=edited(50))
+        assert resp.status_code == 200
+        assert not resp.json()["passed"]
+        assert resp.json()["results"][0]["detail"] == "no edit within 50 ms"
+
+        # Without expectations the edit is not a reply
+        resp = client.post("/send-message", json=request)
+        assert [r["message_text"] for r in resp.json()] == ["Original"]
+
+        resp = client.post("/send-message", json=edited(2000) | {
+            "expectations": [{"type": "edited_within", "index": -1, "within_ms": 2000}],
+        })
+        assert resp.status_code == 400
+        assert "index must not be negative" in resp.json()["detail"]
+
+
+def test_expectation_clock_starts_at_send():
+    from src.expectations import ExpectationEngine
+    from src.models import Expectation, ExpectationType
+
+    # Created when the request arrives, then held up by admission before the send
+    engine = ExpectationEngine([Expectation(type=ExpectationType.EDITED_WITHIN, within_ms=100)], 0.0)
+    engine.start(10.0)
+    assert engine.next_deadline() == pytest.approx(10.1)
+    engine.on_edit(1, 10.05)
+    verdict = engine.finish(10.5)
+    assert verdict.passed
+    assert verdict.elapsed_ms == 500
+
+
+class _WebhookReceiver:
+    """Local HTTP server collecting webhook batches; the first ``failures`` POSTs get a 500."""
+
+    def __init__(self, failures: int = 0) -> None:
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        import threading
+
+        self.batches = []
+        self.failures = failures
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if receiver.failures > 0:
+                    receiver.failures -= 1
+                    self.send_response(500)
+                else:
+                    receiver.batches.append(body)
+                    self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def wait_done(self, timeout: float = 10) -> list:
+        deadline = time.monotonic() + timeout
+        while not (self.batches and self.batches[-1]["done"]):
+            assert time.monotonic() < deadline, f"no final batch within {timeout}s: {self.batches}"
+            time.sleep(0.05)
+        return self.batches
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def test_webhook_delivery(tmp_path):
+    import asyncio
+    from src.models import BotResponse, ResponseType
+    from src.webhooks import WebhookDispatcher, WebhookPolicy
+
+    path = tmp_path / "recorded.jsonl"
+    request = {"bot_username": "@hook_bot", "message_text": "/three"}
+    events = [
+        {"t": 0, "response": {"response_type": "message", "message_id": i, "message_text": f"reply {i}"}}
+        for i in range(3)
+    ]
+    path.write_text(json.dumps({
+        "endpoint": "send_message", "bot": "hook_bot", "account": "default", "request": request,
+        "events": events, "status": 200,
+    }) + "\n")
+
+    receiver = _WebhookReceiver(failures=1)
+    try:
+        # Loopback, private and link-local receivers are refused unless allowed
+        with TestClient(replay_app(path)) as client:
+            for url in (receiver.url, "http://localhost/hook", "http://169.254.169.254/latest/meta-data",
+                        "http://[::1]/hook", "http://10.0.0.1/hook", "ftp://example.com/hook", "/hook"):
+                resp = client.post("/send-message", json={**request, "callback_url": url})
+                assert resp.status_code == 400, url
+                assert resp.json()["detail"].startswith("callback_url refused")
+
+        hooked = replay_app(
+            path, webhook_allowed_hosts=("127.0.0.1",), webhook_batch_size=2,
+            webhook_flush_interval=0.05, webhook_max_retries=2,
+        )
+        with TestClient(hooked) as client:
+            resp = client.post("/send-message", json={**request, "callback_url": "http://example.com/hook"})
+            assert resp.status_code == 400
+            resp = client.post("/send-message", json={**request, "callback_url": receiver.url})
+            assert resp.status_code == 202
+            job_id = resp.json()["job_id"]
+            batches = receiver.wait_done()
+        # Batched by two, in sequence, the first delivered on retry
+        assert receiver.failures == 0
+        assert [b["sequence"] for b in batches] == [0, 1]
+        assert [[r["message_text"] for r in b["responses"]] for b in batches] == [["reply 0", "reply 1"], ["reply 2"]]
+        assert [b["done"] for b in batches] == [False, True]
+        assert all(b["job_id"] == job_id and b["dropped"] == 0 and b["error"] is None for b in batches)
+    finally:
+        receiver.close()
+
+    # Replies beyond max_pending drop the oldest, and the batches report how many
+    receiver = _WebhookReceiver()
+    try:
+        async def overflow():
+            dispatcher = WebhookDispatcher(
+                batch_size=10, flush_interval=0.05, max_pending=2, max_retries=0,
+                policy=WebhookPolicy(allow_private=True),
+            )
+            delivery = dispatcher.start("overflow", receiver.url)
+            for i in range(5):
+                delivery.push(BotResponse(response_type=ResponseType.MESSAGE, message_id=i, message_text=f"reply {i}"))
+            delivery.finish("bot went quiet")
+            await dispatcher.aclose()
+
+        asyncio.run(overflow())
+        [batch] = receiver.wait_done()
+        assert [r["message_id"] for r in batch["responses"]] == [3, 4]
+        assert batch["dropped"] == 3 and batch["error"] == "bot went quiet"
+    finally:
+        receiver.close()
+
+
+def test_concurrent_wait_idle():
+    import asyncio
+    from src.admission import AdmissionControl
+
+    async def scenario():
+        admission = AdmissionControl()
+        release = asyncio.Event()
+
+        async def hold():
+            async with admission.slot("team"):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        # A drain request and shutdown may both wait for the same requests
+        waiters = [asyncio.create_task(admission.wait_idle(5)) for _ in range(2)]
+        await asyncio.sleep(0)
+        release.set()
+        await holder
+        return await asyncio.wait_for(asyncio.gather(*waiters), 1)
+
+    assert asyncio.run(scenario()) == [True, True]
+
+
+def test_revoked_session_stops_reconnecting(tmp_path):
+    import asyncio
+    from src.clients import ClientFactory
+    from src.settings import ClientSettings
+
+    class RevokedClient:
+        """Connects fine, but its session is no longer authorized."""
+
+        def __init__(self):
+            self.connects = 0
+
+        @property
+        def disconnected(self):
+            return asyncio.sleep(0)
+
+        def is_connected(self):
+            return False
+
+        async def connect(self):
+            self.connects += 1
+
+        async def get_me(self, input_peer=False):
+            return None
+
+        async def disconnect(self):
+            pass
+
+    async def supervise():
+        factory = ClientFactory(ClientSettings(reconnect_max_delay=0))
+        client, failures = RevokedClient(), []
+        factory.supervise(client, failures.append)
+        await asyncio.sleep(0.1)
+        assert not factory._supervisors
+        await factory.aclose()
+        return client.connects, failures
+
+    connects, failures = asyncio.run(supervise())
+    assert connects == 1
+    assert failures == ["Telegram session is not authorized"]
+
+    app = replay_app(tmp_path / "none.jsonl")
+    with TestClient(app) as client:
+        assert client.get("/ready").status_code == 200
+        app.state.service._default_client_failed(failures[0])
+        resp = client.get("/ready")
+        assert resp.status_code == 503
+        assert resp.json()["reason"] == "Telegram session is not authorized"
+
+
+def test_delta_tokens_per_chat():
+    from src.deltas import MessageDeltas
+    from src.models import BotResponse, ResponseType
+
+    deltas = MessageDeltas()
+    message = lambda message_id, text: BotResponse(
+        response_type=ResponseType.MESSAGE, message_id=message_id, message_text=text
+    )
+    alice, bob = ("alice", "bot"), ("bob", "bot")
+    first = deltas.diff(alice, None, [message(1, "a"), message(2, "b")])
+    assert first.removed is None
+
+    # Message 1 was deleted and 2 edited
+    second = deltas.diff(alice, first.state, [message(2, "b'"), message(3, "c")])
+    assert [m.message_id for m in second.messages] == [2, 3]
+    assert second.removed == [1]
+
+    # The same token names nothing for another account, which gets everything
+    other = deltas.diff(bob, first.state, [message(1, "a"), message(2, "b")])
+    assert [m.message_id for m in other.messages] == [1, 2]
+    assert other.removed is None
+
+
+def _write_recording(path, endpoint, request, texts, first_id=1):
+    """Recording of one interaction at ``endpoint`` answered by a message per text, numbered from ``first_id``."""
+    events = [
+        {"t": 0, "response": {"response_type": "message", "message_id": first_id + i, "message_text": text}}
+        for i, text in enumerate(texts)
+    ]
+    record = {"endpoint": endpoint, "bot": request["bot_username"].lstrip("@"), "account": "default",
+              "request": request, "at": 0, "events": events, "status": 200}
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def test_trace_file(tmp_path):
+    path = tmp_path / "recorded.jsonl"
+    _write_recording(path, "get_messages", {"bot_username": "@trace_bot", "limit": 5}, ["hello"])
+    trace = tmp_path / "trace.json"
+    with TestClient(replay_app(path, trace_sample_rate=1, trace_file=str(trace))) as client:
+        params = {"bot_username": "@trace_bot", "limit": 5, "delta": True}
+        assert client.get("/get-messages", params=params).status_code == 200
+
+    # Trace viewers accept the array unterminated; closing it makes it plain JSON
+    events = json.loads(trace.read_text().rstrip().rstrip(",") + "]")
+    request = next(e for e in events if e["name"] == "request")
+    delta = next(e for e in events if e["name"] == "delta")
+    assert request["ph"] == delta["ph"] == "X"
+    assert request["args"]["endpoint"] == "/get-messages"
+    assert request["args"]["status"] == 200
+    # The phase is drawn inside its request: same track, within its time span
+    assert (delta["pid"], delta["tid"]) == (request["pid"], request["tid"])
+    assert request["ts"] <= delta["ts"]
+    assert delta["ts"] + delta["dur"] <= request["ts"] + request["dur"]
+
+
+def test_compression(tmp_path):
+    from fastapi import FastAPI
+    from fastapi.responses import StreamingResponse
+    from src.compression import CompressionMiddleware
+
+    path = tmp_path / "recorded.jsonl"
+    request = {"bot_username": "@zip_bot", "limit": 50}
+    texts = [f"message number {i} with some padding to compress" for i in range(50)]
+    _write_recording(path, "get_messages", request, texts)
+    _write_recording(path, "get_messages", {**request, "limit": 1}, ["short"])
+
+    with TestClient(replay_app(path)) as client:
+        for accept, encoding in [
+            ("gzip, br", "br"),
+            ("br;q=0, gzip", "gzip"),
+            ("identity", None),
+        ]:
+            resp = client.get("/get-messages", params=request, headers={"Accept-Encoding": accept})
+            assert resp.status_code == 200
+            assert resp.headers.get("content-encoding") == encoding, accept
+            assert [m["message_text"] for m in resp.json()["messages"]] == texts
+            if encoding:
+                assert resp.headers["vary"] == "Accept-Encoding"
+                assert int(resp.headers["content-length"]) < len(resp.content) / 3
+
+        # Below COMPRESSION_MIN_SIZE bodies go out as they are
+        resp = client.get("/get-messages", params={**request, "limit": 1}, headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in resp.headers
+
+    # Streamed NDJSON is compressed chunk by chunk, without a length up front
+    lines = [json.dumps({"line": i}) + "\n" for i in range(20)]
+    stream_app = FastAPI()
+
+    @stream_app.get("/stream")
+    async def stream():
+        async def chunks():
+            for line in lines:
+                yield line
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    stream_app.add_middleware(CompressionMiddleware)
+    with TestClient(stream_app) as client:
+        for accept, encoding in [("br", "br"), ("gzip", "gzip"), ("identity", None)]:
+            with client.stream("GET", "/stream", headers={"Accept-Encoding": accept}) as resp:
+                assert resp.headers.get("content-encoding") == encoding
+                if encoding:
+                    assert "content-length" not in resp.headers
+                assert [line + "\n" for line in resp.iter_lines()] == lines
+
+
+def test_chat_gate_serializes_resets_with_waiting_interactions():
+    import asyncio
+    from src.chats import ChatGate
+
+    async def scenario():
+        gate, events = ChatGate(), []
+
+        async def reset(name):
+            async with gate.exclusive("account", "@bot"):
+                events.append(name)
+                await asyncio.sleep(0.05)
+
+        async def interaction():
+            async with gate.shared("account", "@bot"):
+                events.append("interaction start")
+                await asyncio.sleep(0.05)
+                events.append("interaction end")
+
+        first = asyncio.create_task(reset("first reset"))
+        await asyncio.sleep(0.01)
+        # Held back by the first reset, and resumed when it is released
+        waiting = asyncio.create_task(interaction())
+        await asyncio.sleep(0.01)
+        await first
+        await asyncio.gather(waiting, reset("second reset"))
+        return events
+
+    assert asyncio.run(scenario()) == ["first reset", "interaction start", "interaction end", "second reset"]
+
+
+def test_admission_accounting():
+    import asyncio
+    from fastapi import HTTPException
+    from src.admission import AdmissionControl, TenantQuota
+
+    async def scenario():
+        admission = AdmissionControl(tenants={"team": TenantQuota(max_concurrency=1, rate=0.01, burst=2, max_queued=0)})
+        release = asyncio.Event()
+
+        async def hold():
+            async with admission.slot("team"):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        # The queue is full; the rejection leaves the tenant's second token for later
+        try:
+            async with admission.slot("team"):
+                pass
+        except HTTPException as e:
+            assert e.status_code == 429 and "queued" in e.detail
+        release.set()
+        await holder
+        async with admission.slot("team"):
+            pass
+        [usage] = admission.usage("team")
+        assert (usage.admitted, usage.completed, usage.rejected, usage.rate_limited) == (2, 2, 1, 0)
+
+        # A waiter cancelled in the same step its slot is granted hands the slot back uncounted
+        admission = AdmissionControl(tenants={"team": TenantQuota(max_concurrency=1)})
+        release.clear()
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+
+        async def wait():
+            async with admission.slot("team"):
+                pass
+
+        waiter = asyncio.create_task(wait())
+        await asyncio.sleep(0)
+        release.set()
+        waiter.cancel()
+        await asyncio.gather(holder, waiter, return_exceptions=True)
+        [usage] = admission.usage("team")
+        assert (usage.admitted, usage.completed, usage.in_flight) == (1, 1, 0)
+
+    asyncio.run(scenario())
+
+
+def test_message_index_writes_off_the_loop(tmp_path):
+    import asyncio
+    from datetime import timezone
+    from types import SimpleNamespace
+    from src.search import MessageIndex
+
+    class Client:
+        def __init__(self):
+            self.handlers = []
+
+        def add_event_handler(self, handler, event):
+            self.handlers.append(handler)
+
+    def received(client, message_id, text):
+        message = SimpleNamespace(id=message_id, date=datetime.now(timezone.utc), out=False, raw_text=text)
+        return asyncio.gather(*(handler(SimpleNamespace(chat_id=5, message=message)) for handler in client.handlers))
+
+    async def scenario():
+        index, client = MessageIndex(str(tmp_path / "index.db")), Client()
+        await index.start()
+        index._tracked.add(("account", 5))  # As after a backfill
+        index.attach(client, "account")
+        await received(client, 1, "hello world")
+        # Searchable right away, before the writer got to it
+        assert [hit.message_id for hit in await index.search("account", 5, "hello")] == [1]
+
+        # Forgetting a chat also drops its messages not saved yet
+        await received(client, 2, "hello again")
+        await index.forget("account", 5)
+        await asyncio.sleep(0.05)
+        assert await index.search("account", 5) == []
+
+        # Pending messages are saved on close
+        index._tracked.add(("account", 5))
+        await received(client, 3, "last words")
+        await index.aclose()
+        reopened = MessageIndex(str(tmp_path / "index.db"))
+        await reopened.start()
+        hits = await reopened.search("account", 5)
+        await reopened.aclose()
+        return [hit.message_text for hit in hits]
+
+    assert asyncio.run(scenario()) == ["last words"]
+
+
+def test_trace_writes_off_the_loop(tmp_path):
+    import asyncio
+    from src.tracing import Tracer
+
+    path = tmp_path / "trace.json"
+
+    async def scenario():
+        tracer = Tracer(sample_rate=1, path=str(path), flush_every=2)
+        for i in range(5):
+            with tracer.trace("request", n=i):
+                pass
+        # Two full buffers are being written by worker threads; the last event waits for close
+        assert len(tracer._writes) == 2
+        await tracer.aclose()
+        assert not tracer._writes
+
+    asyncio.run(scenario())
+    events = json.loads(path.read_text().rstrip().rstrip(",") + "]")
+    assert sorted(event["args"]["n"] for event in events) == [0, 1, 2, 3, 4]
@@ -0,0 +1,117 @@
+import os
+
+import pytest
+
+pytest.importorskip("requests")
+
+pytest_plugins = ["pytester"]
+
+CLIENT_DIR = os.path.join(os.path.dirname(__file__), "..", "clients", "python-client")
+PLUGIN = "teletest_python_client.pytest_plugin"
+
+
+@pytest.fixture
+def pytester(pytester, monkeypatch):
+    """Pytester running the plugin from the source tree, whether or not the client is installed."""
+    pytester.syspathinsert(CLIENT_DIR)
+    # Installed, the entry point would register the plugin a second time next to -p
+    monkeypatch.setenv("PYTEST_DISABLE_PLUGIN_AUTOLOAD", "1")
+    for name in ("PYTEST_XDIST_WORKER", "PYTEST_XDIST_WORKER_COUNT", "TELETEST_BOTS", "TELETEST_ACCOUNTS"):
+        monkeypatch.delenv(name, raising=False)
+    return pytester
+
+
+def test_shard():
+    from importlib import import_module
+    import sys
+
+    sys.path.insert(0, CLIENT_DIR)
+    try:
+        plugin = import_module(PLUGIN)
+    finally:
+        sys.path.remove(CLIENT_DIR)
+    account = lambda n: plugin.TelegramCredentialsRequest(api_id=n, api_hash="hash", session_string=f"s{n}")
+    accounts = [account(1), account(2)]
+
+    # Workers differ in bot first, then in account
+    pairs = [plugin.shard(worker, 4, ["a", "b"], accounts) for worker in range(4)]
+    assert [(s.account.api_id, s.bot_username) for s in pairs] == [(1, "a"), (1, "b"), (2, "a"), (2, "b")]
+    assert not any(s.shared for s in pairs)
+
+    # A fifth worker wraps around onto the first pair
+    fifth = plugin.shard(4, 5, ["a", "b"], accounts)
+    assert (fifth.account.api_id, fifth.bot_username, fifth.shared) == (1, "a", True)
+
+    # Without bots or accounts there is the one default pair
+    default = plugin.shard(0, 1, [], [])
+    assert (default.account, default.bot_username, default.shared) == (None, None, False)
+
+
+def test_shard_fixture(pytester, monkeypatch):
+    monkeypatch.setenv("PYTEST_XDIST_WORKER", "gw2")
+    monkeypatch.setenv("PYTEST_XDIST_WORKER_COUNT", "3")
+    pytester.makepyfile("""
+        def test_shard(teletest_shard):
+            assert (teletest_shard.worker, teletest_shard.workers) == (2, 3)
+            assert teletest_shard.bot_username == "one_bot"
+            assert teletest_shard.account is None
+            assert teletest_shard.shared
+    """)
+    result = pytester.runpytest("-p", PLUGIN, "--teletest-bots", "one_bot, ")
+    result.assert_outcomes(passed=1)
+    result.stdout.fnmatch_lines(["*3 workers share 1 (account, bot) pairs*"])
+
+
+CALLS_TEST = f"""
+    from {PLUGIN} import _calls
+
+    def test_fast():
+        _calls.append(("POST /send-message", 0.1))
+
+    def test_slow():
+        _calls.append(("POST /send-message", 0.3))
+        _calls.append(("GET /get-messages", 0.5))
+
+    def test_without_calls():
+        pass
+"""
+
+
+def test_calls_travel_in_user_properties(pytester):
+    import json
+    from _pytest.reports import TestReport
+
+    pytester.makepyfile(CALLS_TEST)
+    recorder = pytester.inline_run("-p", PLUGIN)
+    recorder.assertoutcome(passed=3)
+    teardowns = {
+        report.nodeid.split("::")[-1]: report
+        for report in recorder.getreports("pytest_runtest_logreport")
+        if report.when == "teardown"
+    }
+    # As serialized between pytest-xdist workers and the controller
+    restored = {
+        name: TestReport._from_json(json.loads(json.dumps(report._to_json()))) for name, report in teardowns.items()
+    }
+    assert restored["test_fast"].user_properties == [["teletest_calls", [["POST /send-message", 0.1]]]]
+    assert restored["test_slow"].user_properties == [
+        ["teletest_calls", [["POST /send-message", 0.3], ["GET /get-messages", 0.5]]]
+    ]
+    assert restored["test_without_calls"].user_properties == []
+
+
+def test_terminal_summary(pytester):
+    pytester.makepyfile(CALLS_TEST)
+    result = pytester.runpytest("-p", PLUGIN, "--teletest-durations", "1")
+    result.assert_outcomes(passed=3)
+    result.stdout.fnmatch_lines([
+        "*= teletest service calls =*",
+        "GET /get-messages * 1 calls  total     0.50s  p50    500.0ms  p95    500.0ms",
+        "POST /send-message * 2 calls  total     0.40s  p50    300.0ms  p95    300.0ms",
+        "",
+        "slowest 1 tests by time in service calls:",
+        "    0.80s    2 calls  test_terminal_summary.py::test_slow",
+    ])
+
+    result = pytester.runpytest("-p", PLUGIN, "--teletest-durations", "0")
+    assert "slowest" not in result.stdout.str()
@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+pytest.importorskip("requests")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "clients", "python-client"))
+from teletest_python_client import (  # noqa: E402
+    JobKind,
+    JobRequest,
+    JobStatus,
+    SendMessageRequest,
+    ServiceState,
+    TeletestApiClient,
+)
+
+from .test_app import _write_recording, replay_app  # noqa: E402
+
+
+def test_parse_health(tmp_path):
+    app = replay_app(tmp_path / "none.jsonl")
+    with TestClient(app) as service:
+        ready = service.get("/ready").json()
+        app.state.service._default_client_failed("Telegram session is not authorized")
+        failed = service.get("/ready").json()
+
+    client = TeletestApiClient("http://teletest")
+    status = client._parse_health(ready)
+    assert (status.state, status.ready, status.reason) == (ServiceState.READY, True, None)
+    status = client._parse_health(failed)
+    assert not status.ready
+    assert status.reason == "Telegram session is not authorized"
+    # Fields added by newer services are ignored
+    assert client._parse_health({**ready, "added_later": 1}).ready
+
+
+def test_delta_removed(tmp_path):
+    path = tmp_path / "recorded.jsonl"
+    request = {"bot_username": "@delta_bot", "limit": 2}
+    # Replayed in order: the second poll finds message 1 pushed out by message 3
+    _write_recording(path, "get_messages", request, ["one", "two"])
+    _write_recording(path, "get_messages", request, ["two", "three"], first_id=2)
+
+    with TestClient(replay_app(path)) as service:
+        client = TeletestApiClient(str(service.base_url), session=service)
+        first = client.get_messages_delta("@delta_bot", limit=2)
+        assert [m.message_id for m in first.messages] == [1, 2]
+        assert first.removed == []
+        second = client.get_messages_delta("@delta_bot", first.state, limit=2)
+        assert [m.message_id for m in second.messages] == [3]
+        assert second.removed == [1]
+
+
+def test_job_truncated(tmp_path):
+    path = tmp_path / "recorded.jsonl"
+    _write_recording(path, "send_message", {"bot_username": "@job_bot", "message_text": "/ping"}, ["pong"])
+    with TestClient(replay_app(path)) as service:
+        client = TeletestApiClient(str(service.base_url), session=service)
+        job = client.create_job(JobRequest(
+            kind=JobKind.SEND_MESSAGE, send_message=SendMessageRequest(bot_username="@job_bot", message_text="/ping"),
+        ))
+        for _ in range(50):
+            job = client.get_job(job.job_id)
+            if job.status is JobStatus.SUCCEEDED:
+                break
+            time.sleep(0.05)
+        assert job.status is JobStatus.SUCCEEDED
+        assert [r.message_text for r in job.results[0]] == ["pong"]
+        # One entry per executed step; None as the step was not cut short
+        assert job.truncated == [None]